@@ -7,8 +7,11 @@ from routes.leaderboard_routes import leaderboard_routes
 from routes.journal_routes import journal_routes
 from routes.achievement_routes import achievement_routes
 from routes.goals_routes import goals_routes
-from config.db_config import db, get_db_uri
+from config.db_config import db, get_db_uri, Config
 from sqlalchemy import inspect
+import click
+import csv
+import json
 import logging
 
 # Import models
@@ -18,11 +21,29 @@ from models.difficulty_levels_model import DifficultyLevel
 from models.routes_model import Route
 from models.goals_model import Goal
 from models.achievements_model import Achievement
+from models.user_stats_model import UserStats
+from models.completion_rollups_model import DailyCompletion, WeeklyCompletion
+from models.refresh_tokens_model import RefreshToken
+from models.revoked_tokens_model import RevokedToken
+from models.upload_jobs_model import UploadJob
+from models.image_hashes_model import ImageHash
+
+from controllers.leaderboard_controller import rebuild_leaderboard
+from controllers.route_controller import refresh_difficulty_points, merge_duplicate_routes
+from controllers.auth_controller import prune_expired_tokens
+from controllers.user_controller import provision_users, backfill_username_lower
+from controllers.journal_controller import normalise_journal_dates
+from controllers.image_controller import recover_upload_jobs, prune_upload_jobs
+from utils.db_migrations import add_missing_columns, add_missing_indexes
+from utils.temp_spool import sweep_spool
+from utils.spool_request import SpoolingRequest
 
 from werkzeug.security import generate_password_hash
 
 # Initialize Flask app
 app = Flask(__name__)
+# Image uploads are parsed straight into the temp spool
+app.request_class = SpoolingRequest
 
 # Enable CORS for frontend (React running on port 5173)
 frontend_origin = 'http://localhost:5173'  # Adjust for your frontend URL
@@ -31,6 +52,7 @@ CORS(app,
     resources={r"/api/*": {"origins": frontend_origin}},
     supports_credentials=True,
     allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["X-Next-Cursor"],
     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
 # Configure logging
@@ -40,10 +62,16 @@ logger = logging.getLogger(__name__)
 # Database configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = get_db_uri()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Let the web server send locally stored images
+app.config['USE_X_SENDFILE'] = Config.USE_X_SENDFILE
 
 # Initialize database
 db.init_app(app)
 
+# Tables derived from completed_routes, rebuilt when they are added to an existing database
+LEADERBOARD_TABLES = {'user_stats', 'daily_completions', 'weekly_completions'}
+ROUTE_CATALOGUE_INDEX = 'uq_routes_type_difficulty_id_location_name'
+
 # Check if database exists and create tables if not
 def initialize_database():
     with app.app_context():
@@ -57,6 +85,119 @@ def initialize_database():
         else:
             logger.info("Database already exists. Skipping creation.")
 
+            # Tabeller och kolumner som tillkommit efter att databasen skapades
+            missing = [name for name in db.metadata.tables if name not in tables]
+            if missing:
+                logger.info(f"Creating missing tables: {', '.join(missing)}")
+                db.create_all()
+
+            added_columns = add_missing_columns(db)
+
+            # The unique route catalogue index can only be created once duplicates are merged
+            route_indexes = {index['name'] for index in inspect(db.engine).get_indexes('routes')}
+            if ROUTE_CATALOGUE_INDEX not in route_indexes:
+                logger.info("Merging duplicate routes into the route catalogue...")
+                merge_duplicate_routes()
+
+            add_missing_indexes(db)
+
+            if ('users', 'username_lower') in added_columns:
+                logger.info("Filling users.username_lower for prefix search...")
+                backfill_username_lower()
+
+            fixed_dates = normalise_journal_dates()
+            if fixed_dates:
+                logger.info(f"Normalised {fixed_dates} journal dates stored without microseconds")
+
+            if ('difficulty_levels', 'points') in added_columns:
+                logger.info("Assigning ordinals and points to difficulty levels...")
+                refresh_difficulty_points()
+
+            if LEADERBOARD_TABLES.intersection(missing) or LEADERBOARD_TABLES.intersection(t for t, _ in added_columns):
+                logger.info("Rebuilding leaderboard tables from completed_routes...")
+                rebuild_leaderboard()
+
+# Create missing tables, columns and indexes in an existing database: flask --app app upgrade-db
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    initialize_database()
+    print("✅ Database is up to date")
+
+# Rebuild leaderboard statistics: flask --app app rebuild-leaderboard
+@app.cli.command('rebuild-leaderboard')
+def rebuild_leaderboard_command():
+    count, error = rebuild_leaderboard()
+    if error:
+        print(f"❌ {error}")
+    else:
+        print(f"✅ Rebuilt leaderboard tables for {count} users")
+
+# Merge duplicate routes into one catalogue row: flask --app app dedup-routes
+@app.cli.command('dedup-routes')
+def dedup_routes_command():
+    merged, error = merge_duplicate_routes()
+    if error:
+        print(f"❌ {error}")
+    else:
+        print(f"✅ Merged {merged} duplicate routes")
+
+# Remove leftover upload files from temp/: flask --app app sweep-temp
+@app.cli.command('sweep-temp')
+@click.option('--max-age', type=int, default=None, help='Also remove files older than this many seconds')
+def sweep_temp_command(max_age):
+    removed, freed = sweep_spool(max_age)
+    print(f"✅ Removed {removed} files ({freed / 1024 / 1024:.1f} MB) from the temp spool")
+
+# Remove expired refresh tokens and revocations, and old upload jobs: flask --app app prune-tokens
+@app.cli.command('prune-tokens')
+def prune_tokens_command():
+    removed, error = prune_expired_tokens()
+    if error:
+        print(f"❌ {error}")
+    else:
+        print(f"✅ Removed {removed} expired tokens")
+
+    removed, error = prune_upload_jobs()
+    if error:
+        print(f"❌ {error}")
+    else:
+        print(f"✅ Removed {removed} finished upload jobs")
+
+# Resume or fail upload jobs interrupted by a restart
+def resume_upload_jobs():
+    with app.app_context():
+        result, error = recover_upload_jobs()
+        if error:
+            logger.error(f"Could not recover upload jobs: {error}")
+        elif any(result):
+            logger.info(f"Upload jobs after restart: {result[0]} requeued, {result[1]} failed")
+
+# Create users from a CSV or JSON file: flask --app app provision-users members.csv
+@app.cli.command('provision-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def provision_users_command(path):
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        rows = json.load(file) if path.endswith('.json') else list(csv.DictReader(file))
+
+    result, error = provision_users(rows)
+    if error:
+        print(f"❌ {error}")
+        return
+    for row_error in result['errors']:
+        print(f"⚠️  Row {row_error['row']}: {row_error['error']}")
+    print(f"✅ Created {len(result['created'])} users")
+
+# Recompute grade points and scores after changing GRADE_SCALE: flask --app app refresh-grade-points
+@app.cli.command('refresh-grade-points')
+def refresh_grade_points_command():
+    count, error = refresh_difficulty_points()
+    if not error:
+        _, error = rebuild_leaderboard()
+    if error:
+        print(f"❌ {error}")
+    else:
+        print(f"✅ Updated points for {count} difficulty levels")
+
 # Create test user for login testing
 def create_test_user():
     with app.app_context():
@@ -95,5 +236,7 @@ def hello_world():
 # Run server
 if __name__ == '__main__':
     initialize_database()  # Initialize the database first
+    resume_upload_jobs()   # Take over interrupted upload jobs before their files are swept
+    sweep_spool()          # Remove upload files left behind by earlier runs
     create_test_user()     # Then create test users
     app.run(debug=True, port=5000)  # Finally, run the server (only once)
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""
+Benchmark: the auth_required hot path with and without the verified-token cache.
+
+Measures jwt.decode against utils/token_cache.decode_token for the same
+token, and full GET /api/goals/ requests (claims-only auth) with the token
+cache on and off.
+
+Användning:
+    python benchmarks/bench_auth.py [antal_anrop]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_auth.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+import jwt
+from app import app
+from config.db_config import db, Config
+from controllers.auth_controller import create_jwt_token
+from controllers.user_controller import create_user
+from utils import token_cache
+
+
+def timed(label, fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed_us = (time.perf_counter() - started) * 1e6 / calls
+    print(f"{label:36} {elapsed_us:9.2f} µs/call")
+    return elapsed_us
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with app.app_context():
+        db.create_all()
+        user, error = create_user('bench', 'benchmark-password', email='bench@example.com')
+        assert error is None, error
+        token = create_jwt_token(user['id'], user['username'])
+
+    print(f"{calls} calls per case ({DB_PATH})\n")
+    uncached = timed('jwt.decode', lambda: jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256']), calls)
+    token_cache.clear_token_cache()
+    cached = timed('token_cache.decode_token', lambda: token_cache.decode_token(token), calls)
+    print(f"{'':36} {uncached / cached:9.1f}x\n")
+
+    client = app.test_client()
+    client.set_cookie('token', token)
+    request = lambda: client.get('/api/goals/')
+
+    max_size = token_cache.TOKEN_CACHE_MAX_SIZE
+    token_cache.TOKEN_CACHE_MAX_SIZE = 0
+    uncached = timed('GET /api/goals/ (no token cache)', request, calls)
+    token_cache.TOKEN_CACHE_MAX_SIZE = max_size
+    cached = timed('GET /api/goals/ (token cache)', request, calls)
+    print(f"{'':36} {uncached / cached:9.2f}x")
+    print(f"\ntoken cache: {token_cache.token_cache_stats()}")
+
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
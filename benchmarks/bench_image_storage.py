@@ -0,0 +1,83 @@
+"""
+Benchmark: image pipeline offline with the local content-addressed storage.
+
+Uploads photos through POST /api/images/upload/registration with
+IMAGE_STORAGE_BACKEND=local (save, downscale, store by hash, no network),
+then times full and Range reads of the stored files via
+GET /api/images/files/<key>.
+
+Användning:
+    python benchmarks/bench_image_storage.py [antal_bilder]
+"""
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+FOLDER = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(FOLDER, 'bench_image_storage.db')}"
+os.environ['IMAGE_STORAGE_BACKEND'] = 'local'
+os.environ['IMAGE_STORAGE_PATH'] = os.path.join(FOLDER, 'image_store')
+
+from PIL import Image, ImageFilter
+from app import app
+from config.db_config import db
+
+READS = 500
+
+
+def photo(seed):
+    # Brus + oskärpa komprimeras ungefär som ett foto
+    image = Image.effect_noise((3000, 2000), 30 + seed % 20).convert('RGB').filter(ImageFilter.GaussianBlur(2))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        photos = [photo(i) for i in range(count)]
+        print(f"{count} photos, {sum(map(len, photos)) / count / 1024 / 1024:.2f} MB on average\n")
+
+        started = time.perf_counter()
+        status_urls = []
+        for i, data in enumerate(photos):
+            response = client.post('/api/images/upload/registration', data={'file': (io.BytesIO(data), f'photo{i}.jpg')},
+                                   content_type='multipart/form-data')
+            status_urls.append(json.loads(response.data)['status_url'])
+
+        jobs = []
+        for status_url in status_urls:
+            while True:
+                job = json.loads(client.get(status_url).data)
+                if job['status'] in ('done', 'failed'):
+                    break
+                time.sleep(0.01)
+            assert job['status'] == 'done', job
+            jobs.append(job)
+        elapsed = time.perf_counter() - started
+        saved = sum(job['bytes_saved'] for job in jobs)
+        print(f"upload + downscale + store: {elapsed * 1000 / count:7.1f} ms/photo, {saved / 1024 / 1024:.1f} MB saved\n")
+
+        url = jobs[0]['image_url']
+        for label, headers in (('full read', {}), ('range 64kB', {'Range': 'bytes=0-65535'})):
+            started = time.perf_counter()
+            for _ in range(READS):
+                response = client.get(url, headers=headers)
+                assert response.status_code in (200, 206)
+            print(f"{label:>11}: {(time.perf_counter() - started) * 1000 / READS:6.3f} ms/request ({len(response.data)} bytes)")
+
+    shutil.rmtree(FOLDER)
+
+
+if __name__ == '__main__':
+    main()
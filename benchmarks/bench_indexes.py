@@ -0,0 +1,134 @@
+"""
+Benchmark: query plans and timings for the per-user queries before and after
+the secondary indexes added in utils/db_migrations.add_missing_indexes.
+
+Builds a throwaway SQLite database, drops the new indexes to simulate a
+database created by an older version, fills it with data and runs the
+journal, goals, achievements and leaderboard-maintenance queries. Then
+upgrades the database in place and runs the same queries again.
+
+Användning:
+    python benchmarks/bench_indexes.py [antal_användare] [rutter_per_användare]
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_indexes.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from sqlalchemy import text, func, insert
+from app import app
+from config.db_config import db
+from models.users_model import User
+from models.routes_model import Route
+from models.difficulty_levels_model import DifficultyLevel
+from models.completed_routes_model import CompletedRoute
+from models.goals_model import Goal
+from models.achievements_model import Achievement
+from controllers.journal_controller import _journal_query
+from utils.db_migrations import add_missing_indexes
+
+NEW_INDEXES = [
+    'ix_completed_routes_user_id_date',
+    'ix_completed_routes_route_id',
+    'ix_goals_user_id_status',
+    'ix_achievements_user_id_achievement_date',
+    'ix_routes_difficulty_id',
+]
+REPEATS = 50
+
+
+def seed(users, routes_per_user):
+    db.session.execute(insert(DifficultyLevel), [{'grade': g} for g in ['5', '6A', '6B', '7A', '7B', '8A']])
+    db.session.execute(insert(User), [{
+        'username': f'user{i}',
+        'hashed_password': 'x',
+        'email': f'user{i}@example.com',
+        'profile_image_url': 'https://i.imgur.com/3sceVnu.jpeg'
+    } for i in range(users)])
+
+    total = users * routes_per_user
+    db.session.execute(insert(Route), [{'difficulty_id': random.randint(1, 6), 'type': 'boulder', 'name': f'Route {i}'} for i in range(total)])
+
+    start = datetime(2024, 1, 1)
+    db.session.execute(insert(CompletedRoute), [{
+        'user_id': random.randint(1, users),
+        'route_id': i + 1,
+        'flash': random.random() < 0.3,
+        'date': start + timedelta(minutes=random.randint(0, 500000))
+    } for i in range(total)])
+    db.session.execute(insert(Goal), [{'user_id': random.randint(1, users), 'title': 'Goal', 'status': False} for _ in range(users * 5)])
+    db.session.execute(insert(Achievement), [{
+        'user_id': random.randint(1, users),
+        'achievement_name': 'Achievement',
+        'achievement_date': start
+    } for _ in range(users * 5)])
+    db.session.commit()
+
+
+def queries(user_id):
+    """The per-user queries the controllers run, as (label, statement)."""
+    return [
+        ('journal page', _journal_query()
+            .filter(CompletedRoute.user_id == user_id)
+            .order_by(CompletedRoute.date.desc(), CompletedRoute.id.desc())
+            .limit(50).statement),
+        ('user stats last climb', db.session.query(func.max(CompletedRoute.date))
+            .filter(CompletedRoute.user_id == user_id).statement),
+        ('goals', Goal.query.filter_by(user_id=user_id).statement),
+        ('open goals', Goal.query.filter_by(user_id=user_id, status=False).statement),
+        ('achievements', Achievement.query.filter_by(user_id=user_id).statement),
+        ('routes per grade', db.session.query(func.count(Route.id)).filter(Route.difficulty_id == 3).statement),
+    ]
+
+
+def run(title, user_ids):
+    print(f"\n=== {title} ===")
+    for label, statement in queries(user_ids[0]):
+        sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+
+        started = time.perf_counter()
+        for user_id in user_ids:
+            db.session.execute(dict(queries(user_id))[label]).fetchall()
+        elapsed_ms = (time.perf_counter() - started) * 1000 / len(user_ids)
+
+        print(f"{label:24} {elapsed_ms:8.3f} ms/query   plan: {' | '.join(row[-1] for row in plan)}")
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    routes_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with app.app_context():
+        db.create_all()
+        for name in NEW_INDEXES:
+            db.session.execute(text(f'DROP INDEX IF EXISTS {name}'))
+        db.session.commit()
+
+        print(f"Seeding {users} users with {users * routes_per_user} completed routes ({DB_PATH})...")
+        seed(users, routes_per_user)
+        user_ids = random.sample(range(1, users + 1), min(REPEATS, users))
+
+        run('before: database without secondary indexes', user_ids)
+
+        started = time.perf_counter()
+        created = add_missing_indexes(db)
+        # Fresh connections, so no statement prepared against the old schema is reused
+        db.session.remove()
+        db.engine.dispose()
+        print(f"\nUpgraded in place: created {len(created)} indexes in {time.perf_counter() - started:.2f}s")
+
+        run('after: add_missing_indexes', user_ids)
+
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: login throughput for each password hashing cost setting.
+
+Builds a throwaway SQLite database with one user per setting and runs
+concurrent POST /api/auth/login requests against it, while a second set of
+threads calls a cheap endpoint to show how much hashing stalls other
+requests. Hash calls run in the bounded pool from utils/password_hashing.
+
+Användning:
+    python benchmarks/bench_login.py [antal_inloggningar] [samtidiga_klienter]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_login.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from app import app
+from config.db_config import db, Config
+from controllers.user_controller import create_user
+from utils.password_hashing import hashing_stats
+
+COST_SETTINGS = [
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+]
+PASSWORD = 'benchmark-password'
+
+
+def login(username):
+    response = app.test_client().post('/api/auth/login', json={'username': username, 'password': PASSWORD})
+    assert response.status_code == 200, response.data
+
+
+def run(method, logins, clients):
+    Config.PASSWORD_HASH_METHOD = method
+    username = f"u{COST_SETTINGS.index(method)}"
+    with app.app_context():
+        _, error = create_user(username, PASSWORD, email=f'{username}@example.com')
+        assert error is None, error
+
+    # Latency of a request that does no hashing, measured while logins run
+    other_latencies = []
+    stop = threading.Event()
+
+    def other_requests():
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/')
+            other_latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    before = hashing_stats()
+    background = threading.Thread(target=other_requests)
+    background.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(login, [username] * logins))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    background.join()
+    after = hashing_stats()
+
+    waited = after['wait_seconds'] - before['wait_seconds']
+    hashed = after['completed'] - before['completed']
+    other_p99 = sorted(other_latencies)[int(len(other_latencies) * 0.99)] * 1000 if other_latencies else 0.0
+    print(f"{method:24} {logins / elapsed:8.1f} logins/s   "
+          f"avg queue wait {waited * 1000 / max(hashed, 1):7.2f} ms   "
+          f"max in flight {after['max_in_flight']:3}   other requests p99 {other_p99:6.2f} ms")
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    with app.app_context():
+        db.create_all()
+
+    print(f"{logins} logins from {clients} concurrent clients, "
+          f"{Config.PASSWORD_HASH_WORKERS} hashing workers ({DB_PATH})")
+    for method in COST_SETTINGS:
+        run(method, logins, clients)
+
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
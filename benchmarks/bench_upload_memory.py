@@ -0,0 +1,116 @@
+"""
+Benchmark: peak memory (RSS) per concurrent image upload.
+
+Starts a local stand-in for the Imgur API that discards what it receives,
+then for 1, 2, 4 and 8 concurrent 10MB uploads measures the peak RSS of a
+fresh process running either the old path (read the whole file, base64 it,
+form-encode it) or upload_to_imgur, which base64-encodes from disk while
+the request body is sent.
+
+Användning:
+    python benchmarks/bench_upload_memory.py [filstorlek_mb]
+"""
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+CONCURRENCY = (1, 2, 4, 8)
+
+
+class DiscardHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        remaining = int(self.headers['Content-Length'])
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 1 << 16)))
+        body = json.dumps({'success': True, 'data': {'link': 'https://i.imgur.com/bench.jpg'}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def peak_rss_mb():
+    # ru_maxrss är i kB på Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def legacy_upload(url, filepath):
+    """The upload path before streaming: route size check, read, base64, form-encode."""
+    import requests
+    with open(filepath, 'rb') as file:
+        file_data = file.read()
+    with open(filepath, 'rb') as file:
+        binary_data = file.read()
+    data = {'image': base64.b64encode(binary_data), 'type': 'base64', 'name': os.path.basename(filepath)}
+    response = requests.post(url, data=data, timeout=60)
+    assert response.status_code == 200 and len(file_data) == len(binary_data)
+
+
+def child(mode, concurrency, url, files):
+    import controllers.image_controller as image_controller
+    image_controller.IMGUR_API_URL = url
+
+    def streaming_upload(url, filepath):
+        image_url, error = image_controller.upload_to_imgur(filepath)
+        assert error is None, error
+
+    upload = legacy_upload if mode == 'legacy' else streaming_upload
+    baseline = peak_rss_mb()
+    threads = [threading.Thread(target=upload, args=(url, filepath)) for filepath in files[:concurrency]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps({'baseline': baseline, 'peak': peak_rss_mb()}))
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DiscardHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/3/image'
+
+    folder = tempfile.mkdtemp()
+    files = []
+    for i in range(max(CONCURRENCY)):
+        filepath = os.path.join(folder, f'photo{i}.jpg')
+        with open(filepath, 'wb') as file:
+            file.write(os.urandom(int(size_mb * 1024 * 1024)))
+        files.append(filepath)
+
+    print(f"{size_mb:g}MB per upload, peak RSS above the process baseline\n")
+    print(f"{'concurrent':>10}  {'legacy MB/upload':>17}  {'streaming MB/upload':>20}")
+    for concurrency in CONCURRENCY:
+        results = {}
+        for mode in ('legacy', 'streaming'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', mode, str(concurrency), url, *files],
+                capture_output=True, text=True, check=True
+            ).stdout
+            rss = json.loads(output.strip().splitlines()[-1])
+            results[mode] = (rss['peak'] - rss['baseline']) / concurrency
+        print(f"{concurrency:>10}  {results['legacy']:>17.1f}  {results['streaming']:>20.1f}")
+
+    server.shutdown()
+    for filepath in files:
+        os.remove(filepath)
+    os.rmdir(folder)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], int(sys.argv[3]), sys.argv[4], sys.argv[5:])
+    else:
+        main()
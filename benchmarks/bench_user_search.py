@@ -0,0 +1,82 @@
+"""
+Benchmark: prefix user search (GET /api/users/search?q=...) on a large users table.
+
+Builds a throwaway SQLite database with random usernames, then times
+user_controller.search_users for prefixes of length 1-4 and prints the
+query plan, which should be a range SEARCH on ix_users_username_lower.
+
+Användning:
+    python benchmarks/bench_user_search.py [antal_användare]
+"""
+import os
+import sys
+import random
+import string
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_user_search.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from sqlalchemy import insert, text
+from app import app
+from config.db_config import db
+from models.users_model import User
+from controllers.user_controller import search_users
+
+BATCH = 50000
+REPEATS = 200
+
+
+def seed(users):
+    for start in range(0, users, BATCH):
+        rows = []
+        for i in range(start, min(start + BATCH, users)):
+            # Slumpat namn plus löpnummer, så att användarnamnen är unika
+            name = ''.join(random.choices(string.ascii_letters, k=random.randint(3, 10))) + str(i)
+            name = name[-20:]
+            rows.append({
+                'username': name,
+                'username_lower': name.lower(),
+                'hashed_password': 'x',
+                'email': f'user{i}@example.com',
+                'profile_image_url': 'https://i.imgur.com/3sceVnu.jpeg'
+            })
+        db.session.execute(insert(User), rows)
+        db.session.commit()
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with app.app_context():
+        db.create_all()
+        print(f"Seeding {users} users ({DB_PATH})...")
+        started = time.perf_counter()
+        seed(users)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s\n")
+
+        plan = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id, username, profile_image_url FROM users "
+            "WHERE username_lower >= 'ab' AND username_lower < 'ac' ORDER BY username_lower LIMIT 10"
+        )).fetchall()
+        print(f"plan: {' | '.join(row[-1] for row in plan)}\n")
+
+        for length in range(1, 5):
+            prefixes = [''.join(random.choices(string.ascii_letters, k=length)) for _ in range(REPEATS)]
+            started = time.perf_counter()
+            found = 0
+            for prefix in prefixes:
+                result, error = search_users(prefix, 10)
+                assert error is None, error
+                found += len(result)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / REPEATS
+            print(f"prefix length {length}: {elapsed_ms:7.3f} ms/search   {found / REPEATS:5.1f} hits on average")
+
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,57 @@ class Config:
     # 🔐 Fallback används om .env-nyckel saknas
     SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///myboulders.db")
+    # ⏱️ Livslängd för access-tokens (minuter) och refresh-tokens (dagar)
+    ACCESS_TOKEN_MINUTES = int(os.getenv("ACCESS_TOKEN_MINUTES", 15))
+    REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", 30))
+    # 🚫 Hur ofta (sekunder) varje process läser nya återkallade tokens ur revoked_tokens. En token som
+    # återkallats i en annan process godtas här som längst så här länge, i den egna processen aldrig
+    REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", 5))
+    # 👥 Nyckel för POST /api/users/bulk (header X-Provisioning-Key), endpointen är avstängd om den saknas
+    PROVISIONING_KEY = os.getenv("PROVISIONING_KEY")
+    # 🖼️ Antal bakgrundstrådar som laddar upp bilder till bildvärden
+    IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", 4))
+    # 🧾 Antal dagar som klara och misslyckade uppladdningsjobb sparas (rensas med prune-tokens)
+    UPLOAD_JOB_RETENTION_DAYS = int(os.getenv("UPLOAD_JOB_RETENTION_DAYS", 7))
+    # 🗄️ Bildlagring: "imgur" eller "local" (innehållsadresserade filer under IMAGE_STORAGE_PATH,
+    # serverade på IMAGE_STORAGE_URL_PREFIX). USE_X_SENDFILE låter webbservern skicka filerna
+    IMAGE_STORAGE_BACKEND = os.getenv("IMAGE_STORAGE_BACKEND", "imgur")
+    IMAGE_STORAGE_PATH = os.getenv("IMAGE_STORAGE_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "image_store"))
+    IMAGE_STORAGE_URL_PREFIX = os.getenv("IMAGE_STORAGE_URL_PREFIX", "/api/images/files")
+    USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "false").lower() == "true"
+    # 🧹 Temp-spoolen för uppladdningar: mapp, max antal reserverade bytes per process (fler
+    # uppladdningar väntar TEMP_SPOOL_WAIT_SECONDS och får sedan 503; N processer som delar mappen
+    # kan tillsammans använda N gånger gränsen), ålder då filer räknas som kvarglömda och hur ofta
+    # de sopas bort
+    TEMP_SPOOL_PATH = os.getenv("TEMP_SPOOL_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "temp"))
+    TEMP_SPOOL_MAX_BYTES = int(os.getenv("TEMP_SPOOL_MAX_BYTES", 200 * 1024 * 1024))
+    TEMP_SPOOL_WAIT_SECONDS = float(os.getenv("TEMP_SPOOL_WAIT_SECONDS", 5))
+    TEMP_SPOOL_MAX_AGE_SECONDS = int(os.getenv("TEMP_SPOOL_MAX_AGE_SECONDS", 3600))
+    TEMP_SPOOL_JANITOR_SECONDS = int(os.getenv("TEMP_SPOOL_JANITOR_SECONDS", 300))
+    # 🌐 Anrop till bildvärden: timeouts (sekunder), antal försök och backoff (första steget och tak)
+    IMAGE_HOST_CONNECT_TIMEOUT = float(os.getenv("IMAGE_HOST_CONNECT_TIMEOUT", 5))
+    IMAGE_HOST_READ_TIMEOUT = float(os.getenv("IMAGE_HOST_READ_TIMEOUT", 60))
+    IMAGE_HOST_RETRIES = int(os.getenv("IMAGE_HOST_RETRIES", 4))
+    IMAGE_HOST_BACKOFF_SECONDS = float(os.getenv("IMAGE_HOST_BACKOFF_SECONDS", 1))
+    IMAGE_HOST_MAX_BACKOFF_SECONDS = float(os.getenv("IMAGE_HOST_MAX_BACKOFF_SECONDS", 30))
+    # 📐 Bilder skalas ner till högst IMAGE_MAX_WIDTH x IMAGE_MAX_HEIGHT och komprimeras
+    # med IMAGE_QUALITY (JPEG) i IMAGE_PROCESS_WORKERS processer innan uppladdning
+    IMAGE_MAX_WIDTH = int(os.getenv("IMAGE_MAX_WIDTH", 2048))
+    IMAGE_MAX_HEIGHT = int(os.getenv("IMAGE_MAX_HEIGHT", 2048))
+    IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 82))
+    IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+    # 🔑 Lösenordshashning: werkzeug-metod (t.ex. "scrypt:32768:8:1" eller "pbkdf2:sha256:600000"),
+    # antal trådar som hashar samtidigt och hur många anrop som får vänta i kö
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+    PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
+    # 🚦 Misslyckade inloggningar per glidande fönster, per användarnamn och per IP.
+    # Backend "memory" räknar per process, "sqlite" delar räknarna mellan processer via LOGIN_THROTTLE_DB_PATH
+    LOGIN_THROTTLE_WINDOW_SECONDS = int(os.getenv("LOGIN_THROTTLE_WINDOW_SECONDS", 300))
+    LOGIN_THROTTLE_USER_LIMIT = int(os.getenv("LOGIN_THROTTLE_USER_LIMIT", 10))
+    LOGIN_THROTTLE_IP_LIMIT = int(os.getenv("LOGIN_THROTTLE_IP_LIMIT", 100))
+    LOGIN_THROTTLE_BACKEND = os.getenv("LOGIN_THROTTLE_BACKEND", "memory")
+    LOGIN_THROTTLE_DB_PATH = os.getenv("LOGIN_THROTTLE_DB_PATH", "login_throttle.db")
 
 def get_db_uri():
     return Config.SQLALCHEMY_DATABASE_URI
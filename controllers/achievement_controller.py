@@ -1,15 +1,11 @@
 from models.achievements_model import Achievement
-from models.users_model import User
 from config.db_config import db
+from utils.conditional_get import bump_versions, user_version_key
 from sqlalchemy.sql import func
 
 def get_user_achievements(user_id):
-    # Verify user authentication
+    # Användaren är redan autentiserad och kontrollerad av auth_required
     try:
-        user = User.query.get(user_id)
-        if not user:
-            return None, 'User not found'
-
         # Get achievements for the user    
         achievements = Achievement.query.filter_by(user_id=user_id).all()
         return [{
@@ -23,10 +19,6 @@ def get_user_achievements(user_id):
 
 def add_achievement(user_id, achievement_name):
     try:
-        user = User.query.get(user_id)
-        if not user:
-            return None, 'User not found'
-        
         # Check if the achievement already exists for the user    
         new_achievement = Achievement(
             user_id=user_id,
@@ -34,6 +26,7 @@ def add_achievement(user_id, achievement_name):
         )
         
         db.session.add(new_achievement)
+        bump_versions(user_version_key(user_id))
         db.session.commit()
         
         return {
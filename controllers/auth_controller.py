@@ -1,30 +1,174 @@
 import jwt
 import datetime
+import hashlib
+import secrets
+import uuid
 from flask import request, jsonify
+from sqlalchemy import update, delete
 from models.users_model import User
-from werkzeug.security import check_password_hash
-from config.db_config import Config
+from models.refresh_tokens_model import RefreshToken
+from models.revoked_tokens_model import RevokedToken
+from config.db_config import Config, db
+from utils.password_hashing import HashingBusyError, needs_rehash
+from utils.token_revocation import revoke_token, reset_revocation_filter
+
+# Felmeddelande när hashningspoolen är full, login_route svarar 503
+LOGIN_BUSY_ERROR = "Too many login attempts in progress, try again shortly"
 
 # 🔐 Generate JWT token
 def create_jwt_token(user_id, username):
     payload = {
         'id': user_id,
         'username': username,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        # Unikt id, används för att återkalla tokenet vid utloggning
+        'jti': uuid.uuid4().hex,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=Config.ACCESS_TOKEN_MINUTES)
     }
     token = jwt.encode(payload, Config.SECRET_KEY, algorithm='HS256')
     return token
 
+def _hash_refresh_token(refresh_token):
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+# 🔄 Generate refresh token (does not commit)
+def create_refresh_token(user_id):
+    refresh_token = secrets.token_urlsafe(32)
+    db.session.add(RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_refresh_token(refresh_token),
+        expires_at=datetime.datetime.utcnow() + datetime.timedelta(days=Config.REFRESH_TOKEN_DAYS)
+    ))
+    return refresh_token
+
 # ✅ Handle login
 def authenticate_user(username, password):
     user = User.query.filter_by(username=username).first()
     if not user:
         return None, "User not found"
 
-    if not user.check_password(password):
-        return None, "Invalid password"
+    try:
+        if not user.check_password(password):
+            return None, "Invalid password"
+    except HashingBusyError:
+        return None, LOGIN_BUSY_ERROR
+
+    # Hasha om med nuvarande PASSWORD_HASH_METHOD om parametrarna ändrats,
+    # ett misslyckande här stoppar inte inloggningen
+    if needs_rehash(user.hashed_password):
+        try:
+            user.set_password(password)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+    try:
+        tokens = {
+            'access_token': create_jwt_token(user.id, user.username),
+            'refresh_token': create_refresh_token(user.id)
+        }
+        db.session.commit()
+        return tokens, None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Database error: {str(e)}"
+
+# 🔄 Rotate refresh token
+def refresh_access_token(refresh_token):
+    """
+    Exchange a refresh token for a new access token and a new refresh token.
+
+    Each refresh token can be used once. Presenting one that was already
+    rotated means it may have been copied, so all of the user's refresh
+    tokens are revoked.
+
+    Returns:
+        tuple: ({'access_token', 'refresh_token'} or None, error message or None)
+    """
+    stored = RefreshToken.query.filter_by(token_hash=_hash_refresh_token(refresh_token or '')).first()
+    if not stored:
+        return None, "Invalid refresh token"
+
+    now = datetime.datetime.utcnow()
+    try:
+        # Villkorlig uppdatering, så att två samtidiga anrop inte båda kan rotera samma token
+        rotated = db.session.execute(
+            update(RefreshToken)
+            .where(RefreshToken.id == stored.id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not rotated:
+            db.session.execute(
+                update(RefreshToken)
+                .where(RefreshToken.user_id == stored.user_id, RefreshToken.revoked_at.is_(None))
+                .values(revoked_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return None, "Refresh token has been revoked"
+
+        if stored.expires_at <= now:
+            db.session.commit()
+            return None, "Refresh token has expired"
+
+        user = db.session.get(User, stored.user_id)
+        if not user:
+            db.session.rollback()
+            return None, "User not found"
+
+        tokens = {
+            'access_token': create_jwt_token(user.id, user.username),
+            'refresh_token': create_refresh_token(user.id)
+        }
+        db.session.commit()
+        return tokens, None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Database error: {str(e)}"
+
+# 🚪 Handle logout
+def revoke_session(access_token=None, refresh_token=None):
+    """
+    Revoke the access token (until its exp) and the refresh token of a session.
+    Tokens that are invalid or already expired are ignored.
+
+    Returns:
+        tuple: (True or None, error message or None)
+    """
+    try:
+        if access_token:
+            try:
+                payload = jwt.decode(access_token, Config.SECRET_KEY, algorithms=['HS256'])
+                if payload.get('jti'):
+                    revoke_token(payload['jti'], datetime.datetime.utcfromtimestamp(payload['exp']))
+            except jwt.InvalidTokenError:
+                pass
+
+        if refresh_token:
+            db.session.execute(
+                update(RefreshToken)
+                .where(RefreshToken.token_hash == _hash_refresh_token(refresh_token), RefreshToken.revoked_at.is_(None))
+                .values(revoked_at=datetime.datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+
+        db.session.commit()
+        return True, None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Database error: {str(e)}"
 
-    token = create_jwt_token(user.id, user.username)
-    return token, None
+# 🧹 Remove expired refresh tokens and revocations
+def prune_expired_tokens():
+    try:
+        now = datetime.datetime.utcnow()
+        removed = db.session.execute(delete(RefreshToken).where(RefreshToken.expires_at <= now)).rowcount
+        removed += db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now)).rowcount
+        db.session.commit()
+        reset_revocation_filter()
+        return removed, None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Database error: {str(e)}"
 
 
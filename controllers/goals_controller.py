@@ -1,15 +1,12 @@
 from models.goals_model import Goal
-from models.users_model import User
 from config.db_config import db
+from utils.conditional_get import bump_versions, user_version_key
 from sqlalchemy.sql import func
 from datetime import datetime
 
 def get_user_goals(user_id):
+    # user_id kommer från en inloggad användare, auth_required har redan kontrollerat att den finns
     try:
-        user = User.query.get(user_id)
-        if not user:
-            return None, 'User not found'
-            
         goals = Goal.query.filter_by(user_id=user_id).all()
         return [{
             'id': goal.id,
@@ -24,10 +21,6 @@ def get_user_goals(user_id):
 
 def create_goal(user_id, goal_data):
     try:
-        user = User.query.get(user_id)
-        if not user:
-            return None, 'User not found'
-            
         new_goal = Goal(
             user_id=user_id,
             title=goal_data['title'],
@@ -37,6 +30,7 @@ def create_goal(user_id, goal_data):
         )
         
         db.session.add(new_goal)
+        bump_versions(user_version_key(user_id))
         db.session.commit()
         
         return {
@@ -64,6 +58,7 @@ def update_goal(goal_id, user_id, goal_data):
         goal.description = goal_data.get('description', '')
         goal.target_date = datetime.strptime(goal_data['target_date'], '%Y-%m-%d') if goal_data.get('target_date') else None
         
+        bump_versions(user_version_key(user_id))
         db.session.commit()
         
         return {
@@ -88,6 +83,7 @@ def update_goal_status(goal_id, user_id, completed):
             return None, 'Unauthorized access to this goal'
             
         goal.status = completed
+        bump_versions(user_version_key(user_id))
         db.session.commit()
         
         return {
@@ -112,6 +108,7 @@ def delete_goal(goal_id, user_id):
             return None, 'Unauthorized access to this goal'
             
         db.session.delete(goal)
+        bump_versions(user_version_key(user_id))
         db.session.commit()
         
         return {'message': f'Goal {goal_id} deleted successfully'}, None
@@ -3,17 +3,30 @@ import sys
 import requests
 import base64
 import time
-import random
-import string
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from werkzeug.utils import secure_filename
+from flask import current_app
+from sqlalchemy import update, delete, func
+from sqlalchemy.exc import IntegrityError
 
 # Add the project root to Python path for proper imports
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 
-from config.db_config import db
+from config.db_config import db, Config
+from utils.conditional_get import bump_versions, user_version_key
+from utils.user_cache import invalidate_user
+from utils.image_processing import process_image
+from utils.http_client import request_with_backoff
+from utils.image_storage import LocalStorage
+from utils.temp_spool import adopt_spool_file, owner_alive
 from models.completed_routes_model import CompletedRoute
 from models.users_model import User
+from models.upload_jobs_model import UploadJob
+from models.image_hashes_model import ImageHash
+from controllers.leaderboard_controller import record_completion
 
 # Ladda miljövariabler
 load_dotenv()
@@ -21,8 +34,9 @@ load_dotenv()
 # Imgur API-uppgifter
 IMGUR_CLIENT_ID = os.getenv('IMGUR_CLIENT_ID')
 IMGUR_CLIENT_SECRET = os.getenv('IMGUR_CLIENT_SECRET')
-IMGUR_API_URL = 'https://api.imgur.com/3/image'
-IMGUR_AUTH_URL = 'https://api.imgur.com/oauth2/token'
+# Kan pekas om till en lokal stubserver, t.ex. i tester
+IMGUR_API_URL = os.getenv('IMGUR_API_URL', 'https://api.imgur.com/3/image')
+IMGUR_AUTH_URL = os.getenv('IMGUR_AUTH_URL', 'https://api.imgur.com/oauth2/token')
 
 # Kontouppgifter för högre uppladdningsgränser
 IMGUR_USERNAME = os.getenv('IMGUR_USERNAME')
@@ -32,6 +46,60 @@ IMGUR_PASSWORD = os.getenv('IMGUR_PASSWORD')
 IMGUR_ACCESS_TOKEN = None
 IMGUR_TOKEN_EXPIRY = 0
 
+# Bytes som läses åt gången när bilder base64-kodas,
+# delbart med 3 så att base64-bitarna kan sättas ihop utan utfyllnad
+STREAM_CHUNK_SIZE = 3 * 16 * 1024
+
+
+class FileTooLargeError(Exception):
+    """Raised by save_image when the uploaded file is larger than max_size."""
+
+
+class Base64UploadBody:
+    """
+    Multipart-kropp för uppladdning där bilden base64-kodas i bitar medan den skickas.
+
+    requests läser kroppen som en fil, så bara en bit av bilden finns i minnet
+    åt gången. Längden är känd i förväg (base64 är 4/3 av filens storlek),
+    vilket ger en vanlig Content-Length i stället för chunked encoding.
+    """
+
+    def __init__(self, filepath, fields, boundary=None):
+        boundary = boundary or uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        head = ''.join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += f'--{boundary}\r\nContent-Disposition: form-data; name="image"\r\n\r\n'
+        tail = f'\r\n--{boundary}--\r\n'.encode()
+
+        self._length = len(head.encode()) + 4 * ((os.path.getsize(filepath) + 2) // 3) + len(tail)
+        self._file = open(filepath, 'rb')
+        self._buffer = head.encode()
+        self._tail = tail
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        while self._file and (size < 0 or len(self._buffer) < size):
+            chunk = self._file.read(STREAM_CHUNK_SIZE)
+            if chunk:
+                self._buffer += base64.b64encode(chunk)
+            else:
+                self._buffer += self._tail
+                self.close()
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
 
 def get_account_token():
     """
@@ -57,7 +125,8 @@ def get_account_token():
     
     try:
         # Använd Password Grant flow för att autentisera
-        response = requests.post(
+        response = request_with_backoff(
+            'POST',
             IMGUR_AUTH_URL,
             data={
                 'client_id': IMGUR_CLIENT_ID,
@@ -82,17 +151,18 @@ def get_account_token():
         return None
 
 
-def upload_to_imgur(filepath, max_retries=3, retry_delay=2):
+def upload_to_imgur(filepath, max_retries=None, retry_delay=None):
     """
     Ladda upp en bild till Imgur och få direktlänk till bilden.
     
     Försöker automatiskt använda kontoinloggning för högre uppladdningsgränser om möjligt.
-    Implementerar retry-logik för bättre hantering av tillfälliga nätverksproblem.
+    Anropet går via den delade sessionen i utils/http_client.py, med
+    exponentiell backoff med jitter vid nätverksfel, 429 och 5xx.
     
     Args:
         filepath (str): Sökväg till bildfilen som ska laddas upp
-        max_retries (int): Maximalt antal försök vid nätverksfel
-        retry_delay (int): Sekunder att vänta mellan försök
+        max_retries (int, optional): Maximalt antal försök, standard IMAGE_HOST_RETRIES
+        retry_delay (float, optional): Första väntetiden i sekunder, standard IMAGE_HOST_BACKOFF_SECONDS
         
     Returns:
         tuple: (direktlänk till bilden (str) eller None, felmeddelande (str) eller None)
@@ -106,13 +176,6 @@ def upload_to_imgur(filepath, max_retries=3, retry_delay=2):
         file_size_mb = os.path.getsize(filepath) / (1024 * 1024)
         need_account = file_size_mb > 9.5  # Gräns lite under 10MB för säkerhets skull
         
-        # Läs bildfilen som binärdata
-        with open(filepath, 'rb') as file:
-            binary_data = file.read()
-        
-        # Konvertera bilden till base64
-        b64_image = base64.b64encode(binary_data)
-        
         # Försök att hämta access token om filen är stor
         if need_account:
             access_token = get_account_token()
@@ -133,54 +196,91 @@ def upload_to_imgur(filepath, max_retries=3, retry_delay=2):
                 'Authorization': f'Client-ID {IMGUR_CLIENT_ID}'
             }
         
-        # Förbereder data för uppladdning
-        data = {
-            'image': b64_image,
+        # Förbereder fälten för uppladdning, bilden läses från disk och kodas medan den skickas
+        fields = {
             'type': 'base64',
             'name': os.path.basename(filepath),
             'title': f'MyBoulders upload: {os.path.basename(filepath)}'
         }
         
-        # Försök med flera försök vid nätverksfel
-        for attempt in range(max_retries):
-            try:
-                # Skicka förfrågan till Imgur API
-                response = requests.post(
-                    IMGUR_API_URL,
-                    headers=headers,
-                    data=data,
-                    timeout=30  # Explicit timeout
-                )
-                
-                # Kontrollera om uppladdningen lyckades
-                if response.status_code == 200:
-                    json_data = response.json()
-                    
-                    if json_data.get('success'):
-                        # Hämta direktlänk till bilden
-                        image_url = json_data['data']['link']
-                        return image_url, None
-                    else:
-                        error_msg = json_data.get('data', {}).get('error', 'Okänt fel')
-                
-                # Om vi får 5xx-fel från servern, försök igen
-                if 500 <= response.status_code < 600:
-                    time.sleep(retry_delay)
-                    continue
-                
-                # För andra fel, returnera felmeddelande
-                return None, f"API-fel: {response.status_code} - {response.text}"
-                
-            except requests.exceptions.RequestException as e:
-                time.sleep(retry_delay)
+        # Samma gräns i alla försök, men en ny kropp per försök eftersom den förra kan vara delvis läst
+        boundary = uuid.uuid4().hex
+        headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+        try:
+            # Skicka förfrågan till Imgur API, nätverksfel, 429 och 5xx försöks igen med backoff
+            response = request_with_backoff(
+                'POST',
+                IMGUR_API_URL,
+                attempts=max_retries,
+                base_delay=retry_delay,
+                data_factory=lambda: Base64UploadBody(filepath, fields, boundary),
+                headers=headers
+            )
+        except requests.exceptions.RequestException:
+            return None, f"Uppladdning misslyckades efter {max_retries or Config.IMAGE_HOST_RETRIES} försök."
+        
+        # Kontrollera om uppladdningen lyckades
+        if response.status_code == 200:
+            json_data = response.json()
             
-        # Om vi når hit har alla försök misslyckats
-        return None, f"Uppladdning misslyckades efter {max_retries} försök."
+            if json_data.get('success'):
+                # Hämta direktlänk till bilden
+                image_url = json_data['data']['link']
+                return image_url, None
+        
+        return None, f"API-fel: {response.status_code} - {response.text}"
             
     except Exception as e:
         return None, f"Ett fel inträffade: {str(e)}"
 
 
+def delete_from_imgur(delete_hash):
+    """
+    Ta bort en bild från Imgur med dess deletehash.
+
+    Returns:
+        tuple: (True eller None, felmeddelande (str) eller None)
+    """
+    try:
+        response = request_with_backoff(
+            'DELETE',
+            f'{IMGUR_API_URL}/{delete_hash}',
+            headers={'Authorization': f'Client-ID {IMGUR_CLIENT_ID}'}
+        )
+    except requests.exceptions.RequestException as e:
+        return None, f"Image deletion error: {str(e)}"
+
+    if response.status_code == 200:
+        return True, None
+    return None, "Failed to delete image from Imgur"
+
+
+class ImgurStorage:
+    """Bildlagring hos Imgur, samma gränssnitt som utils.image_storage.LocalStorage."""
+
+    name = 'imgur'
+
+    def store(self, filepath):
+        return upload_to_imgur(filepath)
+
+    def delete(self, key):
+        return delete_from_imgur(key)
+
+
+_storage = None
+
+
+def get_image_storage():
+    """Lagringen för uppladdade bilder, väljs med IMAGE_STORAGE_BACKEND ('imgur' eller 'local')."""
+    global _storage
+    if _storage is None or _storage.name != Config.IMAGE_STORAGE_BACKEND:
+        if Config.IMAGE_STORAGE_BACKEND == 'local':
+            _storage = LocalStorage(Config.IMAGE_STORAGE_PATH, Config.IMAGE_STORAGE_URL_PREFIX)
+        else:
+            _storage = ImgurStorage()
+    return _storage
+
+
 def post_img_to_db(image_url, target_type, target_id, **kwargs):
     """
     Spara bildlänkar till databasen.
@@ -213,6 +313,7 @@ def post_img_to_db(image_url, target_type, target_id, **kwargs):
             if existing:
                 # Uppdatera befintlig genomförd rutt
                 existing.image_url = image_url
+                bump_versions(user_version_key(existing.user_id))
                 db.session.commit()
                 return existing, None
             else:
@@ -225,6 +326,8 @@ def post_img_to_db(image_url, target_type, target_id, **kwargs):
                     image_url=image_url
                 )
                 db.session.add(new_completed_route)
+                record_completion(new_completed_route)
+                bump_versions(user_version_key(user_id))
                 db.session.commit()
                 return new_completed_route, None
                 
@@ -235,7 +338,9 @@ def post_img_to_db(image_url, target_type, target_id, **kwargs):
                 return None, "Användaren hittades inte"
                 
             user.profile_image_url = image_url
+            bump_versions(user_version_key(user.id))
             db.session.commit()
+            invalidate_user(user.id)
             return user, None
             
         else:
@@ -246,45 +351,295 @@ def post_img_to_db(image_url, target_type, target_id, **kwargs):
         return None, f"Databasfel: {str(e)}"
 
 
-def save_image(file):
+def save_image(file, spooled, max_size=None):
     """
-    Spara en uppladdad bild med ett randomiserat filnamn.
+    Avsluta sparandet av en uppladdad bild i temp-spoolen.
     
-    Funktionen tar emot ett file-objekt från en Flask-request,
-    genererar ett slumpmässigt filnamn med 10 tecken plus originalfilens filtyp,
-    och sparar filen i temp-mappen.
+    Formulärtolken har redan skrivit filen direkt till spooled.path medan
+    requesten lästes (se utils/spool_request.py), så bilden ligger aldrig
+    i minnet eller i någon annan temporärfil. Här stängs filen, storleken
+    kontrolleras och reservationen i spoolen justeras till filens storlek.
     
     Args:
-        file: Ett Flask FileStorage-objekt från request.files
+        file: Ett Flask FileStorage-objekt från request.files, vars stream är en SpoolStream
+        spooled (SpoolFile): Platsen i temp-spoolen som filen skrivits till
+        max_size (int, optional): Största tillåtna storlek i bytes
         
     Returns:
-        str: Sökvägen till den sparade filen
+        str: Sökvägen till den sparade filen, eller None vid fel
+
+    Raises:
+        FileTooLargeError: Om filen är större än max_size
     """
     try:
-        # Skapa temporär mapp om den inte finns
-        temp_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'temp')
-        os.makedirs(temp_folder, exist_ok=True)
-        
-        # Extrahera filändelse från originalfilen
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        
-        # Generera ett slumpmässigt filnamn med 10 tecken
-        random_chars = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
-        filename = f"{random_chars}{file_extension}"
-        
-        # Fullständig sökväg
-        filepath = os.path.join(temp_folder, filename)
-        
-        # Spara filen
-        file.save(filepath)
-        
-        return filepath
+        file.stream.close()
+        if max_size is not None and file.stream.size > max_size:
+            raise FileTooLargeError(f"File larger than {max_size} bytes")
+
+        spooled.update_size()
+        return spooled.path
         
+    except FileTooLargeError:
+        raise
     except Exception as e:
         print(f"Fel vid sparande av bild: {str(e)}")
         return None
 
 
+# Bakgrundspool för uppladdningar, skapas vid första jobbet
+_upload_executor = None
+
+# Dedupliceringsstatistik för den här processen
+_dedup_lock = threading.Lock()
+_dedup_stats = {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+
+
+def find_uploaded_image(content_hash):
+    """
+    Slå upp en tidigare uppladdning med samma innehåll (SHA-256).
+
+    Vid träff räknas hits upp i image_hashes (committas med anroparens
+    transaktion) och länken returneras, så att filen inte laddas upp igen.
+
+    Returns:
+        str or None: Bildlänken om samma bytes redan laddats upp
+    """
+    row = ImageHash.query.filter_by(content_hash=content_hash).first()
+    with _dedup_lock:
+        if row:
+            _dedup_stats['hits'] += 1
+            _dedup_stats['bytes_saved'] += row.size_bytes
+        else:
+            _dedup_stats['misses'] += 1
+    if not row:
+        return None
+
+    db.session.execute(
+        update(ImageHash)
+        .where(ImageHash.content_hash == content_hash)
+        .values(hits=ImageHash.hits + 1, last_used_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return row.image_url
+
+
+def remember_uploaded_image(content_hash, image_url, size_bytes):
+    """Spara hash -> länk efter en lyckad uppladdning. Finns hashen redan behålls den första länken."""
+    try:
+        with db.session.begin_nested():
+            db.session.add(ImageHash(content_hash=content_hash, image_url=image_url, size_bytes=size_bytes))
+        db.session.commit()
+    except IntegrityError:
+        # Samma bild laddades upp samtidigt i ett annat jobb
+        db.session.rollback()
+
+
+def image_dedup_stats():
+    """Träffar och missar för dedupliceringen (per process) samt totalt i image_hashes."""
+    with _dedup_lock:
+        stats = dict(_dedup_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+    stored, total_hits = db.session.query(func.count(ImageHash.content_hash), func.sum(ImageHash.hits)).one()
+    stats['stored_images'] = stored
+    stats['total_hits'] = total_hits or 0
+    return stats
+
+
+def create_upload_job(spooled, user_id=None, target_type=None, target_id=None, route_id=None, flash=False, content_hash=None):
+    """
+    Registrera en sparad bild för uppladdning i bakgrunden.
+
+    Jobbet sparas i upload_jobs och körs i en trådpool med
+    IMAGE_UPLOAD_WORKERS trådar, så att requesten inte väntar på bildvärden.
+    Spoolfilen (spooled) lämnas över till arbetstråden, som tar bort den
+    när jobbet är klart. Har samma innehåll (content_hash) redan laddats
+    upp blir jobbet klart direkt med den befintliga länken, utan anrop
+    till bildvärden, och filen lämnas kvar åt anroparen att ta bort.
+    Status hämtas med get_upload_job.
+
+    Returns:
+        tuple: (dict med id, status, image_url och error eller None, felmeddelande (str) eller None)
+    """
+    try:
+        job = UploadJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            filepath=spooled.path,
+            target_type=target_type,
+            target_id=target_id,
+            route_id=route_id,
+            flash=flash,
+            content_hash=content_hash
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        image_url = find_uploaded_image(content_hash) if content_hash else None
+        if image_url:
+            _complete_upload_job(job, image_url)
+            db.session.commit()
+            return _upload_job_data(job), None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Databasfel: {str(e)}"
+
+    try:
+        _submit_upload_job(job.id, spooled.detach())
+    except Exception as e:
+        return None, f"Kunde inte starta uppladdningen: {str(e)}"
+    return _upload_job_data(job), None
+
+
+def _submit_upload_job(job_id, worker_file):
+    """Lämna över ett jobb och dess spoolfil till bakgrundspoolen. Filen tas bort om det inte går."""
+    global _upload_executor
+    if _upload_executor is None:
+        _upload_executor = ThreadPoolExecutor(max_workers=Config.IMAGE_UPLOAD_WORKERS, thread_name_prefix='image-upload')
+    try:
+        _upload_executor.submit(_run_upload_job, current_app._get_current_object(), job_id, worker_file)
+    except Exception:
+        worker_file.close()
+        raise
+
+
+def recover_upload_jobs():
+    """
+    Ta hand om uppladdningsjobb som avbröts när en tidigare process stoppades.
+
+    Jobb med status 'pending' eller 'processing' vars spoolfil tillhör en
+    process som inte längre körs tas över: finns filen kvar köas jobbet om
+    i den här processen, annars markeras det som misslyckat. Körs vid start,
+    före sopningen av spoolen som annars skulle ta bort filerna.
+
+    Returns:
+        tuple: ((antal omköade, antal misslyckade) eller None, felmeddelande eller None)
+    """
+    requeued = failed = 0
+    try:
+        jobs = UploadJob.query.filter(UploadJob.status.in_(('pending', 'processing'))).all()
+        for job in jobs:
+            if job.filepath and owner_alive(job.filepath):
+                continue
+
+            worker_file = adopt_spool_file(job.filepath) if job.filepath else None
+            if worker_file is None:
+                job.status, job.error = 'failed', 'Uppladdningen avbröts när servern startades om'
+                failed += 1
+                continue
+
+            job.status, job.filepath = 'pending', worker_file.path
+            db.session.commit()
+            try:
+                _submit_upload_job(job.id, worker_file)
+                requeued += 1
+            except Exception as e:
+                job.status, job.error = 'failed', f"Kunde inte starta uppladdningen: {str(e)}"
+                failed += 1
+        db.session.commit()
+        return (requeued, failed), None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Databasfel: {str(e)}"
+
+
+def prune_upload_jobs(retention_days=None):
+    """
+    Ta bort klara och misslyckade uppladdningsjobb äldre än
+    UPLOAD_JOB_RETENTION_DAYS. Klienten har då sedan länge hämtat statusen.
+
+    Returns:
+        tuple: (antal borttagna jobb eller None, felmeddelande eller None)
+    """
+    retention_days = Config.UPLOAD_JOB_RETENTION_DAYS if retention_days is None else retention_days
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        removed = db.session.execute(
+            delete(UploadJob).where(UploadJob.status.in_(('done', 'failed')), UploadJob.updated_at <= cutoff)
+        ).rowcount
+        db.session.commit()
+        return removed, None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Databasfel: {str(e)}"
+
+
+def _complete_upload_job(job, image_url):
+    """Spara länken på jobbets mål (om det har ett) och markera jobbet som klart. Committar inte jobbet."""
+    error = None
+    if job.target_type and job.target_id:
+        kwargs = {}
+        if job.target_type == 'completed_route':
+            kwargs = {'user_id': job.user_id, 'route_id': job.route_id, 'flash': job.flash}
+        _, db_error = post_img_to_db(image_url, job.target_type, job.target_id, **kwargs)
+        if db_error:
+            # Bilden är uppladdad, länken returneras ändå
+            error = f'Image uploaded but database save failed: {db_error}'
+
+    # Sätts efter post_img_to_db, som rullar tillbaka sessionen vid fel
+    job.status, job.image_url, job.error = 'done', image_url, error
+
+
+def _run_upload_job(app, job_id, spooled):
+    """
+    Ladda upp bilden för ett jobb till bildlagringen och spara länken, körs i bakgrundspoolen.
+    Spoolfilen tas bort när funktionen lämnas, hur det än gick.
+    """
+    with spooled, app.app_context():
+        job = db.session.get(UploadJob, job_id)
+        job.status = 'processing'
+        db.session.commit()
+
+        try:
+            # Skala ner och komprimera innan uppladdning, GIF:ar och bilder utan Pillow skickas som de är
+            processed, error = process_image(job.filepath)
+            if processed:
+                job.original_bytes, job.uploaded_bytes = processed['original_bytes'], processed['processed_bytes']
+                spooled.update_size()
+            if not error:
+                # Lokal lagring flyttar filen, så storleken läses innan
+                size_bytes = os.path.getsize(job.filepath)
+                image_url, error = get_image_storage().store(job.filepath)
+            if error:
+                job.status, job.error = 'failed', error
+            else:
+                if job.content_hash:
+                    remember_uploaded_image(job.content_hash, image_url, size_bytes)
+                _complete_upload_job(job, image_url)
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(UploadJob, job_id)
+            job.status, job.error = 'failed', f"Ett fel inträffade: {str(e)}"
+        finally:
+            db.session.commit()
+
+
+def _upload_job_data(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'image_url': job.image_url,
+        'error': job.error,
+        'original_bytes': job.original_bytes,
+        'uploaded_bytes': job.uploaded_bytes,
+        'bytes_saved': job.original_bytes - job.uploaded_bytes if job.original_bytes is not None else None
+    }
+
+
+def get_upload_job(job_id):
+    """
+    Hämta status för ett uppladdningsjobb.
+
+    Returns:
+        tuple: (dict med id, status, image_url, error och bytes_saved eller None, felmeddelande eller None)
+    """
+    # Jobbet uppdateras av en bakgrundstråd, läs alltid om raden
+    job = db.session.get(UploadJob, job_id, populate_existing=True)
+    if not job:
+        return None, "Jobbet hittades inte"
+    return _upload_job_data(job), None
+
+
 if __name__ == '__main__':
     """
     Test-funktion för manuell testning av bilduppladdning och databaslagring.
@@ -2,62 +2,215 @@ from models.completed_routes_model import CompletedRoute
 from models.routes_model import Route
 from models.difficulty_levels_model import DifficultyLevel
 from config.db_config import db
+from utils.conditional_get import bump_versions, user_version_key
+from controllers.route_controller import get_or_create_route, get_or_create_routes, get_or_create_difficulties, route_key
+from controllers.leaderboard_controller import record_completion, record_completions, remove_completion, change_completion
 from sqlalchemy.sql import func
+from sqlalchemy import and_, or_, insert, update
 from datetime import datetime
+import csv
+import io
+import json
 
-def get_journal_entries_by_user(user_id):
+# Sidstorlek för journalen
+JOURNAL_MAX_LIMIT = 500
+
+# Exportformat och antal rader som hämtas från databasen åt gången
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_BATCH_SIZE = 500
+EXPORT_CSV_COLUMNS = ['id', 'date', 'route_type', 'difficulty', 'flash', 'image_url', 'route_id']
+
+# Max antal rader i en bulkimport
+MAX_IMPORT_ROWS = 10000
+
+
+def _journal_query():
+    """
+    Journalanteckningar med ruttyp och grad hämtade i samma fråga.
+
+    Kolumnerna väljs direkt istället för att ladda Route/DifficultyLevel
+    via relationerna, så en sida kostar en enda SELECT oavsett antal rader.
+    """
+    return (
+        db.session.query(
+            CompletedRoute.id,
+            CompletedRoute.route_id,
+            CompletedRoute.user_id,
+            CompletedRoute.date,
+            CompletedRoute.flash,
+            CompletedRoute.image_url,
+            Route.type.label('route_type'),
+            DifficultyLevel.grade.label('difficulty')
+        )
+        .join(Route, CompletedRoute.route_id == Route.id)
+        .outerjoin(DifficultyLevel, Route.difficulty_id == DifficultyLevel.id)
+    )
+
+
+def _journal_entry(row):
+    return {
+        'id': row.id,
+        'route_id': row.route_id,
+        'user_id': row.user_id,
+        'date': row.date.isoformat() if row.date else None,
+        'flash': row.flash,
+        'image_url': row.image_url,
+        'route_type': row.route_type,
+        'difficulty': row.difficulty
+    }
+
+
+def encode_journal_cursor(date, entry_id):
+    return f"{date.isoformat()}_{entry_id}"
+
+
+def decode_journal_cursor(cursor):
+    """Tolka en cursor på formen '<ISO-datum>_<id>'."""
+    try:
+        date, entry_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(date), int(entry_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def normalise_journal_dates():
+    """
+    Skriv om datum som databasen satt med CURRENT_TIMESTAMP till samma format
+    som SQLAlchemy använder.
+
+    Tidigare fick anteckningar utan datum func.now() som default, vilket i
+    SQLite lagras som '2025-03-15 14:30:00' utan mikrosekunder. En cursor
+    binds som '2025-03-15 14:30:00.000000', så textjämförelsen i
+    keyset-pagineringen träffade aldrig raden och samma sida kom tillbaka
+    om och om igen.
+
+    Returns:
+        int: antal uppdaterade rader
     """
-    Hämtar alla journalanteckningar (genomförda klätterrutter) för en specifik användare.
+    result = db.session.execute(
+        update(CompletedRoute)
+        .where(func.length(CompletedRoute.date) == 19)
+        .values(date=func.strftime('%Y-%m-%d %H:%M:%f000', CompletedRoute.date))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def get_journal_entries_by_user(user_id, limit=None, before=None):
+    """
+    Hämtar journalanteckningar (genomförda klätterrutter) för en specifik användare.
     
-    Denna funktion sammanfogar CompletedRoute och Route för att returnera detaljerad
-    information om varje genomförd rutt, inklusive svårighetsgrad och ruttyp.
+    Anteckningarna sorteras på (datum, id) med de senaste först och kan
+    pagineras med limit och before (keyset-paginering). Rutt och grad hämtas
+    i samma fråga, så en sida kostar ett konstant antal frågor.
     
     Args:
         user_id (int): ID för användaren vars journalanteckningar ska hämtas
+        limit (int, optional): Max antal anteckningar (högst JOURNAL_MAX_LIMIT). Default: alla
+        before (str, optional): next_cursor från föregående sida
         
     Returns:
-        tuple: (list, str or None)
-            - Vid lyckad hämtning: (lista med journalanteckningar, None)
+        tuple: (dict, str or None)
+            - Vid lyckad hämtning: ({'entries': [...], 'next_cursor': str eller None}, None)
             - Vid fel: (None, felmeddelande)
             
     Exempel på returdata vid lyckat anrop:
-    [
-        {
-            'id': 1,
-            'route_id': 5,
-            'user_id': 3,
-            'date': '2025-03-15T14:30:00',
-            'flash': True,
-            'image_url': 'https://imgur.com/example.jpg',
-            'route_type': 'boulder',
-            'difficulty': '7A'
-        },
-        ...
-    ]
+    {
+        'entries': [
+            {
+                'id': 1,
+                'route_id': 5,
+                'user_id': 3,
+                'date': '2025-03-15T14:30:00',
+                'flash': True,
+                'image_url': 'https://imgur.com/example.jpg',
+                'route_type': 'boulder',
+                'difficulty': '7A'
+            },
+            ...
+        ],
+        'next_cursor': '2025-03-15T14:30:00_1'
+    }
     """
+    if limit is not None and (limit < 1 or limit > JOURNAL_MAX_LIMIT):
+        return None, f"limit must be between 1 and {JOURNAL_MAX_LIMIT}"
+
     try:
-        completed_routes = (CompletedRoute.query
-            .filter_by(user_id=user_id)
-            .join(Route, CompletedRoute.route_id == Route.id)
-            .add_entity(Route)
-            .all())
-        
-        result = [{
-            'id': cr.CompletedRoute.id,
-            'route_id': cr.CompletedRoute.route_id,
-            'user_id': cr.CompletedRoute.user_id,
-            'date': cr.CompletedRoute.date.isoformat() if cr.CompletedRoute.date else None,
-            'flash': cr.CompletedRoute.flash,
-            'image_url': cr.CompletedRoute.image_url,
-            'route_type': cr.Route.type,
-            'difficulty': cr.Route.difficulty.grade if cr.Route.difficulty else None
-        } for cr in completed_routes]
-        
-        return result, None
+        query = _journal_query().filter(CompletedRoute.user_id == user_id)
+
+        if before:
+            position = decode_journal_cursor(before)
+            if not position:
+                return None, "Invalid cursor"
+            before_date, before_id = position
+            query = query.filter(or_(
+                CompletedRoute.date < before_date,
+                and_(CompletedRoute.date == before_date, CompletedRoute.id < before_id)
+            ))
+
+        query = query.order_by(CompletedRoute.date.desc(), CompletedRoute.id.desc())
+
+        if limit is None:
+            return {'entries': [_journal_entry(row) for row in query.all()], 'next_cursor': None}, None
+
+        # Hämta en extra rad för att veta om det finns en nästa sida
+        rows = query.limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_journal_cursor(rows[-1].date, rows[-1].id)
+
+        return {'entries': [_journal_entry(row) for row in rows], 'next_cursor': next_cursor}, None
     except Exception as e:
         db.session.rollback()
         return None, f"Database error: {str(e)}"
 
+def export_journal_entries(user_id, export_format):
+    """
+    Strömmar en användares hela klätterhistorik som NDJSON eller CSV.
+
+    Raderna läses med yield_per från en server-side cursor och skrivs ut
+    en i taget, så minnesanvändningen är konstant oavsett historikens längd.
+
+    Args:
+        user_id (int): ID för användaren vars journal ska exporteras
+        export_format (str): 'ndjson' eller 'csv'
+
+    Returns:
+        tuple: (generator som ger textrader eller None, felmeddelande eller None)
+    """
+    if export_format not in EXPORT_FORMATS:
+        return None, f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}"
+
+    query = (
+        _journal_query()
+        .filter(CompletedRoute.user_id == user_id)
+        .order_by(CompletedRoute.date, CompletedRoute.id)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+
+    def generate_ndjson():
+        for row in query:
+            yield json.dumps(_journal_entry(row)) + '\n'
+
+    def generate_csv():
+        # En buffert som återanvänds för varje rad
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_CSV_COLUMNS, extrasaction='ignore')
+
+        writer.writeheader()
+        for row in query:
+            writer.writerow(_journal_entry(row))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        yield buffer.getvalue()
+
+    return (generate_ndjson() if export_format == 'ndjson' else generate_csv()), None
+
 def get_journal_entry_by_id(entry_id):
     """
     Hämtar en specifik journalanteckning (genomförd klätterrutt) med angivet ID.
@@ -86,27 +239,12 @@ def get_journal_entry_by_id(entry_id):
     }
     """
     try:
-        completed_route = (CompletedRoute.query
-            .filter_by(id=entry_id)
-            .join(Route, CompletedRoute.route_id == Route.id)
-            .add_entity(Route)
-            .first())
+        completed_route = _journal_query().filter(CompletedRoute.id == entry_id).first()
         
         if not completed_route:
             return None, "Journal entry not found"
         
-        result = {
-            'id': completed_route.CompletedRoute.id,
-            'route_id': completed_route.CompletedRoute.route_id,
-            'user_id': completed_route.CompletedRoute.user_id,
-            'date': completed_route.CompletedRoute.date.isoformat() if completed_route.CompletedRoute.date else None,
-            'flash': completed_route.CompletedRoute.flash,
-            'image_url': completed_route.CompletedRoute.image_url,
-            'route_type': completed_route.Route.type,
-            'difficulty': completed_route.Route.difficulty.grade if completed_route.Route.difficulty else None
-        }
-        
-        return result, None
+        return _journal_entry(completed_route), None
     except Exception as e:
         db.session.rollback()
         return None, f"Database error: {str(e)}"
@@ -159,6 +297,8 @@ def create_journal_entry(user_id, route_id, flash=False, image_url=None, date=No
             new_entry.date = date
         
         db.session.add(new_entry)
+        record_completion(new_entry)
+        bump_versions(user_version_key(user_id))
         db.session.commit()
         
         return {
@@ -173,6 +313,98 @@ def create_journal_entry(user_id, route_id, flash=False, image_url=None, date=No
         db.session.rollback()
         return None, f"Database error: {str(e)}"
 
+def parse_entry_date(value):
+    """Tolka ett ISO-datum från klienten, 'Z' tolkas som UTC. Kastar ValueError."""
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+def _parse_flash(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'y')
+
+def import_journal_entries(user_id, rows):
+    """
+    Importerar många genomförda rutter på en gång, t.ex. från en annan app.
+    
+    Alla grader slås upp med en fråga, rutter och journalanteckningar skapas
+    med batchade INSERT (executemany) och allt committas i en transaktion.
+    Rader som inte går att tolka hoppas över och rapporteras per rad.
+    
+    Args:
+        user_id (int): ID för användaren som importerar
+        rows (list): dicts med route_type, difficulty och valfritt flash, date, image_url
+        
+    Returns:
+        tuple: (dict, str or None)
+            - Vid lyckad import: ({'imported': antal, 'errors': [{'row': index, 'error': text}, ...]}, None)
+            - Vid fel: (None, felmeddelande)
+    """
+    if not isinstance(rows, list):
+        return None, "Expected a list of journal entries"
+    if len(rows) > MAX_IMPORT_ROWS:
+        return None, f"Too many rows. Maximum: {MAX_IMPORT_ROWS}"
+
+    valid = []
+    errors = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'error': 'Row must be an object'})
+            continue
+
+        route_type = str(row.get('route_type') or '').strip()
+        difficulty = str(row.get('difficulty') or '').strip()
+        if not route_type or not difficulty:
+            errors.append({'row': index, 'error': 'Missing required fields: route_type and difficulty'})
+            continue
+
+        date = datetime.utcnow()
+        if row.get('date'):
+            try:
+                date = parse_entry_date(row['date'])
+            except ValueError:
+                errors.append({'row': index, 'error': 'Invalid date format. Use ISO format (YYYY-MM-DDThh:mm:ss)'})
+                continue
+
+        valid.append({
+            'route_type': route_type,
+            'difficulty': difficulty,
+            'flash': _parse_flash(row.get('flash')),
+            'date': date,
+            'image_url': row.get('image_url') or None,
+            'location': row.get('location'),
+            'name': row.get('name')
+        })
+
+    if not valid:
+        return {'imported': 0, 'errors': errors}, None
+
+    try:
+        difficulty_ids = get_or_create_difficulties(entry['difficulty'] for entry in valid)
+
+        keys = [
+            route_key(entry['route_type'], difficulty_ids[entry['difficulty']], entry['location'], entry['name'])
+            for entry in valid
+        ]
+        catalogue = get_or_create_routes(keys)
+        route_ids = [catalogue[key] for key in keys]
+
+        db.session.execute(insert(CompletedRoute), [{
+            'user_id': user_id,
+            'route_id': route_id,
+            'flash': entry['flash'],
+            'date': entry['date'],
+            'image_url': entry['image_url']
+        } for entry, route_id in zip(valid, route_ids)])
+
+        record_completions(user_id, valid)
+        bump_versions(user_version_key(user_id))
+        db.session.commit()
+
+        return {'imported': len(valid), 'errors': errors}, None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Database error: {str(e)}"
+
 def update_journal_entry(entry_id, route_id=None, flash=None, image_url=None, date=None, difficulty=None, route_type=None):
     """
     Updates an existing journal entry (completed climbing route).
@@ -195,29 +427,27 @@ def update_journal_entry(entry_id, route_id=None, flash=None, image_url=None, da
         entry = CompletedRoute.query.get(entry_id)
         if not entry:
             return None, "Journal entry not found"
+
+        # Previous values, used to keep the leaderboard statistics in sync
+        was_flash = entry.flash
+        old_date = entry.date
+        old_route_id = entry.route_id
         
         # Get the route to potentially update
         route = Route.query.get(entry.route_id)
         if not route:
             return None, "Route not found for this entry"
         
-        # Update the route if difficulty or type is provided
-        route_updated = False
-        if difficulty is not None:
-            # Find the difficulty level ID
-            difficulty_level = DifficultyLevel.query.filter_by(grade=difficulty).first()
-            if not difficulty_level:
-                # If grade doesn't exist, create it
-                difficulty_level = DifficultyLevel(grade=difficulty)
-                db.session.add(difficulty_level)
-                db.session.flush()  # Get ID without committing
-            
-            route.difficulty_id = difficulty_level.id
-            route_updated = True
-            
-        if route_type is not None:
-            route.type = route_type
-            route_updated = True
+        # Routes are shared catalogue rows, so a new difficulty or type moves the
+        # entry to the matching catalogue route instead of editing the route
+        if difficulty is not None or route_type is not None:
+            new_route, _ = get_or_create_route(
+                route_type if route_type is not None else route.type,
+                difficulty if difficulty is not None else route.difficulty.grade,
+                route.location,
+                route.name
+            )
+            entry.route_id = new_route.id
             
         # Update the completed route fields
         if route_id is not None:
@@ -235,7 +465,13 @@ def update_journal_entry(entry_id, route_id=None, flash=None, image_url=None, da
             
         if date is not None:
             entry.date = date
+
+        # Keep the leaderboard statistics in the same transaction
+        if entry.route_id != old_route_id or entry.flash != was_flash or entry.date != old_date:
+            change_completion(entry, was_flash, old_date)
         
+        bump_versions(user_version_key(entry.user_id))
+
         # Commit all changes
         db.session.commit()
         
@@ -284,6 +520,8 @@ def delete_journal_entry(entry_id):
             return None, "Journal entry not found"
         
         db.session.delete(entry)
+        remove_completion(entry)
+        bump_versions(user_version_key(entry.user_id))
         db.session.commit()
         
         return {'message': f'Journal entry {entry_id} deleted successfully'}, None
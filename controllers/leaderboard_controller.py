@@ -1,15 +1,590 @@
 from models.users_model import User
 from models.completed_routes_model import CompletedRoute
+from models.routes_model import Route
+from models.difficulty_levels_model import DifficultyLevel
+from models.user_stats_model import UserStats
+from models.completion_rollups_model import DailyCompletion, WeeklyCompletion
 from config.db_config import db
-from sqlalchemy import func
-
-def get_leaderboard_data():
-    result = (
-        db.session.query(User.username, func.count(CompletedRoute.id).label('completed_routes_count'))
-        .join(CompletedRoute)
-        .group_by(User.id)
-        .order_by(func.count(CompletedRoute.id).desc())
+from utils.conditional_get import bump_versions, LEADERBOARD_VERSION_KEY
+from sqlalchemy import func, case, select, insert, update, delete, and_, or_, union_all
+from datetime import datetime, timedelta, date as date_type
+
+# Sidstorlek för leaderboarden
+LEADERBOARD_DEFAULT_LIMIT = 100
+LEADERBOARD_MAX_LIMIT = 500
+RANK_MAX_CONTEXT = 10
+
+# Tidsfönster för leaderboarden, en säsong är ett kvartal
+LEADERBOARD_WINDOWS = ('week', 'month', 'season')
+SEASON_LENGTH_MONTHS = 3
+
+# Poängen är summan av de N svåraste genomförda graderna
+SCORE_BEST_N = 10
+LEADERBOARD_SORT_COLUMNS = {
+    'count': UserStats.completed_count,
+    'score': UserStats.score
+}
+
+STATS_COLUMNS = ['user_id', 'completed_count', 'flash_count', 'last_climb_date', 'score']
+
+
+def _leaderboard_entry(row):
+    entry = {
+        "user_id": row.user_id,
+        "username": row.username,
+        "completed_routes_count": row.completed_count
+    }
+    if 'score' in row._fields:
+        entry["score"] = row.score
+    return entry
+
+
+def _leaderboard_query():
+    return (
+        db.session.query(UserStats.user_id, User.username, UserStats.completed_count, UserStats.score)
+        .join(User, User.id == UserStats.user_id)
+        .filter(UserStats.completed_count > 0)
+    )
+
+
+def _sort_column(by):
+    """Kolumnen i user_stats som leaderboarden sorteras på, eller None för okända värden."""
+    return LEADERBOARD_SORT_COLUMNS.get(by)
+
+
+def encode_leaderboard_cursor(value, user_id):
+    return f"{value}:{user_id}"
+
+
+def decode_leaderboard_cursor(cursor):
+    """Tolka en cursor på formen '<sorteringsvärde>:<user_id>'."""
+    try:
+        value, user_id = cursor.split(':')
+        return int(value), int(user_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_leaderboard_data(limit=LEADERBOARD_DEFAULT_LIMIT, cursor=None, by='count'):
+    """
+    Hämtar en sida av leaderboarden med keyset-paginering över (sorteringsvärde, user_id).
+
+    Sidan läses i indexordning direkt från user_stats, så kostnaden beror på
+    sidstorleken och inte på hur många användare som finns.
+
+    Args:
+        limit (int): Antal rader per sida (högst LEADERBOARD_MAX_LIMIT)
+        cursor (str, optional): next_cursor från föregående sida
+        by (str): 'count' (antal genomförda rutter) eller 'score' (gradviktad poäng)
+
+    Returns:
+        tuple: (dict med 'entries' och 'next_cursor' eller None, felmeddelande eller None)
+    """
+    column = _sort_column(by)
+    if column is None:
+        return None, f"Invalid sort. Use one of: {', '.join(LEADERBOARD_SORT_COLUMNS)}"
+    if limit < 1 or limit > LEADERBOARD_MAX_LIMIT:
+        return None, f"limit must be between 1 and {LEADERBOARD_MAX_LIMIT}"
+
+    query = _leaderboard_query()
+
+    if cursor:
+        position = decode_leaderboard_cursor(cursor)
+        if not position:
+            return None, "Invalid cursor"
+        last_value, last_user_id = position
+        query = query.filter(or_(
+            column < last_value,
+            and_(column == last_value, UserStats.user_id > last_user_id)
+        ))
+
+    # Hämta en extra rad för att veta om det finns en nästa sida
+    rows = (
+        query.order_by(column.desc(), UserStats.user_id)
+        .limit(limit + 1)
         .all()
     )
 
-    return [{"username": r.username, "completed_routes_count": r.completed_routes_count} for r in result]
\ No newline at end of file
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_leaderboard_cursor(getattr(rows[-1], column.key), rows[-1].user_id)
+
+    return {"entries": [_leaderboard_entry(r) for r in rows], "next_cursor": next_cursor}, None
+
+
+def _ranks_for_window(column, rows):
+    """
+    Placeringar för ett sammanhängande fönster av topplistan, sorterat som listan.
+
+    Bara första raden räknas mot tabellen: antal användare med högre värde
+    (rangen) och antal med samma värde men lägre id (positionen). Resten av
+    fönstret får sin placering från sin offset, lika värden delar placering.
+    """
+    first = rows[0]
+    first_value = getattr(first, column.key)
+    higher, tied_before = (
+        db.session.query(
+            func.count(case((column > first_value, 1))),
+            func.count(case((and_(column == first_value, UserStats.user_id < first.user_id), 1)))
+        )
+        .filter(
+            UserStats.completed_count > 0,
+            or_(
+                column > first_value,
+                and_(column == first_value, UserStats.user_id < first.user_id)
+            )
+        )
+        .one()
+    )
+
+    position = higher + tied_before
+    ranks = [higher + 1]
+    for offset in range(1, len(rows)):
+        if getattr(rows[offset], column.key) == getattr(rows[offset - 1], column.key):
+            ranks.append(ranks[-1])
+        else:
+            ranks.append(position + offset + 1)
+    return ranks
+
+
+def get_user_rank(user_id, context=2, by='count'):
+    """
+    Hämtar en användares placering samt de närmaste användarna ovanför och under.
+
+    Grannarna läses med två korta indexsökningar åt vardera hållet från
+    användarens position, hela listan byggs aldrig upp. Tabellen räknas en
+    gång för fönstrets översta rad, grannarnas placering följer av ordningen.
+
+    Args:
+        user_id (int): Användarens ID
+        context (int): Antal grannar att hämta åt varje håll (högst RANK_MAX_CONTEXT)
+        by (str): 'count' eller 'score'
+
+    Returns:
+        tuple: (dict med 'user', 'above' och 'below' eller None, felmeddelande eller None)
+    """
+    column = _sort_column(by)
+    if column is None:
+        return None, f"Invalid sort. Use one of: {', '.join(LEADERBOARD_SORT_COLUMNS)}"
+    if context < 0 or context > RANK_MAX_CONTEXT:
+        return None, f"context must be between 0 and {RANK_MAX_CONTEXT}"
+
+    me = _leaderboard_query().filter(UserStats.user_id == user_id).first()
+    if not me:
+        return None, "User not found on leaderboard"
+    my_value = getattr(me, column.key)
+
+    above = []
+    below = []
+    if context:
+        above = (
+            _leaderboard_query()
+            .filter(or_(
+                column > my_value,
+                and_(column == my_value, UserStats.user_id < me.user_id)
+            ))
+            .order_by(column, UserStats.user_id.desc())
+            .limit(context)
+            .all()
+        )
+        above.reverse()
+
+        below = (
+            _leaderboard_query()
+            .filter(or_(
+                column < my_value,
+                and_(column == my_value, UserStats.user_id > me.user_id)
+            ))
+            .order_by(column.desc(), UserStats.user_id)
+            .limit(context)
+            .all()
+        )
+
+    window = above + [me] + below
+    entries = []
+    for row, rank in zip(window, _ranks_for_window(column, window)):
+        entry = _leaderboard_entry(row)
+        entry["rank"] = rank
+        entries.append(entry)
+
+    return {
+        "user": entries[len(above)],
+        "above": entries[:len(above)],
+        "below": entries[len(above) + 1:]
+    }, None
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def get_window_bounds(window, today=None):
+    """
+    Returnerar (start, slut) för ett tidsfönster, slutdatumet är exklusivt.
+
+    'week' är innevarande ISO-vecka, 'month' innevarande månad och
+    'season' innevarande säsong (kvartal).
+    """
+    today = today or datetime.utcnow().date()
+
+    if window == 'week':
+        start = today - timedelta(days=today.weekday())
+        return start, start + timedelta(days=7)
+    if window == 'month':
+        start = today.replace(day=1)
+        return start, _add_months(start, 1)
+    if window == 'season':
+        start = today.replace(month=SEASON_LENGTH_MONTHS * ((today.month - 1) // SEASON_LENGTH_MONTHS) + 1, day=1)
+        return start, _add_months(start, SEASON_LENGTH_MONTHS)
+    return None
+
+
+def _window_buckets(start, end):
+    """
+    Delar upp [start, end) i hela veckor (weekly_completions) och
+    kantdagar (daily_completions), så att varje användare summerar
+    som mest ett par dussin hinkar.
+    """
+    first_monday = start + timedelta(days=-start.weekday() % 7)
+    last_monday = end - timedelta(days=end.weekday())
+
+    parts = []
+    if first_monday < last_monday:
+        day_ranges = [(start, first_monday), (last_monday, end)]
+        parts.append(
+            select(WeeklyCompletion.user_id, WeeklyCompletion.completed_count)
+            .where(WeeklyCompletion.week_start >= first_monday, WeeklyCompletion.week_start < last_monday)
+        )
+    else:
+        day_ranges = [(start, end)]
+
+    for day_from, day_to in day_ranges:
+        if day_from < day_to:
+            parts.append(
+                select(DailyCompletion.user_id, DailyCompletion.completed_count)
+                .where(DailyCompletion.day >= day_from, DailyCompletion.day < day_to)
+            )
+
+    return union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+
+
+def get_windowed_leaderboard(window, limit=LEADERBOARD_DEFAULT_LIMIT, cursor=None, today=None):
+    """
+    Hämtar en sida av leaderboarden för en vecka, månad eller säsong.
+
+    Summerar förberäknade dags- och veckohinkar istället för att
+    skanna completed_routes. Pagineras på samma sätt som get_leaderboard_data.
+
+    Args:
+        window (str): 'week', 'month' eller 'season'
+        limit (int): Antal rader per sida (högst LEADERBOARD_MAX_LIMIT)
+        cursor (str, optional): next_cursor från föregående sida
+        today (date, optional): Referensdatum. Default: dagens datum (UTC)
+
+    Returns:
+        tuple: (dict med 'entries', 'next_cursor', 'start' och 'end' eller None, felmeddelande eller None)
+    """
+    bounds = get_window_bounds(window, today)
+    if not bounds:
+        return None, f"Invalid window. Use one of: {', '.join(LEADERBOARD_WINDOWS)}"
+    if limit < 1 or limit > LEADERBOARD_MAX_LIMIT:
+        return None, f"limit must be between 1 and {LEADERBOARD_MAX_LIMIT}"
+
+    start, end = bounds
+    buckets = _window_buckets(start, end)
+    total = func.sum(buckets.c.completed_count)
+
+    query = (
+        db.session.query(buckets.c.user_id.label('user_id'), User.username, total.label('completed_count'))
+        .join(User, User.id == buckets.c.user_id)
+        .group_by(buckets.c.user_id, User.username)
+    )
+
+    if cursor:
+        position = decode_leaderboard_cursor(cursor)
+        if not position:
+            return None, "Invalid cursor"
+        last_count, last_user_id = position
+        query = query.having(or_(
+            total < last_count,
+            and_(total == last_count, buckets.c.user_id > last_user_id)
+        ))
+
+    rows = query.order_by(total.desc(), buckets.c.user_id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_leaderboard_cursor(rows[-1].completed_count, rows[-1].user_id)
+
+    return {
+        "entries": [_leaderboard_entry(r) for r in rows],
+        "next_cursor": next_cursor,
+        "start": start.isoformat(),
+        "end": end.isoformat()
+    }, None
+
+
+def _best_points_select(user_ids=None):
+    """
+    Poängen för varje användares SCORE_BEST_N svåraste genomförda rutter,
+    numrerade per användare i fallande ordning.
+    """
+    stmt = (
+        select(
+            CompletedRoute.user_id.label('user_id'),
+            DifficultyLevel.points.label('points'),
+            func.row_number().over(
+                partition_by=CompletedRoute.user_id,
+                order_by=DifficultyLevel.points.desc()
+            ).label('position')
+        )
+        .join(Route, Route.id == CompletedRoute.route_id)
+        .join(DifficultyLevel, DifficultyLevel.id == Route.difficulty_id)
+        .where(DifficultyLevel.points.isnot(None))
+    )
+
+    if user_ids is not None:
+        stmt = stmt.where(CompletedRoute.user_id.in_(user_ids))
+    return stmt.subquery()
+
+
+def _score_subquery(user_id):
+    """Skalär SELECT för en användares poäng (summan av de SCORE_BEST_N bästa graderna)."""
+    best = (
+        select(DifficultyLevel.points.label('points'))
+        .select_from(CompletedRoute)
+        .join(Route, Route.id == CompletedRoute.route_id)
+        .join(DifficultyLevel, DifficultyLevel.id == Route.difficulty_id)
+        .where(CompletedRoute.user_id == user_id, DifficultyLevel.points.isnot(None))
+        .order_by(DifficultyLevel.points.desc())
+        .limit(SCORE_BEST_N)
+        .subquery()
+    )
+    return select(func.coalesce(func.sum(best.c.points), 0)).scalar_subquery()
+
+
+def _stats_select(user_ids=None):
+    """
+    SELECT som räknar fram user_stats-kolumnerna direkt från completed_routes.
+    Används både vid ombyggnad av hela tabellen och när en rad saknas.
+    """
+    counts = select(
+        CompletedRoute.user_id.label('user_id'),
+        func.count(CompletedRoute.id).label('completed_count'),
+        func.coalesce(func.sum(case((CompletedRoute.flash == True, 1), else_=0)), 0).label('flash_count'),
+        func.max(CompletedRoute.date).label('last_climb_date')
+    ).group_by(CompletedRoute.user_id)
+
+    if user_ids is not None:
+        counts = counts.where(CompletedRoute.user_id.in_(user_ids))
+    counts = counts.subquery()
+
+    best = _best_points_select(user_ids)
+    scores = (
+        select(best.c.user_id, func.sum(best.c.points).label('score'))
+        .where(best.c.position <= SCORE_BEST_N)
+        .group_by(best.c.user_id)
+        .subquery()
+    )
+
+    return (
+        select(
+            counts.c.user_id,
+            counts.c.completed_count,
+            counts.c.flash_count,
+            counts.c.last_climb_date,
+            func.coalesce(scores.c.score, 0)
+        )
+        .select_from(counts)
+        .outerjoin(scores, scores.c.user_id == counts.c.user_id)
+    )
+
+
+def _apply_stats_delta(user_id, completed, flashed):
+    """
+    Uppdatera user_stats för en användare i den pågående transaktionen.
+
+    Räknarna justeras atomärt i SQL (count = count + delta), last_climb_date
+    och poängen räknas om från användarens egna completed_routes. Ingen
+    commit görs här, anroparen committar tillsammans med sin egen ändring.
+    """
+    # Se till att den nya/borttagna completed_route-raden syns för SELECT:en nedan
+    db.session.flush()
+
+    last_climb_date = (
+        select(func.max(CompletedRoute.date))
+        .where(CompletedRoute.user_id == user_id)
+        .scalar_subquery()
+    )
+
+    result = db.session.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(
+            completed_count=UserStats.completed_count + completed,
+            flash_count=UserStats.flash_count + flashed,
+            last_climb_date=last_climb_date,
+            score=_score_subquery(user_id)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    if result.rowcount == 0:
+        # Ingen rad ännu (första klättringen eller äldre databas) - räkna fram den
+        db.session.execute(
+            insert(UserStats).from_select(STATS_COLUMNS, _stats_select([user_id]))
+        )
+
+    bump_versions(LEADERBOARD_VERSION_KEY)
+
+
+def _as_day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _apply_bucket_delta(model, column, user_id, bucket, delta):
+    """Justera en dags- eller veckohink med delta (utan commit)."""
+    result = db.session.execute(
+        update(model)
+        .where(model.user_id == user_id, column == bucket)
+        .values(completed_count=model.completed_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+    if result.rowcount == 0 and delta > 0:
+        db.session.execute(insert(model).values({'user_id': user_id, column.key: bucket, 'completed_count': delta}))
+    elif delta < 0:
+        db.session.execute(
+            delete(model)
+            .where(model.user_id == user_id, column == bucket, model.completed_count <= 0)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _apply_rollup_delta(user_id, date, delta):
+    """Justera dags- och veckohinken som ett datum hamnar i (utan commit)."""
+    if date is None:
+        return
+
+    day = _as_day(date)
+    _apply_bucket_delta(DailyCompletion, DailyCompletion.day, user_id, day, delta)
+    _apply_bucket_delta(WeeklyCompletion, WeeklyCompletion.week_start, user_id, _week_start(day), delta)
+
+
+def record_completion(entry):
+    """Registrera en ny genomförd rutt i user_stats och hinkarna (utan commit)."""
+    _apply_stats_delta(entry.user_id, 1, 1 if entry.flash else 0)
+    # Datumet kan vara satt av databasen, läs det efter flush
+    _apply_rollup_delta(entry.user_id, entry.date, 1)
+
+
+def remove_completion(entry):
+    """Registrera en borttagen genomförd rutt i user_stats och hinkarna (utan commit)."""
+    user_id, flash, date = entry.user_id, entry.flash, entry.date
+    _apply_stats_delta(user_id, -1, -1 if flash else 0)
+    _apply_rollup_delta(user_id, date, -1)
+
+
+def record_completions(user_id, entries):
+    """
+    Registrera många nya genomförda rutter för en användare på en gång (utan commit).
+
+    Används vid bulkimport: user_stats uppdateras en gång och varje dags-
+    och veckohink en gång, oavsett hur många rader som importerades.
+
+    Args:
+        user_id (int): Användarens ID
+        entries (list): dicts med 'flash' och 'date'
+    """
+    if not entries:
+        return
+
+    _apply_stats_delta(user_id, len(entries), sum(1 for e in entries if e['flash']))
+
+    days = {}
+    weeks = {}
+    for entry in entries:
+        day = _as_day(entry['date'])
+        days[day] = days.get(day, 0) + 1
+        weeks[_week_start(day)] = weeks.get(_week_start(day), 0) + 1
+
+    for day, count in days.items():
+        _apply_bucket_delta(DailyCompletion, DailyCompletion.day, user_id, day, count)
+    for week_start, count in weeks.items():
+        _apply_bucket_delta(WeeklyCompletion, WeeklyCompletion.week_start, user_id, week_start, count)
+
+
+def change_completion(entry, was_flash, old_date):
+    """Registrera ändrad flash-status, grad och/eller datum på en genomförd rutt (utan commit)."""
+    _apply_stats_delta(entry.user_id, 0, int(bool(entry.flash)) - int(bool(was_flash)))
+    if _as_day(entry.date) != _as_day(old_date):
+        _apply_rollup_delta(entry.user_id, old_date, -1)
+        _apply_rollup_delta(entry.user_id, entry.date, 1)
+
+
+def delete_user_stats(user_id):
+    """Ta bort user_stats-raden och hinkarna för en användare (utan commit)."""
+    for model in (UserStats, DailyCompletion, WeeklyCompletion):
+        db.session.execute(
+            delete(model)
+            .where(model.user_id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+    bump_versions(LEADERBOARD_VERSION_KEY)
+
+
+def _rebuild_rollups():
+    """Räkna om dags- och veckohinkarna från completed_routes (utan commit)."""
+    db.session.execute(delete(DailyCompletion))
+    db.session.execute(delete(WeeklyCompletion))
+
+    day = func.date(CompletedRoute.date)
+    daily_rows = (
+        db.session.query(CompletedRoute.user_id, day, func.count(CompletedRoute.id))
+        .group_by(CompletedRoute.user_id, day)
+        .all()
+    )
+
+    daily = []
+    weekly = {}
+    for user_id, bucket, count in daily_rows:
+        # SQLite returnerar date() som en sträng
+        bucket = date_type.fromisoformat(bucket) if isinstance(bucket, str) else _as_day(bucket)
+        daily.append({'user_id': user_id, 'day': bucket, 'completed_count': count})
+        week_key = (user_id, _week_start(bucket))
+        weekly[week_key] = weekly.get(week_key, 0) + count
+
+    if daily:
+        db.session.execute(insert(DailyCompletion), daily)
+        db.session.execute(insert(WeeklyCompletion), [
+            {'user_id': user_id, 'week_start': week_start, 'completed_count': count}
+            for (user_id, week_start), count in weekly.items()
+        ])
+
+
+def rebuild_leaderboard():
+    """
+    Bygg om user_stats (inklusive poäng) samt dags- och veckohinkarna från completed_routes.
+
+    Returns:
+        tuple: (antal användare med statistik (int) eller None, felmeddelande eller None)
+    """
+    try:
+        db.session.execute(delete(UserStats))
+        db.session.execute(
+            insert(UserStats).from_select(STATS_COLUMNS, _stats_select())
+        )
+        _rebuild_rollups()
+        bump_versions(LEADERBOARD_VERSION_KEY)
+        db.session.commit()
+        return db.session.query(func.count(UserStats.user_id)).scalar(), None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Database error: {str(e)}"
@@ -1,17 +1,153 @@
 from models.routes_model import Route
-from models.difficulty_levels_model import DifficultyLevel
+from models.difficulty_levels_model import DifficultyLevel, grade_ordinal, grade_points
+from models.completed_routes_model import CompletedRoute
 from config.db_config import db
+from utils.conditional_get import bump_versions, user_version_key
+from sqlalchemy import insert, update, delete, select, func, tuple_
+from sqlalchemy.exc import IntegrityError
+
+# Antal routes-nycklar per fråga vid bulkuppslag
+ROUTE_LOOKUP_CHUNK = 500
+
+def get_or_create_difficulty(grade):
+    """
+    Get a difficulty level by grade, creating it (with ordinal and points) if missing.
+    Does not commit; the caller commits together with its own changes.
+    """
+    difficulty = DifficultyLevel.query.filter_by(grade=grade).first()
+    if not difficulty:
+        ordinal = grade_ordinal(grade)
+        difficulty = DifficultyLevel(grade=grade, ordinal=ordinal, points=grade_points(ordinal))
+        db.session.add(difficulty)
+        db.session.flush()  # Get ID without committing
+    return difficulty
+
+def get_or_create_difficulties(grades):
+    """
+    Resolve many grades at once: one SELECT for the existing grades and one
+    batched INSERT for the missing ones. Does not commit.
+
+    Returns:
+        dict: grade -> difficulty level id
+    """
+    grades = set(grades)
+    ids = dict(
+        db.session.query(DifficultyLevel.grade, DifficultyLevel.id)
+        .filter(DifficultyLevel.grade.in_(grades))
+        .all()
+    )
+
+    missing = [grade for grade in grades if grade not in ids]
+    if missing:
+        db.session.execute(insert(DifficultyLevel), [
+            {'grade': grade, 'ordinal': grade_ordinal(grade), 'points': grade_points(grade_ordinal(grade))}
+            for grade in missing
+        ])
+        ids.update(
+            db.session.query(DifficultyLevel.grade, DifficultyLevel.id)
+            .filter(DifficultyLevel.grade.in_(missing))
+            .all()
+        )
+
+    return ids
+
+def refresh_difficulty_points():
+    """
+    Set ordinal and points on every difficulty level from GRADE_SCALE.
+
+    Returns:
+        tuple: (number of difficulty levels, error message or None)
+    """
+    try:
+        levels = DifficultyLevel.query.all()
+        for level in levels:
+            level.ordinal = grade_ordinal(level.grade)
+            level.points = grade_points(level.ordinal)
+        db.session.commit()
+        return len(levels), None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Database error: {str(e)}"
+
+def route_key(route_type, difficulty_id, location=None, name=None):
+    """Normalised catalogue key for a route."""
+    return (route_type.strip(), difficulty_id, (location or '').strip(), (name or '').strip())
+
+def get_or_create_route(route_type, grade, location=None, name=None):
+    """
+    Get the catalogue route for (type, grade, location, name), creating it if missing.
+
+    Concurrent creators are resolved by the unique index: the loser's insert
+    is rolled back to a savepoint and the winner's row is read instead.
+    Does not commit.
+
+    Returns:
+        tuple: (Route, DifficultyLevel)
+    """
+    difficulty = get_or_create_difficulty(grade)
+    route_type, difficulty_id, location, name = route_key(route_type, difficulty.id, location, name)
+
+    def lookup():
+        return Route.query.filter_by(type=route_type, difficulty_id=difficulty_id, location=location, name=name).first()
+
+    route = lookup()
+    if not route:
+        try:
+            with db.session.begin_nested():
+                route = Route(type=route_type, difficulty_id=difficulty_id, location=location, name=name)
+                db.session.add(route)
+        except IntegrityError:
+            route = lookup()
+
+    return route, difficulty
+
+def get_or_create_routes(keys):
+    """
+    Resolve many catalogue keys (see route_key) at once: chunked SELECTs for the
+    existing routes and one batched INSERT for the missing ones. Does not commit.
+
+    Returns:
+        dict: key -> route id
+    """
+    keys = set(keys)
+
+    def lookup(wanted):
+        wanted = list(wanted)
+        ids = {}
+        for start in range(0, len(wanted), ROUTE_LOOKUP_CHUNK):
+            chunk = wanted[start:start + ROUTE_LOOKUP_CHUNK]
+            rows = (
+                db.session.query(Route.type, Route.difficulty_id, Route.location, Route.name, Route.id)
+                .filter(tuple_(Route.type, Route.difficulty_id, Route.location, Route.name).in_(chunk))
+                .all()
+            )
+            ids.update({tuple(row[:4]): row.id for row in rows})
+        return ids
+
+    ids = lookup(keys)
+    missing = [key for key in keys if key not in ids]
+    if missing:
+        db.session.execute(insert(Route), [
+            {'type': route_type, 'difficulty_id': difficulty_id, 'location': location, 'name': name}
+            for route_type, difficulty_id, location, name in missing
+        ])
+        ids.update(lookup(missing))
+
+    return ids
 
 def create_route(route_data):
     """
-    Create a new climbing route.
+    Get or create a climbing route in the route catalogue.
+
+    Repeat ascents of the same (type, difficulty, location, name) share one route.
     
     Args:
         route_data (dict): Dictionary containing route information:
             - type (str): Route type ('boulder', 'lead', 'top-rope', etc)
             - difficulty (str): Difficulty grade ('6A', '7C+', etc)
             - location (str, optional): Location of the route
-            - description (str, optional): Description of the route
+            - name (str, optional): Name of the route
+            - description (str, optional): Description of the route (not stored)
             
     Returns:
         tuple: (dict, str or None)
@@ -19,29 +155,89 @@ def create_route(route_data):
             - On error: (None, error message)
     """
     try:
-        # Get or create difficulty level
-        difficulty = DifficultyLevel.query.filter_by(grade=route_data['difficulty']).first()
-        if not difficulty:
-            difficulty = DifficultyLevel(grade=route_data['difficulty'])
-            db.session.add(difficulty)
-            db.session.flush()  # Get ID without committing
-        
-        # Create new route
-        new_route = Route(
-            difficulty_id=difficulty.id,
-            type=route_data['type']
+        route, difficulty = get_or_create_route(
+            route_data['type'],
+            route_data['difficulty'],
+            route_data.get('location'),
+            route_data.get('name')
         )
-        
-        db.session.add(new_route)
         db.session.commit()
         
         # Return route data
         return {
-            'id': new_route.id,
-            'type': new_route.type,
-            'difficulty': difficulty.grade
+            'id': route.id,
+            'type': route.type,
+            'difficulty': difficulty.grade,
+            'location': route.location or None,
+            'name': route.name or None
         }, None
         
     except Exception as e:
         db.session.rollback()
-        return None, f"Database error: {str(e)}"
\ No newline at end of file
+        return None, f"Database error: {str(e)}"
+
+def merge_duplicate_routes(batch_size=500):
+    """
+    Merge routes that share a catalogue key into the oldest one.
+
+    completed_routes are repointed to the kept route and the duplicates are
+    deleted. Runs in batches of duplicate groups with a commit per batch, so
+    it can run while the app serves traffic. Must have run before the unique
+    catalogue index can be created on an existing database.
+
+    Returns:
+        tuple: (number of merged routes, error message or None)
+    """
+    merged = 0
+    try:
+        while True:
+            groups = (
+                db.session.query(func.min(Route.id), Route.type, Route.difficulty_id, Route.location, Route.name)
+                .group_by(Route.type, Route.difficulty_id, Route.location, Route.name)
+                .having(func.count(Route.id) > 1)
+                .limit(batch_size)
+                .all()
+            )
+            if not groups:
+                break
+
+            for keeper_id, route_type, difficulty_id, location, name in groups:
+                duplicates = (
+                    select(Route.id)
+                    .where(
+                        Route.type == route_type,
+                        Route.difficulty_id == difficulty_id,
+                        Route.location == location,
+                        Route.name == name,
+                        Route.id != keeper_id
+                    )
+                )
+
+                # The route_id in these users' journals changes
+                user_ids = (
+                    db.session.query(CompletedRoute.user_id)
+                    .filter(CompletedRoute.route_id.in_(duplicates))
+                    .distinct()
+                    .all()
+                )
+                bump_versions(*[user_version_key(user_id) for (user_id,) in user_ids])
+
+                db.session.execute(
+                    update(CompletedRoute)
+                    .where(CompletedRoute.route_id.in_(duplicates))
+                    .values(route_id=keeper_id)
+                    .execution_options(synchronize_session=False)
+                )
+                result = db.session.execute(
+                    delete(Route)
+                    .where(Route.id.in_(duplicates))
+                    .execution_options(synchronize_session=False)
+                )
+                merged += result.rowcount
+
+            db.session.commit()
+
+        return merged, None
+    except Exception as e:
+        db.session.rollback()
+        return None, f"Database error: {str(e)}"
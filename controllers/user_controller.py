@@ -1,4 +1,19 @@
-from models.users_model import User, db
+from models.users_model import User, db, normalise_username
+from models.refresh_tokens_model import RefreshToken
+from models.upload_jobs_model import UploadJob
+from controllers.leaderboard_controller import delete_user_stats
+from utils.user_cache import invalidate_user
+from utils.password_hashing import HashingBusyError, hash_passwords
+from sqlalchemy.exc import IntegrityError
+
+DEFAULT_PROFILE_IMAGE_URL = 'https://i.imgur.com/3sceVnu.jpeg'
+
+# Max antal användare per bulkanrop
+MAX_PROVISION_ROWS = 5000
+
+# Antal träffar från prefixsökningen
+USER_SEARCH_DEFAULT_LIMIT = 10
+USER_SEARCH_MAX_LIMIT = 50
 
 def get_all_users():
     try:
@@ -22,20 +37,9 @@ def create_user(username, password, email=None, profile_image_url=None):
     Returns:
         tuple: (user_data dict or None, error message or None)
     """
-    # Check if username already exists
-    existing_user = User.query.filter_by(username=username).first()
-    if existing_user:
-        return None, 'Username already exists'
-    
-    # Check if email already exists (if provided)
-    if email:
-        existing_email = User.query.filter_by(email=email).first()
-        if existing_email:
-            return None, 'Email already in use'
-    
     # Set default profile image if none provided
     if not profile_image_url:
-        profile_image_url = 'https://i.imgur.com/3sceVnu.jpeg'  # Default profile image
+        profile_image_url = DEFAULT_PROFILE_IMAGE_URL
     
     # Create new user with all provided fields
     new_user = User(
@@ -43,21 +47,126 @@ def create_user(username, password, email=None, profile_image_url=None):
         email=email,
         profile_image_url=profile_image_url
     )
-    new_user.set_password(password)
+    try:
+        new_user.set_password(password)
+    except HashingBusyError:
+        return None, 'Server busy, try again shortly'
     
     try:
         db.session.add(new_user)
         db.session.commit()
+        # SQLite can hand out the id of a deleted user again
+        invalidate_user(new_user.id)
         return {
             'id': new_user.id, 
             'username': new_user.username,
             'email': new_user.email,
             'profile_image_url': new_user.profile_image_url
         }, None
+    except IntegrityError as e:
+        # The unique constraints on username and email decide, no racy pre-check
+        db.session.rollback()
+        return None, _integrity_error_message(e)
+    except Exception as e:
+        db.session.rollback()
+        return None, f'Database error: {str(e)}'
+
+
+def _integrity_error_message(error):
+    """Map a unique constraint violation on users to an error message."""
+    message = str(error.orig).lower()
+    if 'unique' in message or 'duplicate' in message:
+        if 'username' in message:
+            return 'Username already exists'
+        if 'email' in message:
+            return 'Email already in use'
+    return f'Database error: {str(error.orig)}'
+
+
+def provision_users(rows):
+    """
+    Create many users in one transaction, e.g. a gym's member list.
+
+    Passwords are hashed in parallel across a process pool. Each user is
+    inserted in its own savepoint, so a row that breaks the unique
+    constraints on username or email is reported and skipped without
+    rolling back the other rows.
+
+    Args:
+        rows (list): dicts with username, password, email and optionally profile_image_url
+
+    Returns:
+        tuple: (dict, str or None)
+            - On success: ({'created': [user dicts], 'errors': [{'row': index, 'error': text}, ...]}, None)
+            - On error: (None, error message)
+    """
+    if not isinstance(rows, list):
+        return None, 'Expected a list of users'
+    if len(rows) > MAX_PROVISION_ROWS:
+        return None, f'Too many rows. Maximum: {MAX_PROVISION_ROWS}'
+
+    valid = []
+    errors = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'error': 'Row must be an object'})
+            continue
+
+        username = str(row.get('username') or '').strip()
+        password = str(row.get('password') or '')
+        email = str(row.get('email') or '').strip()
+        if not username or not password or not email:
+            errors.append({'row': index, 'error': 'Missing required fields: username, password, and email'})
+            continue
+
+        valid.append((index, {
+            'username': username,
+            'password': password,
+            'email': email,
+            'profile_image_url': row.get('profile_image_url') or DEFAULT_PROFILE_IMAGE_URL
+        }))
+
+    try:
+        hashes = hash_passwords(row['password'] for _, row in valid)
+
+        created = []
+        for (index, row), hashed_password in zip(valid, hashes):
+            user = User(
+                username=row['username'],
+                email=row['email'],
+                hashed_password=hashed_password,
+                profile_image_url=row['profile_image_url']
+            )
+            try:
+                with db.session.begin_nested():
+                    db.session.add(user)
+            except IntegrityError as e:
+                errors.append({'row': index, 'error': _integrity_error_message(e)})
+                continue
+            created.append(user)
+
+        db.session.commit()
+    except HashingBusyError:
+        db.session.rollback()
+        return None, 'Server busy, try again shortly'
     except Exception as e:
         db.session.rollback()
         return None, f'Database error: {str(e)}'
 
+    for user in created:
+        invalidate_user(user.id)
+
+    errors.sort(key=lambda error: error['row'])
+    return {
+        'created': [{
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'profile_image_url': user.profile_image_url
+        } for user in created],
+        'errors': errors
+    }, None
+
 
 # This function talks to the route search_user in user_routes.py
 def get_user_by_id_or_username(user_id=None, username=None):
@@ -74,6 +183,48 @@ def get_user_by_id_or_username(user_id=None, username=None):
         return None, 'User not found'
     
 
+def search_users(prefix, limit=USER_SEARCH_DEFAULT_LIMIT):
+    """
+    Case-insensitive prefix search on usernames, for type-ahead.
+
+    Uses a range scan on the indexed username_lower column
+    (prefix <= username_lower < next prefix) instead of LIKE, so a lookup
+    costs one index seek plus limit rows, independent of the number of users.
+
+    Returns:
+        tuple: (list of {'id', 'username', 'profile_image_url'}, error message or None)
+    """
+    prefix = normalise_username(prefix.strip())
+    if not prefix:
+        return None, 'Search query must not be empty'
+    if limit < 1 or limit > USER_SEARCH_MAX_LIMIT:
+        return None, f'Limit must be between 1 and {USER_SEARCH_MAX_LIMIT}'
+
+    # Minsta sträng som är större än alla strängar som börjar med prefixet
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    users = (
+        db.session.query(User.id, User.username, User.profile_image_url)
+        .filter(User.username_lower >= prefix, User.username_lower < upper)
+        .order_by(User.username_lower)
+        .limit(limit)
+        .all()
+    )
+    return [{'id': user.id, 'username': user.username, 'profile_image_url': user.profile_image_url} for user in users], None
+
+
+def backfill_username_lower(batch_size=1000):
+    """Fill username_lower for users created before the column existed."""
+    updated = 0
+    while True:
+        users = User.query.filter(User.username_lower == '', User.username != '').limit(batch_size).all()
+        if not users:
+            return updated
+        for user in users:
+            user.username_lower = normalise_username(user.username)
+        db.session.commit()
+        updated += len(users)
+
+
 def delete_user(user_id=None, username=None):
     # Check if at least one parameter is provided
     if not user_id and not username:
@@ -90,8 +241,12 @@ def delete_user(user_id=None, username=None):
         return None, 'User not found'
     
     try:
+        delete_user_stats(user.id)
+        RefreshToken.query.filter_by(user_id=user.id).delete()
+        UploadJob.query.filter_by(user_id=user.id).delete()
         db.session.delete(user)
         db.session.commit()
+        invalidate_user(user.id)
         return {'message': f'User {user.username} deleted successfully'}, None
     except Exception as e:
         db.session.rollback()
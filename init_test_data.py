@@ -1,10 +1,11 @@
 from app import app, db
 from models.users_model import User
-from models.difficulty_levels_model import DifficultyLevel
+from models.difficulty_levels_model import DifficultyLevel, grade_ordinal, grade_points
 from models.routes_model import Route
 from models.completed_routes_model import CompletedRoute
 from models.goals_model import Goal
 from models.achievements_model import Achievement
+from controllers.leaderboard_controller import rebuild_leaderboard
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
 import random
@@ -15,26 +16,13 @@ def create_test_data():
         
         # Add difficulty levels if they don't exist
         if DifficultyLevel.query.count() == 0:
+            grades = [
+                "4", "5", "5+", "6A", "6A+", "6B", "6B+", "6C", "6C+",
+                "7A", "7A+", "7B", "7B+", "7C", "7C+", "8A", "8A+", "8B", "8B+"
+            ]
             difficulty_levels = [
-                DifficultyLevel(grade="4"),
-                DifficultyLevel(grade="5"),
-                DifficultyLevel(grade="5+"),
-                DifficultyLevel(grade="6A"),
-                DifficultyLevel(grade="6A+"),
-                DifficultyLevel(grade="6B"),
-                DifficultyLevel(grade="6B+"),
-                DifficultyLevel(grade="6C"),
-                DifficultyLevel(grade="6C+"),
-                DifficultyLevel(grade="7A"),
-                DifficultyLevel(grade="7A+"),
-                DifficultyLevel(grade="7B"),
-                DifficultyLevel(grade="7B+"),
-                DifficultyLevel(grade="7C"),
-                DifficultyLevel(grade="7C+"),
-                DifficultyLevel(grade="8A"),
-                DifficultyLevel(grade="8A+"),
-                DifficultyLevel(grade="8B"),
-                DifficultyLevel(grade="8B+")
+                DifficultyLevel(grade=grade, ordinal=grade_ordinal(grade), points=grade_points(grade_ordinal(grade)))
+                for grade in grades
             ]
             db.session.add_all(difficulty_levels)
             db.session.commit()
@@ -62,16 +50,10 @@ def create_test_data():
             difficulties = DifficultyLevel.query.all()
             difficulty_ids = [d.id for d in difficulties]
             
-            # Create 50 routes with different difficulties
+            # Create 50 catalogue routes, each (type, difficulty) combination at most once
             route_types = ["boulder", "lead", "top-rope"]
-            routes = []
-            
-            for i in range(1, 51):
-                route = Route(
-                    difficulty_id=random.choice(difficulty_ids),
-                    type=random.choice(route_types)
-                )
-                routes.append(route)
+            combinations = random.sample([(t, d) for t in route_types for d in difficulty_ids], 50)
+            routes = [Route(type=route_type, difficulty_id=difficulty_id) for route_type, difficulty_id in combinations]
             
             db.session.add_all(routes)
             db.session.commit()
@@ -154,6 +136,9 @@ def create_test_data():
             db.session.commit()
             print(f"Added {len(achievements)} achievements for test user")
 
+        # Test data is inserted directly, so rebuild the leaderboard tables
+        rebuild_leaderboard()
+
         print("Test data creation complete!")
 
 if __name__ == "__main__":
@@ -8,6 +8,10 @@ class Achievement(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     achievement_name = db.Column(db.String(255), nullable=False)
     achievement_date = db.Column(db.DateTime, nullable=False, default=func.now())
+
+    __table_args__ = (
+        db.Index('ix_achievements_user_id_achievement_date', 'user_id', 'achievement_date'),
+    )
     
     def __repr__(self):
         return f"<Achievement {self.id}: {self.achievement_name}>"
\ No newline at end of file
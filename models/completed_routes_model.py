@@ -1,5 +1,5 @@
 from config.db_config import db
-from sqlalchemy.sql import func
+from datetime import datetime
 
 class CompletedRoute(db.Model):
     __tablename__ = 'completed_routes'
@@ -8,11 +8,17 @@ class CompletedRoute(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     route_id = db.Column(db.Integer, db.ForeignKey('routes.id'), nullable=False)
     flash = db.Column(db.Boolean, nullable=False)
-    date = db.Column(db.DateTime, nullable=False, default=func.now())
+    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     image_url = db.Column(db.String(1000), nullable=True)
     
     # Relationships
     route = db.relationship('Route', backref=db.backref('completed_by', lazy=True))
+
+    # The journal is listed per user in (date, id) order
+    __table_args__ = (
+        db.Index('ix_completed_routes_user_id_date', 'user_id', 'date'),
+        db.Index('ix_completed_routes_route_id', 'route_id'),
+    )
     
     def __repr__(self):
         return f"<CompletedRoute {self.id}: User {self.user_id}, Route {self.route_id}>"
\ No newline at end of file
@@ -0,0 +1,32 @@
+from config.db_config import db
+
+class DailyCompletion(db.Model):
+    __tablename__ = 'daily_completions'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # Window queries read a range of days for all users
+    __table_args__ = (
+        db.Index('ix_daily_completions_day_user_id', 'day', 'user_id'),
+    )
+
+    def __repr__(self):
+        return f"<DailyCompletion {self.user_id} {self.day}: {self.completed_count}>"
+
+
+class WeeklyCompletion(db.Model):
+    __tablename__ = 'weekly_completions'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    # Monday of the ISO week
+    week_start = db.Column(db.Date, primary_key=True)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_weekly_completions_week_start_user_id', 'week_start', 'user_id'),
+    )
+
+    def __repr__(self):
+        return f"<WeeklyCompletion {self.user_id} {self.week_start}: {self.completed_count}>"
@@ -0,0 +1,11 @@
+from config.db_config import db
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+
+    # 'user:<id>' for a user's journal, goals and achievements, 'leaderboard' for the leaderboard
+    key = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DataVersion {self.key}: {self.version}>"
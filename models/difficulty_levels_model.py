@@ -1,10 +1,31 @@
 from config.db_config import db
 
+# Fontainebleau-skalan i stigande ordning, index = ordinal
+GRADE_SCALE = [
+    '3', '4', '4+', '5', '5+',
+    '6A', '6A+', '6B', '6B+', '6C', '6C+',
+    '7A', '7A+', '7B', '7B+', '7C', '7C+',
+    '8A', '8A+', '8B', '8B+', '8C', '8C+',
+    '9A'
+]
+GRADE_POINTS_PER_STEP = 50
+
+def grade_ordinal(grade):
+    """Returnerar gradens position i GRADE_SCALE, eller None för okända grader."""
+    normalised = (grade or '').strip().upper()
+    return GRADE_SCALE.index(normalised) if normalised in GRADE_SCALE else None
+
+def grade_points(ordinal):
+    """Poäng för en grad, okända grader ger inga poäng."""
+    return None if ordinal is None else (ordinal + 1) * GRADE_POINTS_PER_STEP
+
 class DifficultyLevel(db.Model):
     __tablename__ = 'difficulty_levels'
-    
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     grade = db.Column(db.String(250), nullable=False)
-    
+    ordinal = db.Column(db.Integer, nullable=True, index=True)
+    points = db.Column(db.Integer, nullable=True)
+
     def __repr__(self):
-        return f"<DifficultyLevel {self.id}: {self.grade}>"
\ No newline at end of file
+        return f"<DifficultyLevel {self.id}: {self.grade}>"
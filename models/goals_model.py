@@ -11,4 +11,8 @@ class Goal(db.Model):
     target_date = db.Column(db.DateTime)
     status = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_goals_user_id_status', 'user_id', 'status'),
+    )
\ No newline at end of file
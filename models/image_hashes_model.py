@@ -0,0 +1,17 @@
+from config.db_config import db
+from datetime import datetime
+
+class ImageHash(db.Model):
+    __tablename__ = 'image_hashes'
+
+    # SHA-256 of the uploaded bytes, identical files share one upload
+    content_hash = db.Column(db.String(64), primary_key=True)
+    image_url = db.Column(db.String(1000), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    # Number of uploads answered from this row instead of the image host
+    hits = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ImageHash {self.content_hash[:12]}: {self.image_url}>"
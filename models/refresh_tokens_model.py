@@ -0,0 +1,17 @@
+from config.db_config import db
+from datetime import datetime
+
+class RefreshToken(db.Model):
+    __tablename__ = 'refresh_tokens'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    # SHA-256 of the token, the token itself is only stored in the client's cookie
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    # Set when the token is rotated or revoked, a token can only be used once
+    revoked_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<RefreshToken {self.id}: user {self.user_id}>"
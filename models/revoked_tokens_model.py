@@ -0,0 +1,15 @@
+from config.db_config import db
+from datetime import datetime
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    # Autoincrement id, so each process can load new revocations incrementally
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(64), nullable=False, unique=True)
+    # The access token's exp, after which the row is no longer needed
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RevokedToken {self.jti}>"
@@ -4,11 +4,19 @@ class Route(db.Model):
     __tablename__ = 'routes'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    difficulty_id = db.Column(db.Integer, db.ForeignKey('difficulty_levels.id'), nullable=False)
+    difficulty_id = db.Column(db.Integer, db.ForeignKey('difficulty_levels.id'), nullable=False, index=True)
     type = db.Column(db.String(255), nullable=False)
+    # Empty string instead of NULL, so the catalogue key below stays unique
+    location = db.Column(db.String(255), nullable=False, default='', server_default='')
+    name = db.Column(db.String(255), nullable=False, default='', server_default='')
     
     # Relationships
     difficulty = db.relationship('DifficultyLevel', backref=db.backref('routes', lazy=True))
+
+    # Route catalogue: one row per (type, difficulty, location, name), shared by repeat ascents
+    __table_args__ = (
+        db.Index('uq_routes_type_difficulty_id_location_name', 'type', 'difficulty_id', 'location', 'name', unique=True),
+    )
     
     def __repr__(self):
         return f"<Route {self.id}: Type {self.type}>"
\ No newline at end of file
@@ -0,0 +1,29 @@
+from config.db_config import db
+from datetime import datetime
+
+class UploadJob(db.Model):
+    __tablename__ = 'upload_jobs'
+
+    # Slumpat id, fungerar som nyckel för statusfrågor
+    id = db.Column(db.String(32), primary_key=True)
+    # NULL för profilbilder som laddas upp under registreringen
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    # 'pending', 'processing', 'done' eller 'failed'
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    filepath = db.Column(db.String(1000), nullable=True)
+    target_type = db.Column(db.String(50), nullable=True)
+    target_id = db.Column(db.Integer, nullable=True)
+    route_id = db.Column(db.Integer, nullable=True)
+    flash = db.Column(db.Boolean, nullable=False, default=False)
+    # SHA-256 av filen, sparas i image_hashes när uppladdningen lyckas
+    content_hash = db.Column(db.String(64), nullable=True)
+    image_url = db.Column(db.String(1000), nullable=True)
+    # Filstorlek före och efter nedskalning, NULL om bilden inte behandlats
+    original_bytes = db.Column(db.Integer, nullable=True)
+    uploaded_bytes = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<UploadJob {self.id}: {self.status}>"
@@ -0,0 +1,20 @@
+from config.db_config import db
+
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    flash_count = db.Column(db.Integer, nullable=False, default=0)
+    last_climb_date = db.Column(db.DateTime, nullable=True)
+    # Sum of the points of the user's SCORE_BEST_N hardest completions
+    score = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # The leaderboard is read in (completed_count DESC, user_id) or (score DESC, user_id) order
+    __table_args__ = (
+        db.Index('ix_user_stats_completed_count_user_id', 'completed_count', 'user_id'),
+        db.Index('ix_user_stats_score_user_id', 'score', 'user_id'),
+    )
+
+    def __repr__(self):
+        return f"<UserStats {self.user_id}: {self.completed_count} completed>"
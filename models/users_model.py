@@ -1,12 +1,19 @@
 from config.db_config import db
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.sql import func
+from sqlalchemy.orm import validates
+from utils.user_cache import invalidate_user
+from utils.password_hashing import hash_password, verify_password
+
+def normalise_username(username):
+    return (username or '').lower()
 
 class User(db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     username = db.Column(db.String(20), nullable=False, unique=True)
+    # Gemener av username, indexerad för prefixsökning (se user_controller.search_users)
+    username_lower = db.Column(db.String(20), nullable=False, default='', server_default='', index=True)
     hashed_password = db.Column(db.String(2000), nullable=False)
     email = db.Column(db.String(200), nullable=False, unique=True)
     profile_image_url = db.Column(db.String(1000), nullable=False)
@@ -19,9 +26,16 @@ class User(db.Model):
     
     def __repr__(self):
         return f"<User {self.username}>"
+
+    @validates('username')
+    def _set_username_lower(self, key, username):
+        self.username_lower = normalise_username(username)
+        return username
     
     def set_password(self, password):
-        self.hashed_password = generate_password_hash(password)
+        self.hashed_password = hash_password(password)
+        if self.id is not None:
+            invalidate_user(self.id)
     
     def check_password(self, password):
-        return check_password_hash(self.hashed_password, password)
\ No newline at end of file
+        return verify_password(self.hashed_password, password)
\ No newline at end of file
@@ -1,16 +1,16 @@
 from flask import Blueprint, jsonify, request
 from controllers.achievement_controller import get_user_achievements, add_achievement
-from utils.auth_decorator import auth_required
+from utils.auth_decorator import auth_required, own_user_required
+from utils.conditional_get import conditional_get, user_version_key
 
 achievement_routes = Blueprint('achievement_routes', __name__)
 
 # Get achievements for a specific user
 @achievement_routes.route('/user/<int:user_id>', methods=['GET']) 
-@auth_required
+@auth_required(claims_only=True)
+@own_user_required
+@conditional_get(lambda user_id, **kwargs: user_version_key(user_id))
 def get_achievements(user_id, current_user):
-    if current_user.id != user_id:
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     achievements, error = get_user_achievements(user_id)
     if error:
         return jsonify({'error': error}), 404
@@ -18,7 +18,7 @@ def get_achievements(user_id, current_user):
     return jsonify({'achievements': achievements}), 200
 
 @achievement_routes.route('/add', methods=['POST'])
-@auth_required
+@auth_required(claims_only=True)
 def add_user_achievement(current_user):
     """Add a new achievement for the authenticated user"""
     data = request.get_json()
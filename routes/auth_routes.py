@@ -1,13 +1,26 @@
 from flask import Blueprint, jsonify, request, make_response
 from controllers import auth_controller
-from controllers.auth_controller import authenticate_user
+from controllers.auth_controller import authenticate_user, refresh_access_token, revoke_session, LOGIN_BUSY_ERROR
+from config.db_config import Config
 from controllers.user_controller import create_user
 from models.users_model import User
 from utils.auth_decorator import auth_required
+from utils.password_hashing import hashing_stats
+from utils.login_throttle import get_login_throttle, login_throttle_limits
+from utils.token_cache import forget_token
 
 # __name__  is telling Flask "where am I in the Python package structure"
 auth_routes = Blueprint('auth_routes', __name__)
 
+# Refresh-token-cookien skickas bara till /api/auth
+REFRESH_COOKIE_PATH = '/api/auth'
+
+def set_token_cookies(response, tokens):
+    response.set_cookie('token', tokens['access_token'], httponly=True)
+    response.set_cookie('refresh_token', tokens['refresh_token'], httponly=True,
+                        path=REFRESH_COOKIE_PATH, max_age=Config.REFRESH_TOKEN_DAYS * 24 * 3600)
+    return response
+
 #Login
 @auth_routes.route('/login', methods=['POST', 'OPTIONS'])
 def login():
@@ -31,24 +44,53 @@ def login():
     if not data or 'username' not in data or 'password' not in data:
         return jsonify({'error': 'Missing username or password'}), 400
 
-    token, error = auth_controller.authenticate_user(
+    # Stoppa upprepade misslyckade försök innan lösenordet hashas
+    throttle = get_login_throttle()
+    limits = login_throttle_limits(data['username'], request.remote_addr)
+    retry_after = throttle.blocked(limits)
+    if retry_after:
+        return jsonify({'error': 'Too many failed login attempts, try again later'}), 429, {'Retry-After': str(retry_after)}
+
+    tokens, error = auth_controller.authenticate_user(
         data['username'],
         data['password']
     )
 
+    if error == LOGIN_BUSY_ERROR:
+        return jsonify({'error': error}), 503, {'Retry-After': '1'}
     if error:
+        throttle.record(limits)
         return jsonify({'error': error}), 401
 
     response = make_response(jsonify({'message': 'Login successful'}))
-    response.set_cookie('token', token, httponly=True)
+    set_token_cookies(response, tokens)
 
     return response, 200
 
-#Logout (deletes JWT-Cookie)
+#Refresh (rotates the refresh token and issues a new access token)
+@auth_routes.route('/refresh', methods=['POST'])
+def refresh():
+    tokens, error = refresh_access_token(request.cookies.get('refresh_token'))
+    if error:
+        return jsonify({'error': error}), 401
+
+    response = make_response(jsonify({'message': 'Token refreshed'}))
+    set_token_cookies(response, tokens)
+    return response, 200
+
+#Logout (revokes the tokens and deletes the cookies)
 @auth_routes.route('/logout', methods=['POST'])
 def logout():
+    token = request.cookies.get('token')
+    if token:
+        forget_token(token)
+    _, error = revoke_session(token, request.cookies.get('refresh_token'))
+    if error:
+        return jsonify({'error': error}), 500
+
     response = make_response(jsonify({'message': 'Logged out'}))
     response.set_cookie('token', '', expires=0)
+    response.set_cookie('refresh_token', '', expires=0, path=REFRESH_COOKIE_PATH)
     return response, 200
 
 
@@ -90,4 +132,10 @@ def get_current_user(current_user):
         'username': current_user.username,
         'email': current_user.email,
         'profile_image_url': current_user.profile_image_url
-    }), 200
\ No newline at end of file
+    }), 200
+
+@auth_routes.route('/hash-stats', methods=['GET'])
+@auth_required(claims_only=True)
+def get_hash_stats(current_user):
+    # Kö- och väntetider för lösenordshashningen (per process)
+    return jsonify(hashing_stats()), 200
@@ -8,11 +8,13 @@ from controllers.goals_controller import (
     delete_goal
 )
 from utils.auth_decorator import auth_required
+from utils.conditional_get import conditional_get, user_version_key
 
 goals_routes = Blueprint('goals_routes', __name__)
 
 @goals_routes.route('/', methods=['GET'])
-@auth_required
+@auth_required(claims_only=True)
+@conditional_get(lambda current_user, **kwargs: user_version_key(current_user.id))
 def get_goals(current_user):
     """Get all goals for authenticated user"""
     goals, error = get_user_goals(current_user.id)
@@ -22,7 +24,7 @@ def get_goals(current_user):
     return jsonify({'goals': goals}), 200
 
 @goals_routes.route('/', methods=['POST'])
-@auth_required
+@auth_required(claims_only=True)
 def add_goal(current_user):
     """Create a new goal"""
     data = request.get_json()
@@ -36,7 +38,7 @@ def add_goal(current_user):
     return jsonify(goal), 201
 
 @goals_routes.route('/<int:goal_id>', methods=['PUT'])
-@auth_required
+@auth_required(claims_only=True)
 def edit_goal(current_user, goal_id):
     """Update an existing goal"""
     data = request.get_json()
@@ -50,7 +52,7 @@ def edit_goal(current_user, goal_id):
     return jsonify(goal), 200
 
 @goals_routes.route('/<int:goal_id>/complete', methods=['POST'])
-@auth_required
+@auth_required(claims_only=True)
 def complete_goal(current_user, goal_id):
     """Mark a goal as complete/incomplete"""
     data = request.get_json()
@@ -64,7 +66,7 @@ def complete_goal(current_user, goal_id):
     return jsonify(goal), 200
 
 @goals_routes.route('/<int:goal_id>', methods=['DELETE'])
-@auth_required
+@auth_required(claims_only=True)
 def remove_goal(current_user, goal_id):
     """Delete a goal"""
     result, error = delete_goal(goal_id, current_user.id)
@@ -1,122 +1,164 @@
-from flask import Blueprint, jsonify, request
-from controllers.image_controller import save_image, upload_to_imgur, post_img_to_db
-import requests
+from flask import Blueprint, jsonify, request, send_file
+from controllers.image_controller import save_image, create_upload_job, get_upload_job, image_dedup_stats, get_image_storage, FileTooLargeError
 import os
-from werkzeug.utils import secure_filename
-import base64
+import hashlib
 from utils.auth_decorator import auth_required
+from utils.temp_spool import SpoolFullError
+from config.db_config import Config
 
 image_routes = Blueprint('image_routes', __name__)
 
-IMGUR_CLIENT_ID = os.getenv('IMGUR_CLIENT_ID')
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+# Utrymme för multipart-gränser och formulärfälten utöver själva filen
+MAX_FORM_OVERHEAD = 64 * 1024
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@image_routes.route('/upload', methods=['POST'])
-@auth_required
-def upload_image(current_user):
+def file_too_large():
+    return jsonify({'error': f'File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB'}), 400
+
+def limit_request_size():
     """
-    Ladda upp en bild till servern, Imgur och eventuellt databasen.
+    Avvisa anrop vars Content-Length redan är för stor, innan formuläret tolkas.
+    För resten avbryter werkzeug läsningen om klienten skickar mer än gränsen.
     """
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-
-    file = request.files['file']
+    if request.content_length and request.content_length > MAX_FILE_SIZE + MAX_FORM_OVERHEAD:
+        return file_too_large()
+    request.max_content_length = MAX_FILE_SIZE + MAX_FORM_OVERHEAD
+    return None
 
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+def spool_full():
+    response = jsonify({'error': 'Too many uploads in progress, try again shortly'})
+    response.headers['Retry-After'] = str(max(1, int(Config.TEMP_SPOOL_WAIT_SECONDS)))
+    return response, 503
 
-    # Check file type
-    if not allowed_file(file.filename):
-        return jsonify({'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+def spool_upload_form(hasher):
+    """
+    Tolka formuläret med filen skriven direkt i temp-spoolen (utils/spool_request.py).
+    Platsen räknas från Content-Length (högst gränsen) och SHA-256 räknas medan filen skrivs.
 
-    # Check file size
-    file_data = file.read()
-    if len(file_data) > MAX_FILE_SIZE:
-        return jsonify({'error': f'File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB'}), 400
+    Returns:
+        tuple: (request.files eller None, felsvar eller None)
+    """
+    request.spool_upload(min(request.content_length or MAX_FILE_SIZE, MAX_FILE_SIZE), ALLOWED_EXTENSIONS, hasher)
+    try:
+        return request.files, None
+    except SpoolFullError:
+        # Är temp-spoolen full väntar anropet en stund och får sedan 503
+        return None, spool_full()
 
-    # Reset file pointer
-    file.seek(0)
+def spooled_file(file):
+    """Spoolfilen som formulärtolken skrev filen till, eller None om den hamnade någon annanstans."""
+    return getattr(file.stream, 'spooled', None)
 
-    # Steg 1: Spara bilden lokalt med randomiserat filnamn
-    filepath = save_image(file)
+def one_file_only():
+    return jsonify({'error': 'Send one image in the file field'}), 400
 
-    if not filepath:
-        return jsonify({'error': 'Failed to save image'}), 500
+def upload_job_response(job):
+    """
+    202 med job_id medan bilden laddas upp i bakgrunden. Har samma bild redan
+    laddats upp är jobbet klart direkt och svaret blir 200 med image_url.
+    """
+    data = {'job_id': job['id'], 'status_url': f"/api/images/jobs/{job['id']}"}
+    if job['status'] == 'done':
+        data['image_url'] = job['image_url']
+        if job['error']:
+            data['warning'] = job['error']
+        return jsonify(data), 200
+    return jsonify(data), 202
 
-    try:
-        # Steg 2: Ladda upp till Imgur
-        headers = {'Authorization': f'Client-ID {IMGUR_CLIENT_ID}'}
-        response = requests.post(
-            'https://api.imgur.com/3/image',
-            headers=headers,
-            data={
-                'image': base64.b64encode(file_data),
-                'type': 'base64'
-            }
-        )
+@image_routes.route('/upload', methods=['POST'])
+@auth_required
+def upload_image(current_user):
+    """
+    Ta emot en bild och ladda upp den till Imgur, och eventuellt databasen, i bakgrunden.
 
-        response_data = response.json()
+    Svarar 202 med ett job_id direkt när filen är sparad. Resultatet
+    hämtas från GET /api/images/jobs/<job_id>.
+    """
+    too_large = limit_request_size()
+    if too_large:
+        return too_large
 
-        if not response_data['success']:
-            return jsonify({'error': 'Failed to upload image to Imgur'}), 500
+    hasher = hashlib.sha256()
+    files, busy = spool_upload_form(hasher)
+    if busy:
+        return busy
 
-        image_url = response_data['data']['link']
+    if 'file' not in files:
+        return jsonify({'error': 'No file part'}), 400
 
-        # Steg 3: Ta bort den lokala filen
-        if os.path.exists(filepath):
-            os.remove(filepath)
+    file = files['file']
 
-        # Steg 4: Om target_type och target_id finns, spara till databasen
-        target_type = request.form.get('target_type')
-        target_id = request.form.get('target_id')
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
 
-        if target_type and target_id:
-            # Samla in extra parametrar för databasen
-            kwargs = {}
-            if target_type == 'completed_route':
-                kwargs['user_id'] = current_user.id  # Använd current_user
-                kwargs['route_id'] = request.form.get('route_id')
-                kwargs['flash'] = request.form.get('flash') == 'true'
+    # Check file type
+    if not allowed_file(file.filename):
+        return jsonify({'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
 
-            # Spara till databasen
-            result, db_error = post_img_to_db(
-                image_url,
-                target_type,
-                int(target_id),
-                **kwargs
-            )
+    spooled = spooled_file(file)
+    if not spooled:
+        return one_file_only()
 
-            if db_error:
-                # Vi returnerar URL:en även om databaslagringen misslyckades
-                return jsonify({
-                    'image_url': image_url,
-                    'warning': f'Image uploaded but database save failed: {db_error}'
-                }), 200
+    # Om target_type och target_id finns sparas länken i databasen när uppladdningen är klar
+    target_type = request.form.get('target_type')
+    target_id = request.form.get('target_id')
+    route_id = request.form.get('route_id')
+    try:
+        target_id = int(target_id) if target_id else None
+        route_id = int(route_id) if route_id else None
+    except ValueError:
+        return jsonify({'error': 'target_id and route_id must be integers'}), 400
+
+    # Spoolfilen tas bort när blocket lämnas, om den inte lämnats över till ett uppladdningsjobb
+    with spooled:
+        # Bilden ligger redan i spoolen, storlek och SHA-256 räknades medan den skrevs
+        try:
+            filepath = save_image(file, spooled, max_size=MAX_FILE_SIZE)
+        except FileTooLargeError:
+            return file_too_large()
 
-        # Steg 5: Returnera URL:en
-        return jsonify({'image_url': image_url}), 200
+        if not filepath:
+            return jsonify({'error': 'Failed to save image'}), 500
 
-    except Exception as e:
-        # Försök ta bort filen om något går fel
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
+        job, error = create_upload_job(
+            spooled,
+            user_id=current_user.id,
+            target_type=target_type if target_id else None,
+            target_id=target_id if target_type else None,
+            route_id=route_id,
+            flash=request.form.get('flash') == 'true',
+            content_hash=hasher.hexdigest()
+        )
+        if error:
+            return jsonify({'error': f'Error processing image: {error}'}), 500
 
-        return jsonify({'error': f'Error processing image: {str(e)}'}), 500
+        return upload_job_response(job)
 
 @image_routes.route('/upload/registration', methods=['POST'])
 def upload_registration_image():
     """
     Special endpoint for uploading profile images during user registration.
-    No authentication required.
+    No authentication required. Answers 202 with a job_id, the image URL
+    is returned by GET /api/images/jobs/<job_id> once uploaded.
     """
-    if 'file' not in request.files:
+    too_large = limit_request_size()
+    if too_large:
+        return too_large
+
+    # The file is parsed straight into the temp spool and hashed on the way
+    hasher = hashlib.sha256()
+    files, busy = spool_upload_form(hasher)
+    if busy:
+        return busy
+
+    if 'file' not in files:
         return jsonify({'error': 'No file part'}), 400
 
-    file = request.files['file']
+    file = files['file']
 
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
@@ -124,41 +166,61 @@ def upload_registration_image():
     # Check file type
     if not allowed_file(file.filename):
         return jsonify({'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
-    
-    # Check file size
-    file_data = file.read()
-    if len(file_data) > MAX_FILE_SIZE:
-        return jsonify({'error': f'File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB'}), 400
-    
-    # Reset file pointer
-    file.seek(0)
 
-    try:
-        # Save image and upload to Imgur
-        filepath = save_image(file)
+    spooled = spooled_file(file)
+    if not spooled:
+        return one_file_only()
+
+    # The spool file is removed on exit unless it was handed to an upload job
+    with spooled:
+        # Check the file size, the content was hashed while it was written
+        try:
+            filepath = save_image(file, spooled, max_size=MAX_FILE_SIZE)
+        except FileTooLargeError:
+            return file_too_large()
         
         if not filepath:
             return jsonify({'error': 'Failed to save image'}), 500
         
-        # Upload to Imgur
-        image_url, error = upload_to_imgur(filepath)
-        
+        job, error = create_upload_job(spooled, content_hash=hasher.hexdigest())
         if error:
-            return jsonify({'error': f'Failed to upload image: {error}'}), 500
-        
-        # Remove local file
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        
-        # Return only the image URL
-        return jsonify({'image_url': image_url}), 200
+            return jsonify({'error': f'Error processing image: {error}'}), 500
         
-    except Exception as e:
-        # Clean up if error
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
-        
-        return jsonify({'error': f'Error processing image: {str(e)}'}), 500
+        return upload_job_response(job)
+
+@image_routes.route('/jobs/<job_id>', methods=['GET'])
+def upload_job_status(job_id):
+    """
+    Status för ett uppladdningsjobb: pending, processing, done (med image_url) eller failed (med error).
+    Kräver ingen inloggning, job_id är slumpat och går inte att gissa.
+    """
+    job, error = get_upload_job(job_id)
+    if error:
+        return jsonify({'error': error}), 404
+    return jsonify(job), 200
+
+@image_routes.route('/dedup-stats', methods=['GET'])
+@auth_required
+def image_dedup_stats_route(current_user):
+    # Uppladdningar som besvarats från image_hashes i stället för bildvärden
+    return jsonify(image_dedup_stats()), 200
+
+@image_routes.route('/files/<key>', methods=['GET'])
+def serve_image_file(key):
+    """
+    Bilder i den lokala lagringen (IMAGE_STORAGE_BACKEND=local).
+    send_file svarar på Range och If-None-Match, och med USE_X_SENDFILE
+    skickar webbservern själva filen. Innehållet ändras aldrig för en nyckel.
+    """
+    storage = get_image_storage()
+    path = storage.path_for(key) if storage.name == 'local' else None
+    if not path or not os.path.exists(path):
+        return jsonify({'error': 'Image not found'}), 404
+
+    response = send_file(path, conditional=True, max_age=365 * 24 * 60 * 60)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @image_routes.route('/delete', methods=['DELETE'])
 @auth_required
@@ -167,20 +229,11 @@ def delete_image(current_user):
     if 'delete_hash' not in data:
         return jsonify({'error': 'Missing delete_hash parameter'}), 400
     
-    try:
-        headers = {'Authorization': f'Client-ID {IMGUR_CLIENT_ID}'}
-        response = requests.delete(
-            f'https://api.imgur.com/3/image/{data["delete_hash"]}',
-            headers=headers
-        )
-        
-        if response.status_code == 200:
-            return jsonify({
-                'success': True,
-                'message': 'Image deleted successfully'
-            }), 200
-        else:
-            return jsonify({'error': 'Failed to delete image from Imgur'}), 500
-            
-    except Exception as e:
-        return jsonify({'error': f'Image deletion error: {str(e)}'}), 500
+    deleted, error = get_image_storage().delete(data['delete_hash'])
+    if error:
+        return jsonify({'error': error}), 500
+
+    return jsonify({
+        'success': True,
+        'message': 'Image deleted successfully'
+    }), 200
@@ -1,6 +1,8 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from controllers.journal_controller import (
     get_journal_entries_by_user, 
+    export_journal_entries,
+    import_journal_entries,
     get_journal_entry_by_id, 
     create_journal_entry, 
     update_journal_entry, 
@@ -8,22 +10,78 @@ from controllers.journal_controller import (
 )
 from controllers.route_controller import create_route
 from datetime import datetime
+import csv
+import io
 from utils.auth_decorator import auth_required
+from utils.conditional_get import conditional_get, user_version_key
 
 journal_routes = Blueprint('journal_routes', __name__)
 
 
 @journal_routes.route('/', methods=['GET'])
-@auth_required
+@auth_required(claims_only=True)
+@conditional_get(lambda current_user, **kwargs: user_version_key(current_user.id))
 def get_user_journal(current_user):
-    entries, error = get_journal_entries_by_user(current_user.id)
+    """
+    Get the authenticated user's journal, newest first.
+
+    Query params: limit (optional, all entries if omitted), before (next_cursor from the previous page)
+    """
+    limit = request.args.get('limit', type=int)
+    before = request.args.get('before')
+
+    page, error = get_journal_entries_by_user(current_user.id, limit=limit, before=before)
     if error:
-        return jsonify({'error': error}), 404
+        status = 404 if error.startswith('Database error') else 400
+        return jsonify({'error': error}), status
     
-    return jsonify({'entries': entries}), 200
+    return jsonify(page), 200
+
+@journal_routes.route('/export', methods=['GET'])
+@auth_required(claims_only=True)
+def export_user_journal(current_user):
+    """Download the authenticated user's full journal as NDJSON or CSV (?format=ndjson|csv)"""
+    export_format = request.args.get('format', 'ndjson')
+
+    rows, error = export_journal_entries(current_user.id, export_format)
+    if error:
+        return jsonify({'error': error}), 400
+
+    mimetype = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv'
+    response = Response(stream_with_context(rows), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=myboulders-journal.{export_format}'
+    return response
+
+@journal_routes.route('/import', methods=['POST'])
+@auth_required(claims_only=True)
+def import_user_journal(current_user):
+    """
+    Bulk import past climbs.
+
+    Accepts a JSON array of entries (or {"entries": [...]}) or an uploaded CSV file
+    ('file') with the columns route_type, difficulty, flash, date and image_url.
+    """
+    if 'file' in request.files:
+        file = request.files['file']
+        reader = csv.DictReader(io.TextIOWrapper(file.stream, encoding='utf-8-sig'))
+        try:
+            rows = list(reader)
+        except (csv.Error, UnicodeDecodeError) as e:
+            return jsonify({'error': f'Invalid CSV file: {str(e)}'}), 400
+    else:
+        data = request.get_json(silent=True)
+        rows = data.get('entries') if isinstance(data, dict) else data
+        if rows is None:
+            return jsonify({'error': 'Expected a JSON array of entries or a CSV file'}), 400
+
+    result, error = import_journal_entries(current_user.id, rows)
+    if error:
+        return jsonify({'error': error}), 400
+
+    return jsonify(result), 201 if result['imported'] else 400
 
 @journal_routes.route('/post', methods=['POST'])
-@auth_required
+@auth_required(claims_only=True)
 def post_journal_entry(current_user):
     """Create a new journal entry with auto-route creation"""
     data = request.get_json()
@@ -41,6 +99,7 @@ def post_journal_entry(current_user):
             'type': data['route_type'],
             'difficulty': data['difficulty'],
             'location': data.get('location'),
+            'name': data.get('name'),
             'description': data.get('description')
         }
         
@@ -88,7 +147,7 @@ def post_journal_entry(current_user):
         return jsonify({'error': str(e)}), 500
 
 @journal_routes.route('/edit/<int:entry_id>', methods=['GET', 'PUT', 'DELETE'])
-@auth_required
+@auth_required(claims_only=True)
 def edit_journal_entry(entry_id, current_user):
     """Get, update, or delete a specific journal entry"""
     if request.method == 'GET':
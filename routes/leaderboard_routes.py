@@ -1,13 +1,63 @@
-from flask import Blueprint, jsonify
-from controllers.leaderboard_controller import get_leaderboard_data
+from flask import Blueprint, jsonify, request
+from controllers.leaderboard_controller import (
+    get_leaderboard_data,
+    get_user_rank,
+    get_windowed_leaderboard,
+    get_window_bounds,
+    LEADERBOARD_DEFAULT_LIMIT
+)
 from utils.auth_decorator import auth_required
+from utils.conditional_get import conditional_get, LEADERBOARD_VERSION_KEY
 
 leaderboard_routes = Blueprint('leaderboard', __name__)
 
 
+def leaderboard_version_key(**kwargs):
+    """A windowed leaderboard changes when the period rolls over, so its dates are part of the ETag."""
+    bounds = get_window_bounds(request.args.get('window'))
+    if bounds:
+        return LEADERBOARD_VERSION_KEY, f'{bounds[0].isoformat()}/{bounds[1].isoformat()}'
+    return LEADERBOARD_VERSION_KEY
 
 
 @leaderboard_routes.route('/', methods=['GET'])
+@conditional_get(leaderboard_version_key)
 def leaderboard():
-    data = get_leaderboard_data()
-    return jsonify(data)
\ No newline at end of file
+    """
+    Get one page of the leaderboard.
+
+    Query params: limit (default 100), cursor (from the X-Next-Cursor header of the previous page),
+    window (week, month or season; all time if omitted), by (count or score, all time only)
+    """
+    limit = request.args.get('limit', LEADERBOARD_DEFAULT_LIMIT, type=int)
+    cursor = request.args.get('cursor')
+    window = request.args.get('window')
+    by = request.args.get('by', 'count')
+
+    if window:
+        if by != 'count':
+            return jsonify({'error': 'Windowed leaderboards can only be sorted by count'}), 400
+        page, error = get_windowed_leaderboard(window, limit=limit, cursor=cursor)
+    else:
+        page, error = get_leaderboard_data(limit=limit, cursor=cursor, by=by)
+    if error:
+        return jsonify({'error': error}), 400
+
+    response = jsonify(page['entries'])
+    if page['next_cursor']:
+        response.headers['X-Next-Cursor'] = page['next_cursor']
+    return response
+
+@leaderboard_routes.route('/user/<int:user_id>', methods=['GET'])
+@conditional_get(lambda **kwargs: LEADERBOARD_VERSION_KEY)
+def user_rank(user_id):
+    """Get a user's rank and the users just above and below them"""
+    context = request.args.get('context', 2, type=int)
+    by = request.args.get('by', 'count')
+
+    data, error = get_user_rank(user_id, context=context, by=by)
+    if error:
+        status = 404 if error == 'User not found on leaderboard' else 400
+        return jsonify({'error': error}), status
+
+    return jsonify(data), 200
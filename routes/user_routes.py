@@ -1,12 +1,29 @@
+import csv
+import hmac
+import io
 from flask import Blueprint, jsonify, request
-from controllers.user_controller import create_user, get_user_by_id_or_username, delete_user
+from config.db_config import Config
+from controllers.user_controller import create_user, get_user_by_id_or_username, delete_user, provision_users, search_users, USER_SEARCH_DEFAULT_LIMIT
 from utils.auth_decorator import auth_required
+from utils.user_cache import user_cache_stats
 
 
 user_routes = Blueprint('user_routes', __name__)
 
 @user_routes.route('/search', methods=['GET'])
 def search_user():
+    # Prefixsökning för type-ahead: ?q=<början av användarnamn>&limit=<antal>
+    if 'q' in request.args:
+        try:
+            limit = int(request.args.get('limit', USER_SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+
+        users, error = search_users(request.args['q'], limit)
+        if error:
+            return jsonify({'error': error}), 400
+        return jsonify(users), 200
+
     user_id = request.args.get('user_id')
     username = request.args.get('username')
 
@@ -44,4 +61,40 @@ def delete_user_route(current_user):
     return jsonify(result), 200
 
 
+@user_routes.route("/cache-stats", methods=["GET"])
+@auth_required
+def user_cache_stats_route(current_user):
+    # Träffar och missar för cachen i auth_required (per process)
+    return jsonify(user_cache_stats()), 200
+
+
+@user_routes.route("/bulk", methods=["POST"])
+def bulk_create_users():
+    """
+    Provision many users at once, e.g. a gym partner's member list.
+
+    Requires the X-Provisioning-Key header to match PROVISIONING_KEY. Accepts a
+    JSON array of users (or {"users": [...]}) or an uploaded CSV file ('file')
+    with the columns username, password, email and profile_image_url.
+    """
+    provided = request.headers.get('X-Provisioning-Key', '')
+    if not Config.PROVISIONING_KEY or not hmac.compare_digest(provided, Config.PROVISIONING_KEY):
+        return jsonify({'error': 'Invalid provisioning key'}), 403
+
+    if 'file' in request.files:
+        reader = csv.DictReader(io.TextIOWrapper(request.files['file'].stream, encoding='utf-8-sig'))
+        try:
+            rows = list(reader)
+        except (csv.Error, UnicodeDecodeError) as e:
+            return jsonify({'error': f'Invalid CSV file: {str(e)}'}), 400
+    else:
+        data = request.get_json(silent=True)
+        rows = data.get('users') if isinstance(data, dict) else data
+        if rows is None:
+            return jsonify({'error': 'Expected a JSON array of users or a CSV file'}), 400
+
+    result, error = provision_users(rows)
+    if error:
+        return jsonify({'error': error}), 400
 
+    return jsonify(result), 201 if result['created'] else 400
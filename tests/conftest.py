@@ -1,6 +1,34 @@
 import pytest
 import os
 import sys
+import tempfile
 
 # Add the parent directory to sys.path to ensure imports work correctly
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
\ No newline at end of file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# The engine is created when app is imported, so the test database has to be
+# chosen before that. A file (not :memory:) lets upload worker threads share it.
+_database_folder = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_database_folder.name, 'test.db')}"
+
+from app import app as flask_app
+from config.db_config import db
+
+@pytest.fixture
+def app():
+    """The app on the throwaway test database, with empty tables for each test."""
+    flask_app.config.update({
+        'TESTING': True,
+        'SECRET_KEY': 'test_secret_key'
+    })
+
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Get a test client for the app."""
+    return app.test_client()
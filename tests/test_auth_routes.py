@@ -258,4 +258,278 @@ def test_me_endpoint_without_token(client):
     assert response.status_code == 401
     data = json.loads(response.data)
     assert 'error' in data
-    assert 'Authorization token is missing' in data['error']
\ No newline at end of file
+    assert 'Authorization token is missing' in data['error']
+
+def test_me_endpoint_uses_user_cache(client, init_database):
+    """Repeated requests are served from the user cache until the user changes."""
+    from controllers.image_controller import post_img_to_db
+    from controllers.user_controller import delete_user
+    from utils.user_cache import clear_user_cache, user_cache_stats
+
+    clear_user_cache()
+    client.post('/api/auth/login', json={
+        'username': 'testuser',
+        'password': 'testpassword'
+    })
+
+    for _ in range(3):
+        assert client.get('/api/auth/me').status_code == 200
+    stats = user_cache_stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+
+    # A new profile image invalidates the cached snapshot
+    user = User.query.filter_by(username='testuser').first()
+    post_img_to_db('https://i.imgur.com/new.jpeg', 'user_profile', user.id)
+    data = json.loads(client.get('/api/auth/me').data)
+    assert data['profile_image_url'] == 'https://i.imgur.com/new.jpeg'
+
+    response = client.get('/api/users/cache-stats')
+    assert json.loads(response.data)['misses'] == 2
+
+    # A deleted user is rejected straight away
+    delete_user(user_id=user.id)
+    response = client.get('/api/auth/me')
+    assert response.status_code == 401
+
+def test_claims_only_routes_skip_user_row(client, init_database):
+    """Claims-only routes only probe the user id and still reject deleted users."""
+    from sqlalchemy import event
+    from controllers.user_controller import delete_user
+    from utils.auth_decorator import UserProxy
+    from utils.user_cache import clear_user_cache
+
+    clear_user_cache()
+    client.post('/api/auth/login', json={
+        'username': 'testuser',
+        'password': 'testpassword'
+    })
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert client.get('/api/journal/').status_code == 200
+        assert client.get('/api/journal/').status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    user_queries = [s for s in statements if 'FROM users' in s]
+    assert len(user_queries) == 1
+    assert 'users.email' not in user_queries[0]
+
+    # Other attributes are loaded on first access
+    user = User.query.filter_by(username='testuser').first()
+    assert UserProxy(user.id).email == 'test@example.com'
+
+    delete_user(user_id=user.id)
+    assert client.get('/api/goals/').status_code == 401
+
+def test_goals_and_achievements_skip_user_row(client, init_database, app, monkeypatch):
+    """The claims-only goal and achievement handlers never load the users row, a user gone mid-request is 401."""
+    from sqlalchemy import event
+    import utils.auth_decorator as auth_decorator
+
+    client.post('/api/auth/login', json={'username': 'testuser', 'password': 'testpassword'})
+    user_id = json.loads(client.get('/api/auth/me').data)['id']
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert client.post('/api/goals/', json={'title': 'Flash a 7A'}).status_code == 201
+        assert client.get('/api/goals/').status_code == 200
+        assert client.post('/api/achievements/add', json={'achievement_name': 'First send'}).status_code == 201
+        assert client.get(f'/api/achievements/user/{user_id}').status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert not [s for s in statements if 'hashed_password' in s]
+
+    @auth_decorator.auth_required(claims_only=True)
+    def reads_username(current_user):
+        return current_user.username
+
+    # The user is deleted between the token check and the first attribute read
+    monkeypatch.setattr(auth_decorator, 'get_cached_user', lambda user_id, loader: None)
+    token = client.get_cookie('token').value
+    with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+        response, status = reads_username()
+    assert status == 401
+    assert json.loads(response.data)['error'] == 'User not found'
+
+def test_login_rehashes_with_new_kdf_parameters(client, app, monkeypatch):
+    """A hash made with old KDF parameters is replaced on successful login."""
+    from config.db_config import Config
+    from utils.password_hashing import hashing_stats
+
+    monkeypatch.setattr(Config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    client.post('/api/auth/register', json={
+        'username': 'oldhash',
+        'password': 'password123',
+        'email': 'oldhash@example.com'
+    })
+    assert User.query.filter_by(username='oldhash').first().hashed_password.startswith('pbkdf2:sha256:1000$')
+
+    monkeypatch.setattr(Config, 'PASSWORD_HASH_METHOD', 'scrypt:16384:8:1')
+    completed = hashing_stats()['completed']
+    response = client.post('/api/auth/login', json={'username': 'oldhash', 'password': 'password123'})
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert User.query.filter_by(username='oldhash').first().hashed_password.startswith('scrypt:16384:8:1$')
+    # One verify and one rehash, both in the hashing pool
+    assert hashing_stats()['completed'] == completed + 2
+
+    # The new hash still verifies and is not rehashed again
+    response = client.post('/api/auth/login', json={'username': 'oldhash', 'password': 'password123'})
+    assert response.status_code == 200
+    assert hashing_stats()['completed'] == completed + 3
+
+def test_login_throttle_rejects_before_hashing(client, init_database, monkeypatch):
+    """Repeated failures for a username are rejected with 429 without hashing."""
+    from config.db_config import Config
+    from utils.login_throttle import get_login_throttle
+    from utils.password_hashing import hashing_stats
+
+    monkeypatch.setattr(Config, 'LOGIN_THROTTLE_USER_LIMIT', 3)
+    get_login_throttle().reset()
+
+    for _ in range(3):
+        response = client.post('/api/auth/login', json={'username': 'testuser', 'password': 'wrong'})
+        assert response.status_code == 401
+
+    completed = hashing_stats()['completed']
+    response = client.post('/api/auth/login', json={'username': 'TestUser', 'password': 'testpassword'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert hashing_stats()['completed'] == completed
+
+    get_login_throttle().reset()
+    response = client.post('/api/auth/login', json={'username': 'testuser', 'password': 'testpassword'})
+    assert response.status_code == 200
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_login_throttle_sliding_window(backend, tmp_path):
+    """The previous window's failures count in proportion to its overlap."""
+    from utils.login_throttle import MemoryThrottle, SQLiteThrottle
+
+    window = 100
+    if backend == 'memory':
+        throttle = MemoryThrottle(window)
+    else:
+        throttle = SQLiteThrottle(window, str(tmp_path / 'throttle.db'))
+        # A second process opening the same file sees the same counts
+        other = SQLiteThrottle(window, str(tmp_path / 'throttle.db'))
+
+    limits = {'user:a': 4}
+    for _ in range(4):
+        throttle.record(limits, now=1050)
+    assert throttle.blocked(limits, now=1060) is not None
+    if backend == 'sqlite':
+        assert other.blocked(limits, now=1060) is not None
+
+    # 4 failures in the previous window, a quarter into the next one: 3 still count
+    assert throttle.blocked(limits, now=1125) is None
+    throttle.record(limits, now=1125)
+    assert throttle.blocked(limits, now=1125) is not None
+
+    # Both windows have passed
+    assert throttle.blocked(limits, now=1300) is None
+
+def test_token_cache_never_serves_expired_tokens(app):
+    """Verified tokens are memoised until exp and rejected after it."""
+    import time
+    import jwt
+    from config.db_config import Config
+    from utils.token_cache import decode_token, clear_token_cache, token_cache_stats
+
+    clear_token_cache()
+    token = jwt.encode({'id': 1, 'exp': int(time.time()) + 2}, Config.SECRET_KEY, algorithm='HS256')
+    assert decode_token(token)['id'] == 1
+    assert decode_token(token)['id'] == 1
+    assert (token_cache_stats()['hits'], token_cache_stats()['misses']) == (1, 1)
+
+    # A token signed with another key never matches a cached entry
+    forged = jwt.encode({'id': 1, 'exp': int(time.time()) + 60}, 'other-key', algorithm='HS256')
+    with pytest.raises(jwt.InvalidSignatureError):
+        decode_token(forged)
+
+    time.sleep(2.1)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        decode_token(token)
+    assert token_cache_stats()['size'] == 0
+
+def test_refresh_token_rotation_and_reuse(client, init_database):
+    """Refresh tokens rotate on use, reusing an old one revokes the user's sessions."""
+    client.post('/api/auth/login', json={'username': 'testuser', 'password': 'testpassword'})
+    first = client.get_cookie('refresh_token', path='/api/auth').value
+
+    response = client.post('/api/auth/refresh')
+    assert response.status_code == 200
+    second = client.get_cookie('refresh_token', path='/api/auth').value
+    assert second != first
+    assert client.get('/api/auth/me').status_code == 200
+
+    # The rotated token was copied and is used again
+    client.set_cookie('refresh_token', first, path='/api/auth')
+    response = client.post('/api/auth/refresh')
+    assert response.status_code == 401
+    assert 'revoked' in json.loads(response.data)['error']
+
+    client.set_cookie('refresh_token', second, path='/api/auth')
+    assert client.post('/api/auth/refresh').status_code == 401
+
+def test_logout_revokes_access_token(client, init_database):
+    """A token kept after logout is rejected through the revocation list."""
+    from utils.token_revocation import BloomFilter
+
+    client.post('/api/auth/login', json={'username': 'testuser', 'password': 'testpassword'})
+    token = client.get_cookie('token').value
+    assert client.get('/api/auth/me').status_code == 200
+
+    assert client.post('/api/auth/logout').status_code == 200
+    response = client.get('/api/auth/me', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 401
+    assert json.loads(response.data)['error'] == 'Token has been revoked'
+    assert client.post('/api/auth/refresh').status_code == 401
+
+    bloom = BloomFilter(1 << 12, 5)
+    bloom.add('revoked-jti')
+    assert 'revoked-jti' in bloom
+    assert sum(f'jti-{i}' in bloom for i in range(1000)) < 10
+
+def test_revocation_seen_by_other_process(client, init_database, monkeypatch):
+    """Another process picks up a revocation at its next sync, without a query per request."""
+    import utils.token_revocation as token_revocation
+    from sqlalchemy import event
+    from config.db_config import Config
+
+    monkeypatch.setattr(Config, 'REVOCATION_SYNC_SECONDS', 60)
+    client.post('/api/auth/login', json={'username': 'testuser', 'password': 'testpassword'})
+    token = client.get_cookie('token').value
+    assert client.get('/api/auth/me').status_code == 200
+
+    # Between syncs an authenticated request does not touch revoked_tokens
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert client.get('/api/auth/me').status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert not [s for s in statements if 'revoked_tokens' in s]
+
+    # Process B has synced its filter before the logout below
+    other_filter, other_last_id = token_revocation._filter, token_revocation._last_id
+    token_revocation._filter = token_revocation.BloomFilter(token_revocation.REVOCATION_BLOOM_BITS,
+                                                            token_revocation.REVOCATION_BLOOM_HASHES)
+
+    # Process A revokes the token
+    assert client.post('/api/auth/logout').status_code == 200
+
+    # Switch back to process B's filter state: accepted until its next sync
+    token_revocation._filter, token_revocation._last_id = other_filter, other_last_id
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/auth/me', headers=headers).status_code == 200
+
+    monkeypatch.setattr(token_revocation, '_next_sync', 0.0)
+    response = client.get('/api/auth/me', headers=headers)
+    assert response.status_code == 401
+    assert json.loads(response.data)['error'] == 'Token has been revoked'
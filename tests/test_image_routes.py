@@ -0,0 +1,436 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from PIL import Image
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config.db_config import db, Config
+from models.users_model import User
+import controllers.image_controller as image_controller
+import routes.image_routes as image_routes
+import utils.temp_spool as temp_spool
+
+@pytest.fixture
+def climber(app):
+    """A test client logged in as a freshly registered user."""
+    client = app.test_client()
+    client.post('/api/auth/register', json={
+        'username': 'climber',
+        'password': 'password123',
+        'email': 'climber@example.com'
+    })
+    response = client.post('/api/auth/login', json={
+        'username': 'climber',
+        'password': 'password123'
+    })
+    assert response.status_code == 200
+    return client
+
+@pytest.fixture
+def image_host(monkeypatch):
+    """A local stand-in for the Imgur upload API. Answers only when `release` is set."""
+    host = {'uploads': [], 'bodies': [], 'ports': [], 'script': [], 'status': 200, 'release': threading.Event()}
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, så att återanvända anslutningar syns i host['ports']
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            host['bodies'].append(self.rfile.read(int(self.headers['Content-Length'])))
+            host['ports'].append(self.client_address[1])
+            host['release'].wait(5)
+            # Svar som ska ges innan uppladdningen lyckas, t.ex. (429, {'Retry-After': '0'})
+            status, headers = host['script'].pop(0) if host['script'] else (host['status'], {})
+            if status == 200:
+                host['uploads'].append(self.path)
+            body = json.dumps({
+                'success': status == 200,
+                'data': {'link': f"https://i.imgur.com/stub{len(host['uploads'])}.jpg"}
+            }).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(image_controller, 'IMGUR_API_URL', f'http://127.0.0.1:{server.server_port}/3/image')
+    yield host
+    host['release'].set()
+    server.shutdown()
+    server.server_close()
+
+def wait_for_job(client, status_url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = json.loads(client.get(status_url).data)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job did not finish: {job}')
+
+def jpeg_bytes(size=(64, 48), **save_options):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (120, 90, 60)).save(buffer, 'JPEG', **save_options)
+    return buffer.getvalue()
+
+def image_file(name='boulder.jpg'):
+    return (io.BytesIO(jpeg_bytes()), name)
+
+def uploaded_image(body):
+    """The image bytes the stub host received in a multipart body."""
+    return base64.b64decode(re.search(rb'name="image"\r\n\r\n(.*?)\r\n--', body, re.S).group(1))
+
+def test_upload_returns_job_before_image_host_answers(climber, image_host):
+    """The request is answered with 202 while the upload is still waiting on the host."""
+    user = User.query.filter_by(username='climber').first()
+
+    response = climber.post('/api/images/upload', data={
+        'file': image_file(),
+        'target_type': 'user_profile',
+        'target_id': str(user.id)
+    }, content_type='multipart/form-data')
+    assert response.status_code == 202
+    data = json.loads(response.data)
+    assert data['status_url'] == f"/api/images/jobs/{data['job_id']}"
+
+    job = json.loads(climber.get(data['status_url']).data)
+    assert job['status'] in ('pending', 'processing')
+
+    image_host['release'].set()
+    job = wait_for_job(climber, data['status_url'])
+    assert job['status'] == 'done'
+    assert job['image_url'] == 'https://i.imgur.com/stub1.jpg'
+    assert job['error'] is None
+
+    # post_img_to_db ran in the worker
+    db.session.expire_all()
+    assert db.session.get(User, user.id).profile_image_url == 'https://i.imgur.com/stub1.jpg'
+
+def test_registration_upload_reports_host_failure(app, image_host):
+    """A rejected upload ends as a failed job with the host's error."""
+    client = app.test_client()
+    image_host['status'] = 400
+    image_host['release'].set()
+
+    response = client.post('/api/images/upload/registration', data={'file': image_file('me.png')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+
+    job = wait_for_job(client, json.loads(response.data)['status_url'])
+    assert job['status'] == 'failed'
+    assert job['image_url'] is None
+    assert '400' in job['error']
+
+def test_unknown_job_is_404(app):
+    client = app.test_client()
+    assert client.get('/api/images/jobs/doesnotexist').status_code == 404
+
+def test_upload_streams_base64_body(app, image_host):
+    """The host receives the exact bytes, base64-encoded in a multipart body."""
+    image_host['release'].set()
+    content = os.urandom(200_000)
+
+    # GIF:ar skickas vidare utan bildbehandling
+    response = app.test_client().post('/api/images/upload/registration',
+                                      data={'file': (io.BytesIO(content), 'big.gif')},
+                                      content_type='multipart/form-data')
+    job = wait_for_job(app.test_client(), json.loads(response.data)['status_url'])
+    assert job['status'] == 'done'
+
+    assert uploaded_image(image_host['bodies'][0]) == content
+
+def test_upload_parsed_straight_into_spool(app, image_host, spool, monkeypatch):
+    """Large file parts go directly into the reserved spool file, not through werkzeug's own temp file."""
+    import werkzeug.wrappers.request
+    werkzeug_temp_files = []
+    default_factory = werkzeug.wrappers.request.default_stream_factory
+
+    def recording_factory(*args, **kwargs):
+        werkzeug_temp_files.append(kwargs.get('filename'))
+        return default_factory(*args, **kwargs)
+
+    monkeypatch.setattr(werkzeug.wrappers.request, 'default_stream_factory', recording_factory)
+    image_host['release'].set()
+    content = os.urandom(800_000)
+    client = app.test_client()
+
+    response = client.post('/api/images/upload/registration',
+                           data={'file': (io.BytesIO(content), 'big.gif')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    job = wait_for_job(client, json.loads(response.data)['status_url'])
+    assert job['status'] == 'done'
+    assert uploaded_image(image_host['bodies'][0]) == content
+    assert werkzeug_temp_files == []
+
+    # A second file part is not spooled and the request is refused
+    response = client.post('/api/images/upload/registration',
+                           data={'other': (io.BytesIO(b'GIF89a'), 'first.gif'), 'file': (io.BytesIO(content), 'big.gif')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert werkzeug_temp_files == ['big.gif']
+    assert list(spool.iterdir()) == []
+    assert temp_spool._reserved == 0
+
+def test_upload_size_limit_while_streaming(app, image_host, monkeypatch):
+    """Files over MAX_FILE_SIZE are refused without leaving anything in temp/."""
+    monkeypatch.setattr(image_routes, 'MAX_FILE_SIZE', 100)
+    temp_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'temp')
+    before = set(os.listdir(temp_folder)) if os.path.isdir(temp_folder) else set()
+    client = app.test_client()
+
+    # Counted while saving
+    response = client.post('/api/images/upload/registration', data={'file': image_file()},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'File too large' in json.loads(response.data)['error']
+
+    # Refused from Content-Length alone
+    monkeypatch.setattr(image_routes, 'MAX_FORM_OVERHEAD', 0)
+    response = client.post('/api/images/upload/registration', data={'file': image_file()},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+
+    assert not image_host['bodies']
+    assert (set(os.listdir(temp_folder)) if os.path.isdir(temp_folder) else set()) == before
+
+def test_identical_upload_reuses_url(climber, image_host):
+    """Re-uploading the same bytes answers from image_hashes without calling the host."""
+    image_host['release'].set()
+    user = User.query.filter_by(username='climber').first()
+
+    first = climber.post('/api/images/upload', data={'file': image_file()}, content_type='multipart/form-data')
+    assert first.status_code == 202
+    assert wait_for_job(climber, json.loads(first.data)['status_url'])['status'] == 'done'
+
+    # Same photo as profile picture, under another name
+    second = climber.post('/api/images/upload', data={
+        'file': image_file('retry.jpg'),
+        'target_type': 'user_profile',
+        'target_id': str(user.id)
+    }, content_type='multipart/form-data')
+    assert second.status_code == 200
+    assert json.loads(second.data)['image_url'] == 'https://i.imgur.com/stub1.jpg'
+    assert len(image_host['uploads']) == 1
+
+    job = json.loads(climber.get(json.loads(second.data)['status_url']).data)
+    assert job['status'] == 'done'
+    db.session.expire_all()
+    assert db.session.get(User, user.id).profile_image_url == 'https://i.imgur.com/stub1.jpg'
+
+    stats = json.loads(climber.get('/api/images/dedup-stats').data)
+    assert stats['stored_images'] == 1
+    assert stats['total_hits'] == 1
+    assert stats['hits'] >= 1 and 0 < stats['hit_rate'] <= 1
+
+def test_upload_is_downscaled_rotated_and_stripped(app, image_host, monkeypatch):
+    """Photos are fitted in the max dimensions, turned upright and sent without EXIF."""
+    monkeypatch.setattr(Config, 'IMAGE_MAX_WIDTH', 400)
+    monkeypatch.setattr(Config, 'IMAGE_MAX_HEIGHT', 400)
+    image_host['release'].set()
+
+    # Liggande sensorbild som ska visas stående (Orientation 6) och har GPS-position
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x8825] = {1: 'N', 2: (59.0, 20.0, 0.0)}
+    photo = jpeg_bytes((1600, 1200), exif=exif, quality=100)
+
+    client = app.test_client()
+    response = client.post('/api/images/upload/registration', data={'file': (io.BytesIO(photo), 'wall.jpg')},
+                           content_type='multipart/form-data')
+    job = wait_for_job(client, json.loads(response.data)['status_url'])
+    assert job['status'] == 'done'
+    assert job['original_bytes'] == len(photo)
+    assert job['bytes_saved'] == job['original_bytes'] - job['uploaded_bytes'] > 0
+
+    sent = uploaded_image(image_host['bodies'][0])
+    assert len(sent) == job['uploaded_bytes']
+    with Image.open(io.BytesIO(sent)) as image:
+        assert image.size == (300, 400)
+        assert not image.getexif()
+
+def test_invalid_image_fails_job(app, image_host):
+    """Files that are not images fail in processing and are never sent."""
+    image_host['release'].set()
+    client = app.test_client()
+
+    response = client.post('/api/images/upload/registration', data={'file': (io.BytesIO(b'not a jpeg'), 'fake.jpg')},
+                           content_type='multipart/form-data')
+    job = wait_for_job(client, json.loads(response.data)['status_url'])
+    assert job['status'] == 'failed'
+    assert not image_host['bodies']
+
+def test_upload_backs_off_on_rate_limit_and_server_errors(app, image_host, monkeypatch):
+    """429 and 5xx are retried over one pooled connection, each with a complete body."""
+    monkeypatch.setattr(Config, 'IMAGE_HOST_BACKOFF_SECONDS', 0.01)
+    image_host['script'] = [(429, {'Retry-After': '0'}), (503, {})]
+    image_host['release'].set()
+    client = app.test_client()
+
+    response = client.post('/api/images/upload/registration', data={'file': image_file()},
+                           content_type='multipart/form-data')
+    job = wait_for_job(client, json.loads(response.data)['status_url'])
+    assert job['status'] == 'done'
+
+    assert len(image_host['bodies']) == 3
+    assert len({uploaded_image(body) for body in image_host['bodies']}) == 1
+    assert len(set(image_host['ports'])) == 1
+
+def test_upload_gives_up_when_rate_limit_outlasts_backoff(app, image_host):
+    """A Retry-After longer than IMAGE_HOST_MAX_BACKOFF_SECONDS fails the job at once."""
+    image_host['script'] = [(429, {'Retry-After': '3600'})]
+    image_host['release'].set()
+    client = app.test_client()
+
+    response = client.post('/api/images/upload/registration', data={'file': image_file()},
+                           content_type='multipart/form-data')
+    job = wait_for_job(client, json.loads(response.data)['status_url'])
+    assert job['status'] == 'failed'
+    assert '429' in job['error']
+    assert len(image_host['bodies']) == 1
+
+def test_local_storage_serves_content_addressed_files(app, monkeypatch, tmp_path):
+    """With IMAGE_STORAGE_BACKEND=local images are stored by hash and served with Range support."""
+    monkeypatch.setattr(Config, 'IMAGE_STORAGE_BACKEND', 'local')
+    monkeypatch.setattr(Config, 'IMAGE_STORAGE_PATH', str(tmp_path))
+    client = app.test_client()
+
+    # GIF:ar lagras som de är, så innehållet går att jämföra
+    content = b'GIF89a' + os.urandom(4096)
+    response = client.post('/api/images/upload/registration', data={'file': (io.BytesIO(content), 'wall.gif')},
+                           content_type='multipart/form-data')
+    job = wait_for_job(client, json.loads(response.data)['status_url'])
+    assert job['status'] == 'done'
+
+    digest = hashlib.sha256(content).hexdigest()
+    assert job['image_url'] == f'/api/images/files/{digest}.gif'
+    assert (tmp_path / digest[:2] / digest[2:4] / f'{digest}.gif').read_bytes() == content
+
+    response = client.get(job['image_url'])
+    assert response.status_code == 200
+    assert response.data == content
+    assert 'immutable' in response.headers['Cache-Control']
+
+    response = client.get(job['image_url'], headers={'Range': 'bytes=6-15'})
+    assert response.status_code == 206
+    assert response.data == content[6:16]
+
+    response = client.get(job['image_url'], headers={'If-None-Match': client.get(job['image_url']).headers['ETag']})
+    assert response.status_code == 304
+
+    assert client.get(f"/api/images/files/{'0' * 64}.gif").status_code == 404
+    assert client.get('/api/images/files/..%2Fsecret.gif').status_code == 404
+
+@pytest.fixture
+def spool(monkeypatch, tmp_path):
+    """An empty temp spool in a throwaway folder."""
+    monkeypatch.setattr(Config, 'TEMP_SPOOL_PATH', str(tmp_path))
+    return tmp_path
+
+def test_spool_files_removed_on_every_path(app, image_host, spool):
+    """Uploads that succeed, fail or are deduplicated leave no files and no reservation behind."""
+    image_host['release'].set()
+    client = app.test_client()
+
+    for data in (image_file(), image_file(), (io.BytesIO(b'not a jpeg'), 'fake.jpg')):
+        response = client.post('/api/images/upload/registration', data={'file': data},
+                               content_type='multipart/form-data')
+        if response.status_code == 202:
+            wait_for_job(client, json.loads(response.data)['status_url'])
+
+    assert list(spool.iterdir()) == []
+    assert temp_spool._reserved == 0
+
+def test_full_spool_applies_backpressure(app, image_host, spool, monkeypatch):
+    """Uploads wait for spool space and get 503 with Retry-After when none frees up."""
+    monkeypatch.setattr(Config, 'TEMP_SPOOL_MAX_BYTES', 64 * 1024)
+    monkeypatch.setattr(Config, 'TEMP_SPOOL_WAIT_SECONDS', 0.2)
+    image_host['release'].set()
+    client = app.test_client()
+
+    with temp_spool.spool_file('.jpg', 64 * 1024 - 100):
+        response = client.post('/api/images/upload/registration', data={'file': image_file()},
+                               content_type='multipart/form-data')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
+    response = client.post('/api/images/upload/registration', data={'file': image_file()},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+
+def test_sweep_removes_orphaned_and_stale_files(spool):
+    """Files from dead processes, reused pids and pre-spool leftovers go at once, live ones once stale."""
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    owner = temp_spool._owner_prefix()
+    start_time = int(owner.split('-')[1])
+
+    (spool / 'JDNWpxmLFz.jpg').write_bytes(b'x' * 10)
+    (spool / f'{dead.pid}-{start_time}-abcdefghij.jpg').write_bytes(b'x' * 20)
+    # Samma pid som den här processen, men skriven av en tidigare process (t.ex. pid 1 i en container)
+    (spool / f'{os.getpid()}-{start_time - 1}-abcdefghij.jpg').write_bytes(b'x' * 40)
+    (spool / f'{owner}-abcdefghij.jpg').write_bytes(b'x' * 30)
+
+    assert temp_spool.sweep_spool() == (3, 70)
+    assert [path.name for path in spool.iterdir()] == [f'{owner}-abcdefghij.jpg']
+
+    assert temp_spool.sweep_spool(max_age=0) == (1, 30)
+    assert list(spool.iterdir()) == []
+
+def test_interrupted_jobs_resumed_or_failed_and_old_jobs_pruned(app, image_host, spool):
+    """After a restart a job whose file survived is requeued, one without a file fails; old finished jobs are pruned."""
+    from datetime import datetime, timedelta
+    from models.upload_jobs_model import UploadJob
+
+    image_host['release'].set()
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    orphan = spool / f'{dead.pid}-1-abcdefghij.jpg'
+    orphan.write_bytes(jpeg_bytes())
+
+    old = datetime.utcnow() - timedelta(days=Config.UPLOAD_JOB_RETENTION_DAYS + 1)
+    db.session.add_all([
+        UploadJob(id='interrupted', status='processing', filepath=str(orphan)),
+        UploadJob(id='lost', status='pending', filepath=str(spool / f'{dead.pid}-1-klmnopqrst.jpg')),
+        UploadJob(id='old', status='done', image_url='https://i.imgur.com/old.jpg', created_at=old, updated_at=old),
+        UploadJob(id='recent', status='failed', error='Ogiltig bild')
+    ])
+    db.session.commit()
+
+    assert image_controller.recover_upload_jobs() == ((1, 1), None)
+    client = app.test_client()
+    job = wait_for_job(client, '/api/images/jobs/interrupted')
+    assert job['status'] == 'done'
+    assert job['image_url'] == 'https://i.imgur.com/stub1.jpg'
+    job = json.loads(client.get('/api/images/jobs/lost').data)
+    assert job['status'] == 'failed'
+    assert list(spool.iterdir()) == []
+
+    assert image_controller.prune_upload_jobs() == (1, None)
+    assert client.get('/api/images/jobs/old').status_code == 404
+    assert client.get('/api/images/jobs/recent').status_code == 200
+
+def test_image_processing_pool_uses_spawn(app, image_host, spool):
+    """The processing pool is started with spawn, not forked from an upload thread."""
+    import utils.image_processing as image_processing
+
+    image_host['release'].set()
+    client = app.test_client()
+    response = client.post('/api/images/upload/registration', data={'file': image_file()},
+                           content_type='multipart/form-data')
+    assert wait_for_job(client, json.loads(response.data)['status_url'])['status'] == 'done'
+    assert image_processing._executor._mp_context.get_start_method() == 'spawn'
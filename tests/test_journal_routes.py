@@ -0,0 +1,258 @@
+import io
+import json
+import pytest
+from sqlalchemy import event
+from config.db_config import db
+
+@pytest.fixture
+def climber(app):
+    """A test client logged in as a freshly registered user."""
+    client = app.test_client()
+    client.post('/api/auth/register', json={
+        'username': 'climber',
+        'password': 'password123',
+        'email': 'climber@example.com'
+    })
+    response = client.post('/api/auth/login', json={
+        'username': 'climber',
+        'password': 'password123'
+    })
+    assert response.status_code == 200
+    return client
+
+def log_climb(client, date, difficulty='6A'):
+    response = client.post('/api/journal/post', json={
+        'route_type': 'boulder',
+        'difficulty': difficulty,
+        'date': date
+    })
+    assert response.status_code == 201
+    return json.loads(response.data)
+
+def count_queries():
+    """Collect the SQL statements executed while the returned list is in use."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, lambda: event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+def test_journal_keyset_pagination(climber):
+    """Entries come newest first and pages chain through next_cursor."""
+    ids = [log_climb(climber, f'2025-05-0{day}T10:00:00')['id'] for day in range(1, 6)]
+
+    response = climber.get('/api/journal/?limit=2')
+    assert response.status_code == 200
+    page = json.loads(response.data)
+    assert [e['id'] for e in page['entries']] == [ids[4], ids[3]]
+
+    page = json.loads(climber.get(f"/api/journal/?limit=2&before={page['next_cursor']}").data)
+    assert [e['id'] for e in page['entries']] == [ids[2], ids[1]]
+
+    page = json.loads(climber.get(f"/api/journal/?limit=2&before={page['next_cursor']}").data)
+    assert [e['id'] for e in page['entries']] == [ids[0]]
+    assert page['next_cursor'] is None
+
+    # Without limit the whole journal is returned
+    page = json.loads(climber.get('/api/journal/').data)
+    assert len(page['entries']) == 5
+    assert page['entries'][0]['difficulty'] == '6A'
+
+    assert climber.get('/api/journal/?before=garbage').status_code == 400
+    assert climber.get('/api/journal/?limit=0').status_code == 400
+
+def test_journal_pagination_without_dates(app, climber):
+    """Entries posted without a date page to the end, also rows stored by CURRENT_TIMESTAMP."""
+    from sqlalchemy import func, update
+    from controllers.journal_controller import normalise_journal_dates
+    from models.completed_routes_model import CompletedRoute
+
+    ids = []
+    for _ in range(5):
+        response = climber.post('/api/journal/post', json={'route_type': 'boulder', 'difficulty': '6A'})
+        assert response.status_code == 201
+        ids.append(json.loads(response.data)['id'])
+
+    def page_through():
+        seen, cursor = [], None
+        for _ in range(10):
+            url = '/api/journal/?limit=2' + (f'&before={cursor}' if cursor else '')
+            page = json.loads(climber.get(url).data)
+            seen += [e['id'] for e in page['entries']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                return seen
+        pytest.fail(f"Pagination did not end: {seen}")
+
+    assert sorted(page_through()) == sorted(ids)
+
+    # Rader från före rättningen: samma sekund, utan mikrosekunder
+    db.session.execute(update(CompletedRoute).values(date=func.current_timestamp()))
+    db.session.commit()
+    assert normalise_journal_dates() == 5
+    assert page_through() == sorted(ids, reverse=True)
+    assert normalise_journal_dates() == 0
+
+def test_journal_page_query_count_is_constant(app, climber):
+    """Route and grade are joined, so the page does not lazy-load per row."""
+    for day in range(1, 10):
+        log_climb(climber, f'2025-05-0{day}T10:00:00', difficulty=f'{day}A')
+
+    statements, stop = count_queries()
+    try:
+        response = climber.get('/api/journal/?limit=9')
+    finally:
+        stop()
+
+    assert len(json.loads(response.data)['entries']) == 9
+    journal_queries = [s for s in statements if 'completed_routes' in s]
+    assert len(journal_queries) == 1
+
+def test_journal_conditional_get(climber):
+    """Unchanged polls get 304, a write changes the ETag."""
+    log_climb(climber, '2025-05-01T10:00:00')
+
+    response = climber.get('/api/journal/')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = climber.get('/api/journal/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    # Another page of the same journal has its own tag
+    response = climber.get('/api/journal/?limit=1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+    log_climb(climber, '2025-05-02T10:00:00')
+    response = climber.get('/api/journal/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(json.loads(response.data)['entries']) == 2
+
+    # Goals share the user's version counter
+    etag = climber.get('/api/goals/').headers['ETag']
+    assert climber.get('/api/goals/', headers={'If-None-Match': etag}).status_code == 304
+    climber.post('/api/goals/', json={'title': 'Flash a 7A'})
+    assert climber.get('/api/goals/', headers={'If-None-Match': etag}).status_code == 200
+
+def test_achievements_ownership_checked_before_etag(app, climber):
+    """Another user gets 403 even with a matching If-None-Match, so the version is not leaked."""
+    user_id = json.loads(climber.get('/api/auth/me').data)['id']
+    response = climber.get(f'/api/achievements/user/{user_id}')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert climber.get(f'/api/achievements/user/{user_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    other = app.test_client()
+    other.post('/api/auth/register', json={'username': 'other', 'password': 'password123', 'email': 'other@example.com'})
+    other.post('/api/auth/login', json={'username': 'other', 'password': 'password123'})
+    response = other.get(f'/api/achievements/user/{user_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 403
+    assert 'ETag' not in response.headers
+
+def test_journal_export_streams_ndjson_and_csv(climber):
+    """The export streams every entry, oldest first."""
+    log_climb(climber, '2025-05-02T10:00:00', difficulty='7A')
+    log_climb(climber, '2025-05-01T10:00:00', difficulty='6A')
+
+    response = climber.get('/api/journal/export?format=ndjson')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r['difficulty'] for r in rows] == ['6A', '7A']
+
+    response = climber.get('/api/journal/export?format=csv')
+    assert response.status_code == 200
+    assert 'attachment' in response.headers['Content-Disposition']
+    lines = response.data.decode().splitlines()
+    assert lines[0] == 'id,date,route_type,difficulty,flash,image_url,route_id'
+    assert len(lines) == 3
+    assert ',7A,' in lines[2]
+
+    assert climber.get('/api/journal/export?format=xml').status_code == 400
+
+def test_journal_bulk_import(climber):
+    """Valid rows are imported in one go and bad rows are reported per row."""
+    response = climber.post('/api/journal/import', json=[
+        {'route_type': 'boulder', 'difficulty': '6A', 'date': '2025-05-01T10:00:00', 'flash': True},
+        {'route_type': 'boulder', 'difficulty': '7A', 'date': '2025-05-02T10:00:00'},
+        {'route_type': 'boulder'},
+        {'route_type': 'lead', 'difficulty': '6A', 'date': 'yesterday'}
+    ])
+    assert response.status_code == 201
+    result = json.loads(response.data)
+    assert result['imported'] == 2
+    assert [e['row'] for e in result['errors']] == [2, 3]
+
+    entries = json.loads(climber.get('/api/journal/').data)['entries']
+    assert [(e['difficulty'], e['flash']) for e in entries] == [('7A', False), ('6A', True)]
+
+    leaderboard = json.loads(climber.get('/api/leaderboard/').data)
+    assert leaderboard[0]['completed_routes_count'] == 2
+
+    # The CSV export can be imported again
+    export = climber.get('/api/journal/export?format=csv').data
+    response = climber.post('/api/journal/import', data={
+        'file': (io.BytesIO(export), 'journal.csv')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 201
+    assert json.loads(response.data)['imported'] == 2
+    assert len(json.loads(climber.get('/api/journal/').data)['entries']) == 4
+
+    assert climber.post('/api/journal/import', json=[{'route_type': 'boulder'}]).status_code == 400
+
+def test_repeat_ascents_share_catalogue_route(climber):
+    """Same type, grade, location and name resolve to one route row."""
+    first = log_climb(climber, '2025-05-01T10:00:00')
+    second = log_climb(climber, '2025-05-02T10:00:00')
+    assert first['route_id'] == second['route_id']
+
+    response = climber.post('/api/journal/post', json={
+        'route_type': 'boulder',
+        'difficulty': '6A',
+        'location': 'Kjugekull',
+        'name': 'Lilla Ö',
+        'date': '2025-05-03T10:00:00'
+    })
+    assert json.loads(response.data)['route_id'] != first['route_id']
+
+    # Changing the grade moves the entry, the shared route is left untouched
+    response = climber.put(f"/api/journal/edit/{second['id']}", json={'difficulty': '7A'})
+    assert response.status_code == 200
+    assert json.loads(response.data)['entry']['route_id'] != first['route_id']
+    entries = {e['id']: e for e in json.loads(climber.get('/api/journal/').data)['entries']}
+    assert entries[first['id']]['difficulty'] == '6A'
+    assert entries[second['id']]['difficulty'] == '7A'
+
+def test_merge_duplicate_routes(app, climber):
+    """Duplicates left by older versions are merged and completions repointed."""
+    from sqlalchemy import text
+    from controllers.route_controller import merge_duplicate_routes
+    from models.routes_model import Route
+
+    entry = log_climb(climber, '2025-05-01T10:00:00')
+    keeper_id = entry['route_id']
+
+    # Simulate a database from before the catalogue: no unique index, duplicate rows
+    db.session.execute(text('DROP INDEX uq_routes_type_difficulty_id_location_name'))
+    db.session.execute(text(
+        "INSERT INTO routes (difficulty_id, type, location, name) "
+        "SELECT difficulty_id, type, location, name FROM routes WHERE id = :id"
+    ), {'id': keeper_id})
+    duplicate_id = db.session.execute(text('SELECT max(id) FROM routes')).scalar()
+    db.session.execute(text('UPDATE completed_routes SET route_id = :dup'), {'dup': duplicate_id})
+    db.session.commit()
+
+    etag = climber.get('/api/journal/').headers['ETag']
+    merged, error = merge_duplicate_routes()
+    assert error is None
+    assert merged == 1
+    assert Route.query.count() == 1
+
+    response = climber.get('/api/journal/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert json.loads(response.data)['entries'][0]['route_id'] == keeper_id
@@ -0,0 +1,230 @@
+import json
+import pytest
+from sqlalchemy import event
+from models.users_model import User
+from models.user_stats_model import UserStats
+from config.db_config import db
+from models.completion_rollups_model import DailyCompletion, WeeklyCompletion
+from controllers.leaderboard_controller import rebuild_leaderboard, get_windowed_leaderboard
+from datetime import date, datetime
+
+def create_climber(app, username):
+    """Register a user and return a test client logged in as that user."""
+    client = app.test_client()
+    client.post('/api/auth/register', json={
+        'username': username,
+        'password': 'password123',
+        'email': f'{username}@example.com'
+    })
+    response = client.post('/api/auth/login', json={
+        'username': username,
+        'password': 'password123'
+    })
+    assert response.status_code == 200
+    return client
+
+def log_climb(client, difficulty='6A', flash=False, date=None):
+    response = client.post('/api/journal/post', json={
+        'route_type': 'boulder',
+        'difficulty': difficulty,
+        'flash': flash,
+        'date': date
+    })
+    assert response.status_code == 201
+    return json.loads(response.data)
+
+def test_leaderboard_counts_follow_journal(client, app):
+    """Creating and deleting journal entries keeps user_stats in sync."""
+    alice = create_climber(app, 'alice')
+    bob = create_climber(app, 'bob')
+
+    log_climb(alice, flash=True)
+    log_climb(alice)
+    entry = log_climb(bob)
+
+    data = json.loads(client.get('/api/leaderboard/').data)
+    assert [(r['username'], r['completed_routes_count']) for r in data] == [('alice', 2), ('bob', 1)]
+
+    stats = db.session.get(UserStats, User.query.filter_by(username='alice').first().id)
+    assert stats.flash_count == 1
+    assert stats.last_climb_date is not None
+
+    response = bob.delete(f"/api/journal/edit/{entry['id']}")
+    assert response.status_code == 200
+
+    data = json.loads(client.get('/api/leaderboard/').data)
+    assert [(r['username'], r['completed_routes_count']) for r in data] == [('alice', 2)]
+
+def test_rebuild_leaderboard(client, app):
+    """The rebuild recomputes the tables from completed_routes."""
+    alice = create_climber(app, 'alice')
+    log_climb(alice, flash=True)
+    log_climb(alice, flash=True)
+
+    db.session.query(UserStats).delete()
+    db.session.commit()
+    assert json.loads(client.get('/api/leaderboard/').data) == []
+
+    count, error = rebuild_leaderboard()
+    assert error is None
+    assert count == 1
+
+    stats = UserStats.query.one()
+    assert stats.completed_count == 2
+    assert stats.flash_count == 2
+    assert DailyCompletion.query.one().completed_count == 2
+    assert WeeklyCompletion.query.one().completed_count == 2
+
+def test_leaderboard_keyset_pagination(client, app):
+    """Pages follow (count DESC, user_id) and chain through X-Next-Cursor."""
+    for name, climbs in [('alice', 3), ('bob', 1), ('carol', 2), ('dave', 2)]:
+        climber = create_climber(app, name)
+        for _ in range(climbs):
+            log_climb(climber)
+
+    response = client.get('/api/leaderboard/?limit=2')
+    assert [r['username'] for r in json.loads(response.data)] == ['alice', 'carol']
+    cursor = response.headers['X-Next-Cursor']
+
+    response = client.get(f'/api/leaderboard/?limit=2&cursor={cursor}')
+    assert [r['username'] for r in json.loads(response.data)] == ['dave', 'bob']
+    assert 'X-Next-Cursor' not in response.headers
+
+    assert client.get('/api/leaderboard/?cursor=garbage').status_code == 400
+    assert client.get('/api/leaderboard/?limit=0').status_code == 400
+
+def test_user_rank_with_neighbours(client, app):
+    """The rank endpoint returns shared ranks and the adjacent users."""
+    ids = {}
+    for name, climbs in [('alice', 3), ('bob', 1), ('carol', 2), ('dave', 2)]:
+        climber = create_climber(app, name)
+        for _ in range(climbs):
+            log_climb(climber)
+        ids[name] = User.query.filter_by(username=name).first().id
+
+    response = client.get(f"/api/leaderboard/user/{ids['dave']}?context=1")
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['user']['rank'] == 2
+    assert [(r['username'], r['rank']) for r in data['above']] == [('carol', 2)]
+    assert [(r['username'], r['rank']) for r in data['below']] == [('bob', 4)]
+
+    create_climber(app, 'erin')
+    erin_id = User.query.filter_by(username='erin').first().id
+    assert client.get(f'/api/leaderboard/user/{erin_id}').status_code == 404
+
+def test_user_rank_window_counts_once(client, app):
+    """Ties across the window edge keep their shared rank from a single COUNT."""
+    ids = {}
+    for name, climbs in [('alice', 4), ('bob', 3), ('carol', 3), ('dave', 3), ('erin', 2), ('frank', 1)]:
+        climber = create_climber(app, name)
+        for _ in range(climbs):
+            log_climb(climber)
+        ids[name] = User.query.filter_by(username=name).first().id
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(f"/api/leaderboard/user/{ids['dave']}?context=1")
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['user']['rank'] == 2
+    assert [(r['username'], r['rank']) for r in data['above']] == [('carol', 2)]
+    assert [(r['username'], r['rank']) for r in data['below']] == [('erin', 5)]
+    assert sum('count(' in s.lower() for s in statements) == 1
+
+def test_windowed_leaderboard_from_rollups(client, app):
+    """Week, month and season windows sum the daily and weekly buckets."""
+    alice = create_climber(app, 'alice')
+    bob = create_climber(app, 'bob')
+
+    # 2025-05-14 is a Wednesday
+    log_climb(alice, date='2025-05-12T10:00:00')
+    log_climb(alice, date='2025-05-14T10:00:00')
+    log_climb(bob, date='2025-05-14T18:00:00')
+    old_entry = log_climb(bob, date='2025-05-01T10:00:00')
+    log_climb(bob, date='2025-04-02T10:00:00')
+    log_climb(bob, date='2025-03-30T10:00:00')
+
+    def window(name):
+        page, error = get_windowed_leaderboard(name, today=date(2025, 5, 14))
+        assert error is None
+        return [(r['username'], r['completed_routes_count']) for r in page['entries']]
+
+    assert window('week') == [('alice', 2), ('bob', 1)]
+    assert window('month') == [('alice', 2), ('bob', 2)]
+    assert window('season') == [('bob', 3), ('alice', 2)]
+
+    # Moving an entry to another day moves it between buckets
+    bob.put(f"/api/journal/edit/{old_entry['id']}", json={'date': '2025-05-13T10:00:00'})
+    assert window('week') == [('alice', 2), ('bob', 2)]
+
+    page, error = get_windowed_leaderboard('year')
+    assert error is not None
+    assert client.get('/api/leaderboard/?window=year').status_code == 400
+
+def test_score_leaderboard_weights_grades(client, app):
+    """by=score ranks one hard climb above many easy ones and follows edits."""
+    alice = create_climber(app, 'alice')
+    bob = create_climber(app, 'bob')
+
+    for _ in range(5):
+        log_climb(alice, difficulty='4')
+    entry = log_climb(bob, difficulty='8A')
+
+    data = json.loads(client.get('/api/leaderboard/').data)
+    assert [r['username'] for r in data] == ['alice', 'bob']
+
+    data = json.loads(client.get('/api/leaderboard/?by=score').data)
+    assert [(r['username'], r['score']) for r in data] == [('bob', 900), ('alice', 500)]
+
+    # Downgrading the climb updates the precomputed score
+    bob.put(f"/api/journal/edit/{entry['id']}", json={'difficulty': '6A'})
+    data = json.loads(client.get('/api/leaderboard/?by=score').data)
+    assert [(r['username'], r['score']) for r in data] == [('alice', 500), ('bob', 300)]
+
+    assert client.get('/api/leaderboard/?by=fame').status_code == 400
+    assert client.get('/api/leaderboard/?by=score&window=week').status_code == 400
+
+def test_leaderboard_conditional_get(client, app):
+    """The leaderboard ETag follows the global leaderboard version."""
+    alice = create_climber(app, 'alice')
+    log_climb(alice)
+
+    etag = client.get('/api/leaderboard/').headers['ETag']
+    assert client.get('/api/leaderboard/', headers={'If-None-Match': etag}).status_code == 304
+
+    log_climb(alice)
+    response = client.get('/api/leaderboard/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert json.loads(response.data)[0]['completed_routes_count'] == 2
+
+def test_windowed_leaderboard_etag_follows_period(client, app, monkeypatch):
+    """A windowed leaderboard is not answered with 304 once its period has rolled over."""
+    import controllers.leaderboard_controller as leaderboard_controller
+
+    class FrozenDatetime(datetime):
+        now_value = datetime(2025, 5, 18, 23, 59)
+
+        @classmethod
+        def utcnow(cls):
+            return cls.now_value
+
+    log_climb(create_climber(app, 'alice'))
+    monkeypatch.setattr(leaderboard_controller, 'datetime', FrozenDatetime)
+
+    etag = client.get('/api/leaderboard/?window=week').headers['ETag']
+    assert client.get('/api/leaderboard/?window=week', headers={'If-None-Match': etag}).status_code == 304
+
+    # Söndag -> måndag: en ny vecka börjar utan att något skrivits
+    FrozenDatetime.now_value = datetime(2025, 5, 19, 0, 1)
+    response = client.get('/api/leaderboard/?window=week', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
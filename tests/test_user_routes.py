@@ -0,0 +1,102 @@
+import json
+import pytest
+from config.db_config import db, Config
+from models.users_model import User
+
+@pytest.fixture
+def fast_hashing(monkeypatch):
+    """Cheap KDF parameters, the tests are about provisioning, not hashing cost."""
+    monkeypatch.setattr(Config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    monkeypatch.setattr(Config, 'PASSWORD_HASH_WORKERS', 2)
+    monkeypatch.setattr(Config, 'PROVISIONING_KEY', 'partner-key')
+
+def member(i, **overrides):
+    row = {'username': f'member{i}', 'password': f'password{i}', 'email': f'member{i}@example.com'}
+    row.update(overrides)
+    return row
+
+def test_register_duplicate_email_uses_unique_constraint(client, fast_hashing):
+    """Duplicates are reported from the unique constraints, not a pre-check."""
+    assert client.post('/api/auth/register', json=member(1)).status_code == 201
+
+    response = client.post('/api/auth/register', json=member(2, email='member1@example.com'))
+    assert response.status_code == 400
+    assert json.loads(response.data)['error'] == 'Email already in use'
+
+def test_bulk_provisioning_reports_conflicts_per_row(client, fast_hashing):
+    """Valid rows are created in one request, conflicting rows are reported."""
+    client.post('/api/auth/register', json=member(0))
+
+    rows = [member(i) for i in range(1, 11)]
+    rows += [
+        member(11, username='member1'),
+        member(12, email='member0@example.com'),
+        {'username': 'nopassword', 'email': 'nopassword@example.com'}
+    ]
+
+    assert client.post('/api/users/bulk', json=rows).status_code == 403
+    response = client.post('/api/users/bulk', json=rows, headers={'X-Provisioning-Key': 'partner-key'})
+    assert response.status_code == 201
+
+    result = json.loads(response.data)
+    assert len(result['created']) == 10
+    assert result['errors'] == [
+        {'row': 10, 'error': 'Username already exists'},
+        {'row': 11, 'error': 'Email already in use'},
+        {'row': 12, 'error': 'Missing required fields: username, password, and email'}
+    ]
+    assert User.query.count() == 11
+
+    # Hashes from the process pool verify like any other
+    response = client.post('/api/auth/login', json={'username': 'member7', 'password': 'password7'})
+    assert response.status_code == 200
+
+def test_provision_users_cli(app, fast_hashing, tmp_path):
+    path = tmp_path / 'members.csv'
+    path.write_text('username,password,email\nclimber1,secret1,c1@example.com\nclimber1,secret2,c2@example.com\n')
+
+    result = app.test_cli_runner().invoke(args=['provision-users', str(path)])
+    assert 'Row 1: Username already exists' in result.output
+    assert 'Created 1 users' in result.output
+
+def test_prefix_search_is_case_insensitive(client, fast_hashing):
+    """Type-ahead search matches on prefix, ignores case and returns public fields only."""
+    for username in ['Alex', 'alexandra', 'ALEXIS', 'Bea', 'alb']:
+        client.post('/api/auth/register', json=member(0, username=username, email=f'{username}@example.com'))
+
+    response = client.get('/api/users/search?q=aLeX')
+    assert response.status_code == 200
+    users = json.loads(response.data)
+    assert [u['username'] for u in users] == ['Alex', 'alexandra', 'ALEXIS']
+    assert set(users[0]) == {'id', 'username', 'profile_image_url'}
+
+    users = json.loads(client.get('/api/users/search?q=al&limit=2').data)
+    assert [u['username'] for u in users] == ['alb', 'Alex']
+
+    assert json.loads(client.get('/api/users/search?q=z').data) == []
+    assert client.get('/api/users/search?q=al&limit=500').status_code == 400
+    assert client.get('/api/users/search?q=%20').status_code == 400
+
+    # Exact lookup still works
+    response = client.get('/api/users/search?username=Bea')
+    assert json.loads(response.data)['username'] == 'Bea'
+
+def test_hash_passwords_reuses_bounded_spawn_pool(fast_hashing, monkeypatch):
+    """Bulk hashing keeps one spawn-started pool and respects the shared queue bound."""
+    from werkzeug.security import check_password_hash
+    from utils import password_hashing
+
+    passwords = [f'password{i}' for i in range(password_hashing.PROCESS_POOL_MIN_BATCH)]
+    hashes = password_hashing.hash_passwords(passwords)
+    pool = password_hashing._process_pool
+    assert pool._mp_context.get_start_method() == 'spawn'
+    assert all(check_password_hash(h, p) for h, p in zip(hashes, passwords))
+
+    password_hashing.hash_passwords(passwords)
+    assert password_hashing._process_pool is pool
+    assert password_hashing.hashing_stats()['in_flight'] == 0
+
+    # Logins and other batches already fill the bound
+    monkeypatch.setitem(password_hashing._stats, 'in_flight', Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_MAX_QUEUE - 1)
+    with pytest.raises(password_hashing.HashingBusyError):
+        password_hashing.hash_passwords(passwords)
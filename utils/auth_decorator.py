@@ -1,10 +1,63 @@
 from functools import wraps
 from flask import request, jsonify
 import jwt
-from config.db_config import Config
+from config.db_config import db
 from models.users_model import User
+from utils.user_cache import get_cached_user, user_exists
+from utils.token_cache import decode_token
+from utils.token_revocation import is_token_revoked
+
+
+def _load_user(user_id):
+    return db.session.get(User, user_id)
+
+
+def _probe_user(user_id):
+    # Index-only uppslag, användarraden läses inte
+    return db.session.query(User.id).filter(User.id == user_id).first() is not None
+
+
+class UserGoneError(LookupError):
+    """Raised by UserProxy when the token's user was deleted after the request was authenticated."""
+
+
+class UserProxy:
+    """
+    current_user for claims-only routes.
+
+    id comes from the verified token. Any other attribute (username, email,
+    profile_image_url, ...) loads the user through the user cache the first
+    time it is read.
+    """
+    __slots__ = ('id', '_user')
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self._user = None
+
+    def __getattr__(self, name):
+        if self._user is None:
+            self._user = get_cached_user(self.id, _load_user)
+            if self._user is None:
+                raise UserGoneError(f"User {self.id} not found")
+        return getattr(self._user, name)
+
+    def __repr__(self):
+        return f"<UserProxy {self.id}>"
+
+
+def auth_required(f=None, claims_only=False):
+    """
+    Require a valid JWT and pass the user to the route as current_user.
+
+    Use as @auth_required, or as @auth_required(claims_only=True) for routes
+    that only need current_user.id: they get a UserProxy built from the token
+    and the user row is only loaded if another attribute is read. Both modes
+    reject tokens for users that no longer exist.
+    """
+    if f is None:
+        return lambda f: auth_required(f, claims_only=claims_only)
 
-def auth_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         # Hämta token från cookies eller Authorization-header
@@ -18,18 +71,44 @@ def auth_required(f):
             return jsonify({'error': 'Authorization token is missing'}), 401
 
         try:
-            # Dekryptera JWT-token
-            payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-            user = User.query.get(payload['id'])
+            # Verifiera JWT-token, redan verifierade tokens hämtas ur utils/token_cache
+            payload = decode_token(token)
+            if is_token_revoked(payload):
+                return jsonify({'error': 'Token has been revoked'}), 401
+
+            if claims_only:
+                user = UserProxy(payload['id']) if user_exists(payload['id'], _probe_user) else None
+            else:
+                # Cachad ögonblicksbild av användaren, se utils/user_cache
+                user = get_cached_user(payload['id'], _load_user)
             if not user:
                 return jsonify({'error': 'User not found'}), 401
 
             # Lägg till den autentiserade användaren i kwargs
             kwargs['current_user'] = user
             return f(*args, **kwargs)
+        except UserGoneError:
+            # Användaren togs bort efter att token kontrollerats, svara som om den aldrig funnits
+            return jsonify({'error': 'User not found'}), 401
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token has expired'}), 401
         except jwt.InvalidTokenError:
             return jsonify({'error': 'Invalid token'}), 401
 
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+
+def own_user_required(f):
+    """
+    Only let current_user reach a route for their own user_id.
+
+    Place it below @auth_required and above @conditional_get, so another
+    user gets 403 before the ETag check and cannot probe the version counter.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if kwargs['current_user'].id != kwargs.get('user_id'):
+            return jsonify({'error': 'Unauthorized access'}), 403
+        return f(*args, **kwargs)
+
+    return decorated_function
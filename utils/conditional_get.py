@@ -0,0 +1,67 @@
+from functools import wraps
+from zlib import crc32
+from flask import request, make_response
+from sqlalchemy import update, insert
+from config.db_config import db
+from models.data_versions_model import DataVersion
+
+LEADERBOARD_VERSION_KEY = 'leaderboard'
+
+def user_version_key(user_id):
+    return f'user:{user_id}'
+
+def bump_versions(*keys):
+    """
+    Increase the version counters for the given keys.
+    Does not commit; the caller commits together with the write it versions.
+    """
+    for key in keys:
+        result = db.session.execute(
+            update(DataVersion)
+            .where(DataVersion.key == key)
+            .values(version=DataVersion.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(DataVersion).values(key=key, version=1))
+
+def get_version(key):
+    return db.session.query(DataVersion.version).filter_by(key=key).scalar() or 0
+
+def conditional_get(version_key):
+    """
+    Answer GET requests with an ETag built from a version counter.
+
+    version_key is called with the handler's kwargs (including current_user
+    when used below @auth_required) and returns the counter key, or a
+    (key, scope) tuple when the response also depends on something the
+    counter does not track, such as the dates a leaderboard window covers.
+    The scope is part of the tag, so a new period gives a new tag. If the
+    client's If-None-Match matches, 304 is returned without running the
+    handler. The version is read before the handler, so a concurrent write
+    can at worst cause one extra full response.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key, scope = version_key(**kwargs), ''
+            if isinstance(key, tuple):
+                key, scope = key
+            version = get_version(key)
+            # The query string selects the page, so it is part of the tag
+            etag = f'{key.replace(":", "-")}-{version}-{crc32(f"{request.full_path}|{scope}".encode()):08x}'
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            # Always revalidate, the tag is cheap to check
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        return decorated_function
+    return decorator
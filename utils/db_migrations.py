@@ -0,0 +1,77 @@
+import logging
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+def _default_sql(default):
+    """SQL literal for a server_default: plain strings are quoted, text() is used as is."""
+    if isinstance(default, str):
+        return "'" + default.replace("'", "''") + "'"
+    return str(default)
+
+def add_missing_columns(db):
+    """
+    Add columns that exist on the models but not in an existing database.
+
+    db.create_all() only creates missing tables, so columns added to a model
+    after a database was created are added here with ALTER TABLE. Columns that
+    are NOT NULL need a server_default to be added to a table with rows.
+
+    Returns:
+        list: (table, column) tuples that were added
+    """
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    added = []
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=db.engine.dialect)}'
+                if column.server_default is not None:
+                    ddl += f' DEFAULT {_default_sql(column.server_default.arg)}'
+                    if not column.nullable:
+                        ddl += ' NOT NULL'
+
+                logger.info(f"Adding column {table.name}.{column.name}")
+                connection.execute(text(ddl))
+                added.append((table.name, column.name))
+
+    return added
+
+def add_missing_indexes(db):
+    """
+    Create indexes that exist on the models but not in an existing database.
+
+    db.create_all() only creates indexes together with new tables, so indexes
+    added to existing tables are created here. Safe to run on every start.
+
+    Returns:
+        list: names of the indexes that were created
+    """
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    created = []
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+
+                logger.info(f"Creating index {index.name} on {table.name}")
+                index.create(bind=connection)
+                created.append(index.name)
+
+    return created
@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from config.db_config import Config
+
+# Statuskoder som är värda ett nytt försök
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Shared requests.Session for the image host.
+
+    Keeps connections alive in a pool sized for the upload workers, so
+    uploads, token refreshes and deletes reuse TCP/TLS connections instead
+    of paying a new handshake per call.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            pool_size = Config.IMAGE_UPLOAD_WORKERS + 4
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def rate_limit_delay(response):
+    """
+    Seconds the host asks us to wait, from Retry-After or Imgur's rate-limit
+    headers, or None if the response does not say.
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # Imgur: gräns för uppladdningar per timme och per användare
+    post_reset = response.headers.get('X-Post-Rate-Limit-Reset')
+    if post_reset and response.headers.get('X-Post-Rate-Limit-Remaining') == '0':
+        return max(0.0, float(post_reset))
+    user_reset = response.headers.get('X-RateLimit-UserReset')
+    if user_reset and response.headers.get('X-RateLimit-UserRemaining') == '0':
+        return max(0.0, float(user_reset) - time.time())
+    return None
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full jitter: a random wait up to base_delay * 2^attempt, at most max_delay."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def request_with_backoff(method, url, attempts=None, base_delay=None, data_factory=None, **kwargs):
+    """
+    Send a request through the shared session, retrying network errors,
+    429 and 5xx with exponential backoff and jitter.
+
+    A wait requested by the host (Retry-After or rate-limit headers) is used
+    instead of the computed delay. If it is longer than
+    IMAGE_HOST_MAX_BACKOFF_SECONDS the response is returned at once, so an
+    upload worker is not parked for the rest of the rate-limit window.
+
+    Args:
+        attempts (int, optional): Max number of requests, default IMAGE_HOST_RETRIES
+        base_delay (float, optional): First backoff step in seconds, default IMAGE_HOST_BACKOFF_SECONDS
+        data_factory (callable, optional): Builds a fresh request body for each attempt
+            (a streamed body cannot be sent twice). Closed after the attempt if it has close().
+
+    Returns:
+        requests.Response: The last response received
+
+    Raises:
+        requests.exceptions.RequestException: If every attempt failed without a response
+    """
+    attempts = attempts or Config.IMAGE_HOST_RETRIES
+    base_delay = Config.IMAGE_HOST_BACKOFF_SECONDS if base_delay is None else base_delay
+    max_delay = Config.IMAGE_HOST_MAX_BACKOFF_SECONDS
+    kwargs.setdefault('timeout', (Config.IMAGE_HOST_CONNECT_TIMEOUT, Config.IMAGE_HOST_READ_TIMEOUT))
+    session = get_session()
+
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        data = data_factory() if data_factory else kwargs.get('data')
+        try:
+            response = session.request(method, url, **{**kwargs, 'data': data})
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if last_attempt:
+                raise
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
+            continue
+        finally:
+            if data_factory and hasattr(data, 'close'):
+                data.close()
+
+        if response.status_code not in RETRY_STATUSES or last_attempt:
+            return response
+
+        delay = rate_limit_delay(response)
+        if delay is None:
+            delay = backoff_delay(attempt, base_delay, max_delay)
+        elif delay > max_delay:
+            return response
+        response.close()
+        time.sleep(delay)
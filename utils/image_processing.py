@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from config.db_config import Config
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow saknas, bilderna laddas upp som de är
+    Image = None
+
+# Format som skalas om och komprimeras, GIF:ar skickas vidare orörda (animationer)
+PROCESSED_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _downscale(filepath, max_width, max_height, quality):
+    """
+    Runs in the process pool: apply the EXIF orientation, fit the image in
+    max_width x max_height, re-encode it without metadata and replace the file.
+    """
+    original_bytes = os.path.getsize(filepath)
+    image_format = PROCESSED_FORMATS[os.path.splitext(filepath)[1].lower()]
+
+    with Image.open(filepath) as image:
+        if image.format == 'JPEG':
+            # Låt JPEG-avkodaren skala ner direkt (1/2, 1/4, 1/8) när bilden är mycket större
+            image.draft('RGB', (max(max_width, max_height),) * 2)
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_width, max_height), Image.LANCZOS)
+
+        # Utan exif= och pnginfo= skrivs ingen metadata (GPS, kamera, tid) ut, färgprofilen behålls
+        processed_path = f'{filepath}.processing'
+        if image_format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(processed_path, 'JPEG', quality=quality, optimize=True, progressive=True, icc_profile=icc_profile)
+        else:
+            image.save(processed_path, 'PNG', optimize=True, icc_profile=icc_profile)
+        width, height = image.size
+
+    os.replace(processed_path, filepath)
+    return {
+        'original_bytes': original_bytes,
+        'processed_bytes': os.path.getsize(filepath),
+        'width': width,
+        'height': height
+    }
+
+
+def process_image(filepath):
+    """
+    Downscale and recompress a saved upload in place before it is sent to the image host.
+
+    The work runs in a pool of IMAGE_PROCESS_WORKERS processes, so decoding
+    and encoding neither hold the GIL of the upload threads nor block
+    request threads. Images are fitted within IMAGE_MAX_WIDTH x
+    IMAGE_MAX_HEIGHT and re-encoded at IMAGE_QUALITY.
+
+    Returns:
+        tuple: (dict with original_bytes, processed_bytes, width and height, or None
+                if the file is passed through untouched; error message or None)
+    """
+    global _executor
+    if Image is None or os.path.splitext(filepath)[1].lower() not in PROCESSED_FORMATS:
+        return None, None
+
+    with _lock:
+        if _executor is None:
+            # Startas med spawn: en fork av den trådade servern kan ärva låsta lås och databasanslutningar
+            _executor = ProcessPoolExecutor(max_workers=Config.IMAGE_PROCESS_WORKERS, mp_context=get_context('spawn'))
+        executor = _executor
+
+    try:
+        return executor.submit(
+            _downscale, filepath, Config.IMAGE_MAX_WIDTH, Config.IMAGE_MAX_HEIGHT, Config.IMAGE_QUALITY
+        ).result(), None
+    except BrokenProcessPool:
+        # En arbetsprocess dog (t.ex. slut på minne), nästa anrop startar en ny pool
+        with _lock:
+            if _executor is executor:
+                _executor = None
+        return None, "Bildbehandlingen avbröts"
+    except Exception as e:
+        return None, f"Ogiltig bild: {str(e)}"
+    finally:
+        # Halvfärdig fil om arbetsprocessen misslyckades
+        if os.path.exists(f'{filepath}.processing'):
+            os.remove(f'{filepath}.processing')
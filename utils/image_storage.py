@@ -0,0 +1,62 @@
+import hashlib
+import os
+import re
+import shutil
+import uuid
+
+# Nycklar i den lokala lagringen: SHA-256 av innehållet plus filändelse
+LOCAL_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}\.(jpg|jpeg|png|gif)$')
+
+
+class LocalStorage:
+    """
+    Content-addressed image store on the local filesystem.
+
+    Each file is stored once under the SHA-256 of its bytes, sharded as
+    <root>/ab/cd/<hash>.<ext>, so a directory never grows beyond a few
+    hundred entries and identical images share one file. Files never change
+    once written, which lets them be served with long-lived caching.
+    """
+
+    name = 'local'
+
+    def __init__(self, root, url_prefix):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+
+    def path_for(self, key):
+        """Filesystem path for a key, or None if the key is not a valid content address."""
+        if not LOCAL_KEY_PATTERN.match(key):
+            return None
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def store(self, filepath):
+        """
+        Move a processed upload into the store.
+
+        Returns:
+            tuple: (URL for the file (str) or None, error message (str) or None)
+        """
+        try:
+            hasher = hashlib.sha256()
+            with open(filepath, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 16), b''):
+                    hasher.update(chunk)
+            key = hasher.hexdigest() + os.path.splitext(filepath)[1].lower()
+            path = self.path_for(key)
+            if not path:
+                return None, f"Filtypen stöds inte: {os.path.basename(filepath)}"
+
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Flytta först till ett tillfälligt namn i samma mapp, så att en halvskriven fil aldrig syns
+                partial = f'{path}.{uuid.uuid4().hex}.partial'
+                shutil.move(filepath, partial)
+                os.replace(partial, path)
+            return f'{self.url_prefix}/{key}', None
+        except OSError as e:
+            return None, f"Kunde inte spara bilden: {str(e)}"
+
+    def delete(self, key):
+        # Samma fil kan delas av flera uppladdningar (samma innehåll), så den tas inte bort här
+        return None, "Delete is not supported for local image storage"
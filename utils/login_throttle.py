@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+import time
+from config.db_config import Config
+
+
+def _estimate(window, current, previous, now, window_seconds):
+    """
+    Sliding-window count from two fixed windows: the current window plus the
+    part of the previous window that still overlaps the sliding window.
+    """
+    window_now = int(now // window_seconds)
+    if window == window_now - 1:
+        current, previous = 0, current
+    elif window != window_now:
+        return 0.0
+    elapsed = (now % window_seconds) / window_seconds
+    return current + previous * (1 - elapsed)
+
+
+def _retry_after(window_seconds, now):
+    return max(1, int(window_seconds - now % window_seconds))
+
+
+class MemoryThrottle:
+    """
+    Per-process sliding-window counter of failed logins.
+
+    Each key holds (window, current, previous), so memory per key is
+    constant. Keys whose windows have both passed are evicted every
+    window_seconds.
+    """
+
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def blocked(self, limits, now=None):
+        """Seconds to wait if any key in limits ({key: limit}) is over its limit, else None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._sweep(now)
+            for key, limit in limits.items():
+                entry = self._counts.get(key)
+                if entry and _estimate(*entry, now, self.window_seconds) >= limit:
+                    return _retry_after(self.window_seconds, now)
+        return None
+
+    def record(self, keys, now=None):
+        now = time.time() if now is None else now
+        window_now = int(now // self.window_seconds)
+        with self._lock:
+            for key in keys:
+                window, current, previous = self._counts.get(key, (window_now, 0, 0))
+                if window != window_now:
+                    previous = current if window == window_now - 1 else 0
+                    current = 0
+                self._counts[key] = (window_now, current + 1, previous)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def _sweep(self, now):
+        if now < self._next_sweep:
+            return
+        oldest = int(now // self.window_seconds) - 1
+        self._counts = {key: entry for key, entry in self._counts.items() if entry[0] >= oldest}
+        self._next_sweep = now + self.window_seconds
+
+
+class SQLiteThrottle:
+    """
+    Same counters as MemoryThrottle in a SQLite file, so all worker
+    processes on the host share them.
+    """
+
+    def __init__(self, window_seconds, path):
+        self.window_seconds = window_seconds
+        self.path = path
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS login_throttle ('
+                'key TEXT PRIMARY KEY, window INTEGER NOT NULL, '
+                'current INTEGER NOT NULL, previous INTEGER NOT NULL)'
+            )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def blocked(self, limits, now=None):
+        now = time.time() if now is None else now
+        connection = self._connect()
+        self._sweep(connection, now)
+        placeholders = ','.join('?' * len(limits))
+        rows = connection.execute(
+            f'SELECT key, window, current, previous FROM login_throttle WHERE key IN ({placeholders})',
+            list(limits)
+        ).fetchall()
+        for key, window, current, previous in rows:
+            if _estimate(window, current, previous, now, self.window_seconds) >= limits[key]:
+                return _retry_after(self.window_seconds, now)
+        return None
+
+    def record(self, keys, now=None):
+        now = time.time() if now is None else now
+        window_now = int(now // self.window_seconds)
+        connection = self._connect()
+        for key in keys:
+            # Ett atomiskt upsert per nyckel, samma regler som MemoryThrottle.record
+            connection.execute(
+                'INSERT INTO login_throttle (key, window, current, previous) VALUES (?, ?, 1, 0) '
+                'ON CONFLICT(key) DO UPDATE SET '
+                'previous = CASE WHEN window = excluded.window THEN previous '
+                '                WHEN window = excluded.window - 1 THEN current ELSE 0 END, '
+                'current = CASE WHEN window = excluded.window THEN current + 1 ELSE 1 END, '
+                'window = excluded.window',
+                (key, window_now)
+            )
+
+    def reset(self):
+        self._connect().execute('DELETE FROM login_throttle')
+
+    def _sweep(self, connection, now):
+        if now < self._next_sweep:
+            return
+        connection.execute('DELETE FROM login_throttle WHERE window < ?', (int(now // self.window_seconds) - 1,))
+        self._next_sweep = now + self.window_seconds
+
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+
+def get_login_throttle():
+    """The process-wide throttle, backend chosen by LOGIN_THROTTLE_BACKEND ('memory' or 'sqlite')."""
+    global _throttle
+    with _throttle_lock:
+        if _throttle is None:
+            if Config.LOGIN_THROTTLE_BACKEND == 'sqlite':
+                _throttle = SQLiteThrottle(Config.LOGIN_THROTTLE_WINDOW_SECONDS, Config.LOGIN_THROTTLE_DB_PATH)
+            else:
+                _throttle = MemoryThrottle(Config.LOGIN_THROTTLE_WINDOW_SECONDS)
+        return _throttle
+
+
+def login_throttle_limits(username, ip):
+    """Keys and limits for a login attempt: one per username and one per client IP."""
+    return {
+        f"user:{str(username or '').strip().lower()}": Config.LOGIN_THROTTLE_USER_LIMIT,
+        f"ip:{ip}": Config.LOGIN_THROTTLE_IP_LIMIT
+    }
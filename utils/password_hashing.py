@@ -0,0 +1,144 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from multiprocessing import get_context
+from werkzeug.security import generate_password_hash, check_password_hash
+from config.db_config import Config
+
+
+class HashingBusyError(Exception):
+    """Raised when PASSWORD_HASH_MAX_QUEUE calls are already waiting for a worker."""
+
+
+_executor = None
+_process_pool = None
+_lock = threading.Lock()
+_stats = {
+    'submitted': 0,
+    'completed': 0,
+    'rejected': 0,
+    'in_flight': 0,
+    'max_in_flight': 0,
+    'wait_seconds': 0.0
+}
+# Under denna storlek lönar det sig inte att starta en processpool
+PROCESS_POOL_MIN_BATCH = 8
+# Metodsträngen som werkzeug skriver i hashen för en konfigurerad metod
+_method_prefixes = {}
+
+
+def _admit(slots=1):
+    """Take slots in the hashing bound, or raise HashingBusyError if the queue is full. Call with _lock held."""
+    if _stats['in_flight'] + slots > Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_MAX_QUEUE:
+        _stats['rejected'] += 1
+        raise HashingBusyError("Too many password hashing requests queued")
+    _stats['submitted'] += slots
+    _stats['in_flight'] += slots
+    _stats['max_in_flight'] = max(_stats['max_in_flight'], _stats['in_flight'])
+
+
+def _release(slots=1):
+    with _lock:
+        _stats['in_flight'] -= slots
+        _stats['completed'] += slots
+
+
+def _run(fn, *args):
+    """
+    Run fn(*args) in the hashing pool and wait for the result.
+
+    At most PASSWORD_HASH_WORKERS hashes run at once (hashlib releases the
+    GIL, so the rest of the process keeps serving requests) and at most
+    PASSWORD_HASH_MAX_QUEUE calls wait for a worker.
+    """
+    global _executor
+    submitted = time.perf_counter()
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+        _admit()
+
+    def task():
+        started = time.perf_counter()
+        with _lock:
+            _stats['wait_seconds'] += started - submitted
+        try:
+            return fn(*args)
+        finally:
+            _release()
+
+    return _executor.submit(task).result()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, Config.PASSWORD_HASH_METHOD)
+
+
+def verify_password(hashed_password, password):
+    return _run(check_password_hash, hashed_password, password)
+
+
+def hash_passwords(passwords):
+    """
+    Hash many passwords in parallel across a process pool, e.g. for bulk
+    provisioning. Batches smaller than PROCESS_POOL_MIN_BATCH are hashed
+    through the thread pool one by one.
+
+    The process pool is created on first use and kept for the life of the
+    process. Its PASSWORD_HASH_WORKERS processes are started with 'spawn',
+    since forking a threaded server copies locks held by other threads. A
+    batch takes one slot per worker in the same bound as hash_password, so
+    bulk provisioning and logins together never exceed
+    PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE.
+
+    Returns:
+        list: hashes in the same order as passwords
+
+    Raises:
+        HashingBusyError: if the bound is full
+    """
+    global _process_pool
+    passwords = list(passwords)
+    method = Config.PASSWORD_HASH_METHOD
+    workers = min(Config.PASSWORD_HASH_WORKERS, len(passwords))
+    if workers <= 1 or len(passwords) < PROCESS_POOL_MIN_BATCH:
+        return [hash_password(password) for password in passwords]
+
+    with _lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, mp_context=get_context('spawn'))
+        pool = _process_pool
+        _admit(workers)
+
+    try:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(generate_password_hash, passwords, repeat(method), chunksize=chunksize))
+    except BrokenProcessPool:
+        # En arbetsprocess dog, nästa anrop startar en ny pool
+        with _lock:
+            if _process_pool is pool:
+                _process_pool = None
+        raise
+    finally:
+        _release(workers)
+
+
+def needs_rehash(hashed_password):
+    """True if the hash was made with other KDF parameters than PASSWORD_HASH_METHOD."""
+    method = Config.PASSWORD_HASH_METHOD
+    if method not in _method_prefixes:
+        # werkzeug fyller i standardparametrar, t.ex. "pbkdf2" -> "pbkdf2:sha256:1000000"
+        _method_prefixes[method] = generate_password_hash('', method).split('$', 1)[0]
+    return hashed_password.split('$', 1)[0] != _method_prefixes[method]
+
+
+def hashing_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats['workers'] = Config.PASSWORD_HASH_WORKERS
+    stats['max_queue'] = Config.PASSWORD_HASH_MAX_QUEUE
+    stats['queued'] = max(0, stats['in_flight'] - stats['workers'])
+    stats['avg_wait_ms'] = round(stats['wait_seconds'] * 1000 / stats['completed'], 3) if stats['completed'] else 0.0
+    return stats
@@ -0,0 +1,69 @@
+import os
+from flask import Request
+from utils.temp_spool import spool_file
+
+
+class SpoolStream:
+    """
+    A temp spool file handed to werkzeug's form parser as the container for
+    a file part. Counts, and optionally hashes, the bytes as they are written.
+    """
+
+    def __init__(self, spooled, hasher=None):
+        self.spooled = spooled
+        self.size = 0
+        self._hasher = hasher
+        self._file = open(spooled.path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self._hasher is not None:
+            self._hasher.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # read, seek, close osv. går direkt till filen
+        return getattr(self._file, name)
+
+
+class SpoolingRequest(Request):
+    """
+    Request that can parse an uploaded file straight into the temp spool.
+
+    werkzeug buffers file parts over 500 kB in a temporary file of its own,
+    so an upload copied to the spool afterwards was written to disk twice,
+    and the first copy did not count against TEMP_SPOOL_MAX_BYTES. After
+    spool_upload() the first file part with an accepted extension is written
+    directly into a reserved SpoolFile, available as spooled_upload (and as
+    file.stream.spooled) once request.files has been read. The file is
+    removed when the request is closed unless it has been detached.
+    """
+
+    spooled_upload = None
+    _spool_options = None
+
+    def spool_upload(self, reserve_bytes, extensions=None, hasher=None):
+        """
+        Write the next uploaded file into the temp spool. Call before reading
+        request.files, which may then raise SpoolFullError.
+
+        Args:
+            reserve_bytes (int): Bytes to reserve in the spool for the file
+            extensions (set, optional): Accepted extensions without the dot, other files are not spooled
+            hasher (optional): hashlib object updated with the file's bytes as they arrive
+        """
+        self._spool_options = (reserve_bytes, extensions, hasher)
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        extension = os.path.splitext(filename or '')[1].lower()
+        if self._spool_options is not None and self.spooled_upload is None:
+            reserve_bytes, extensions, hasher = self._spool_options
+            if extensions is None or extension.lstrip('.') in extensions:
+                self.spooled_upload = spool_file(extension, reserve_bytes)
+                return SpoolStream(self.spooled_upload, hasher)
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+    def close(self):
+        super().close()
+        if self.spooled_upload is not None:
+            self.spooled_upload.close()
@@ -0,0 +1,230 @@
+import logging
+import os
+import random
+import string
+import threading
+import time
+from config.db_config import Config
+
+logger = logging.getLogger(__name__)
+
+# Spoolfiler heter <pid>-<starttid>-<slump><ändelse>, så att en sopning ser vilken process som
+# äger filen. Starttiden skiljer en ny process med samma pid (t.ex. pid 1 i en omstartad
+# container) från den som skrev filen.
+SPOOL_NAME_LENGTH = 10
+
+
+class SpoolFullError(Exception):
+    """Raised when TEMP_SPOOL_MAX_BYTES stays reserved for TEMP_SPOOL_WAIT_SECONDS."""
+
+
+_cond = threading.Condition()
+_reserved = 0
+_janitor = None
+_owner = (None, None)
+
+
+class SpoolFile:
+    """
+    A file in the temp spool and the bytes reserved for it.
+
+    Used as a context manager: the file is removed and the reservation
+    released on every exit path. detach() hands both over to a new
+    SpoolFile, e.g. for a background worker, and leaves this one empty.
+    """
+
+    def __init__(self, path, reserved):
+        self.path = path
+        self._reserved = reserved
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def update_size(self):
+        """Shrink or grow the reservation to the file's size on disk."""
+        with self._lock:
+            if self.path is None:
+                return
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            _adjust(size - self._reserved)
+            self._reserved = size
+
+    def detach(self):
+        with self._lock:
+            owner = SpoolFile(self.path, self._reserved)
+            self.path, self._reserved = None, 0
+            return owner
+
+    def close(self):
+        with self._lock:
+            path, reserved = self.path, self._reserved
+            self.path, self._reserved = None, 0
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("Could not remove spool file %s: %s", path, e)
+        _adjust(-reserved)
+
+
+def _adjust(delta):
+    global _reserved
+    with _cond:
+        _reserved += delta
+        if delta < 0:
+            _cond.notify_all()
+
+
+def spool_folder():
+    folder = Config.TEMP_SPOOL_PATH
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def spool_file(extension='', reserve_bytes=0):
+    """
+    Reserve room for a new file in the temp spool.
+
+    At most TEMP_SPOOL_MAX_BYTES are reserved per process, so N server
+    processes sharing TEMP_SPOOL_PATH can together use N times that; size
+    the setting as the disk budget divided by the number of processes. When
+    the spool is full the caller waits up to TEMP_SPOOL_WAIT_SECONDS for
+    other files to be released, then SpoolFullError is raised so the request
+    can be refused instead of filling the disk.
+
+    Returns:
+        SpoolFile: the path (not created yet) and its reservation
+    """
+    global _reserved
+    _ensure_janitor()
+    if reserve_bytes > Config.TEMP_SPOOL_MAX_BYTES:
+        raise SpoolFullError("File larger than the temp spool")
+
+    with _cond:
+        if not _cond.wait_for(lambda: _reserved + reserve_bytes <= Config.TEMP_SPOOL_MAX_BYTES,
+                              timeout=Config.TEMP_SPOOL_WAIT_SECONDS):
+            raise SpoolFullError("Temp spool is full")
+        _reserved += reserve_bytes
+
+    return SpoolFile(_new_path(extension), reserve_bytes)
+
+
+def _process_start_time(pid):
+    """Start time of a process in clock ticks since boot, from /proc (Linux), or None if unknown."""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as stat_file:
+            stat = stat_file.read()
+    except OSError:
+        return None
+    # Processnamnet kan innehålla mellanslag och parenteser, fälten efter det börjar efter sista ')'
+    return int(stat.rsplit(b')', 1)[1].split()[19])
+
+
+def _owner_prefix():
+    """'<pid>-<start time>' for this process (start time 0 where /proc is missing), refreshed after a fork."""
+    global _owner
+    pid = os.getpid()
+    if _owner[0] != pid:
+        _owner = (pid, f'{pid}-{_process_start_time(pid) or 0}')
+    return _owner[1]
+
+
+def _new_path(extension):
+    random_chars = ''.join(random.choices(string.ascii_letters + string.digits, k=SPOOL_NAME_LENGTH))
+    return os.path.join(spool_folder(), f'{_owner_prefix()}-{random_chars}{extension}')
+
+
+def adopt_spool_file(path):
+    """
+    Take over a spool file left by a process that is gone, e.g. to resume an
+    upload job after a restart. The file is renamed to this process, so the
+    sweep keeps it, and its size is reserved without waiting for room.
+
+    Returns:
+        SpoolFile or None: None if the file no longer exists
+    """
+    _ensure_janitor()
+    new_path = _new_path(os.path.splitext(path)[1])
+    try:
+        os.rename(path, new_path)
+    except FileNotFoundError:
+        return None
+    size = os.path.getsize(new_path)
+    _adjust(size)
+    return SpoolFile(new_path, size)
+
+
+def owner_alive(path):
+    """True if the spool file at path belongs to a process that is still running."""
+    return _owner_alive(os.path.basename(path))
+
+
+def _owner_alive(filename):
+    parts = filename.split('-', 2)
+    if len(parts) < 3 or not parts[0].isdigit() or not parts[1].isdigit():
+        # Filer från före spoolen (t.ex. JDNWpxmLFz.jpg) eller utan starttid har ingen ägare
+        return False
+    pid, start_time = int(parts[0]), int(parts[1])
+    if pid == os.getpid():
+        return f'{pid}-{start_time}' == _owner_prefix()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    # Samma pid men en annan process än den som skrev filen
+    current = _process_start_time(pid)
+    return start_time == 0 or current is None or current == start_time
+
+
+def sweep_spool(max_age=None):
+    """
+    Remove spool files whose process is gone, and any file older than
+    max_age seconds (TEMP_SPOOL_MAX_AGE_SECONDS). Run at startup and by the janitor.
+
+    Returns:
+        tuple: (number of files removed, bytes freed)
+    """
+    max_age = Config.TEMP_SPOOL_MAX_AGE_SECONDS if max_age is None else max_age
+    now = time.time()
+    removed = freed = 0
+    with os.scandir(spool_folder()) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+                if _owner_alive(entry.name) and now - stat.st_mtime < max_age:
+                    continue
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += stat.st_size
+    if removed:
+        logger.info("Temp spool sweep removed %d files (%d bytes)", removed, freed)
+    return removed, freed
+
+
+def _janitor_loop():
+    while True:
+        try:
+            sweep_spool()
+        except OSError as e:
+            logger.warning("Temp spool sweep failed: %s", e)
+        time.sleep(Config.TEMP_SPOOL_JANITOR_SECONDS)
+
+
+def _ensure_janitor():
+    """Start the janitor on first use; its first pass is the startup sweep for this process."""
+    global _janitor
+    with _cond:
+        if _janitor is None:
+            _janitor = threading.Thread(target=_janitor_loop, name='temp-spool-janitor', daemon=True)
+            _janitor.start()
+
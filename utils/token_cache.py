@@ -0,0 +1,71 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import jwt
+from config.db_config import Config
+
+# Antal verifierade tokens som sparas per process, 0 stänger av cachen
+TOKEN_CACHE_MAX_SIZE = 4096
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _digest(token):
+    # The key is part of the digest, so a new SECRET_KEY never matches old entries
+    return hashlib.sha256(f"{Config.SECRET_KEY}\0{token}".encode()).digest()
+
+
+def decode_token(token):
+    """
+    jwt.decode with a memo of verified tokens.
+
+    A verified payload is kept, keyed by a SHA-256 digest of the token, until
+    the token's exp, and is checked against exp on every hit. Tokens without
+    exp are not cached. Raises the same jwt exceptions as jwt.decode.
+    Revocation is checked by the caller on every request, cached or not.
+
+    Returns:
+        dict: the token payload, shared between hits, must not be modified
+    """
+    if TOKEN_CACHE_MAX_SIZE <= 0:
+        return jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
+
+    key = _digest(token)
+    with _lock:
+        entry = _cache.get(key)
+        if entry:
+            payload, expires = entry
+            if time.time() < expires:
+                _cache.move_to_end(key)
+                _stats['hits'] += 1
+                return payload
+            del _cache[key]
+        _stats['misses'] += 1
+
+    payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
+    if isinstance(payload.get('exp'), (int, float)):
+        with _lock:
+            _cache[key] = (payload, payload['exp'])
+            while len(_cache) > TOKEN_CACHE_MAX_SIZE:
+                _cache.popitem(last=False)
+    return payload
+
+
+def forget_token(token):
+    """Drop a token from the cache, e.g. on logout."""
+    with _lock:
+        _cache.pop(_digest(token), None)
+
+
+def clear_token_cache():
+    with _lock:
+        _cache.clear()
+        _stats['hits'] = _stats['misses'] = 0
+
+
+def token_cache_stats():
+    with _lock:
+        return {'size': len(_cache), 'max_size': TOKEN_CACHE_MAX_SIZE, **_stats}
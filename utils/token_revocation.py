@@ -0,0 +1,105 @@
+import hashlib
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import func
+from config.db_config import db, Config
+from models.revoked_tokens_model import RevokedToken
+
+# Bloomfiltrets storlek (bitar) och antal hashfunktioner, ~1 % falska träffar vid 100 000 återkallade tokens
+REVOCATION_BLOOM_BITS = 1 << 20
+REVOCATION_BLOOM_HASHES = 7
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings: no false negatives, rare false positives."""
+
+    def __init__(self, bits, hashes):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray(bits // 8)
+
+    def _positions(self, value):
+        # Dubbelhashning: k positioner från en 128-bitars digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+_filter = BloomFilter(REVOCATION_BLOOM_BITS, REVOCATION_BLOOM_HASHES)
+_last_id = 0
+_next_sync = 0.0
+_lock = threading.Lock()
+
+
+def _sync():
+    """Add revocations made since the last sync, by any process, to the filter."""
+    global _filter, _last_id
+    max_id = db.session.query(func.max(RevokedToken.id)).scalar() or 0
+    if max_id < _last_id:
+        # Rader har rensats eller databasen bytts ut, bygg om filtret
+        _filter = BloomFilter(REVOCATION_BLOOM_BITS, REVOCATION_BLOOM_HASHES)
+        _last_id = 0
+    if max_id == _last_id:
+        return
+
+    rows = (
+        db.session.query(RevokedToken.id, RevokedToken.jti)
+        .filter(RevokedToken.id > _last_id, RevokedToken.expires_at > datetime.utcnow())
+        .all()
+    )
+    for _, jti in rows:
+        _filter.add(jti)
+    _last_id = max_id
+
+
+def is_token_revoked(payload):
+    """
+    Check an access token's jti against the revocation list.
+
+    The in-memory bloom filter answers for almost every token without a
+    database round trip; the revoked_tokens table is only queried when the
+    filter reports a hit. Revocations made in this process are added to the
+    filter at once. Those made by other processes are loaded at most every
+    REVOCATION_SYNC_SECONDS, which bounds how long such a token is still
+    accepted here.
+    """
+    global _next_sync
+    jti = payload.get('jti')
+    if jti is None:
+        return False
+
+    now = time.monotonic()
+    if now >= _next_sync:
+        with _lock:
+            if now >= _next_sync:
+                _sync()
+                _next_sync = now + Config.REVOCATION_SYNC_SECONDS
+
+    if jti not in _filter:
+        return False
+    return db.session.query(RevokedToken.id).filter_by(jti=jti).first() is not None
+
+
+def revoke_token(jti, expires_at):
+    """Add an access token to the revocation list. Does not commit."""
+    db.session.add(RevokedToken(jti=jti, expires_at=expires_at))
+    with _lock:
+        _filter.add(jti)
+
+
+def reset_revocation_filter():
+    """Rebuild the filter from revoked_tokens on the next check, e.g. after pruning."""
+    global _filter, _last_id, _next_sync
+    with _lock:
+        _filter = BloomFilter(REVOCATION_BLOOM_BITS, REVOCATION_BLOOM_HASHES)
+        _last_id = 0
+        _next_sync = 0.0
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Storlek och livslängd för cachen av inloggade användare
+USER_CACHE_MAX_SIZE = 1024
+USER_CACHE_TTL_SECONDS = 60
+
+# Read-only view of a user, handed to handlers as current_user
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'username', 'email', 'profile_image_url', 'register_date'])
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+# Cachat värde för användare som bara kontrollerats finnas (claims-only)
+_EXISTS = object()
+# Bumped on every invalidation, so a load that raced with one is not cached
+_generation = 0
+
+
+def snapshot_user(user):
+    return UserSnapshot(user.id, user.username, user.email, user.profile_image_url, user.register_date)
+
+
+def get_cached_user(user_id, load_user):
+    """
+    Return the UserSnapshot for user_id, calling load_user(user_id) on a miss.
+
+    The cache is a per-process LRU bounded by USER_CACHE_MAX_SIZE, and entries
+    expire after USER_CACHE_TTL_SECONDS, which bounds how long another worker
+    can serve a stale or deleted user. Users that load_user cannot find are
+    not cached.
+
+    Returns:
+        UserSnapshot or None
+    """
+    cached, generation = _lookup(user_id, snapshot_only=True)
+    if cached is not None:
+        return cached
+
+    user = load_user(user_id)
+    if user is None:
+        return None
+
+    snapshot = snapshot_user(user)
+    _store(user_id, snapshot, generation)
+    return snapshot
+
+
+def user_exists(user_id, probe_user):
+    """
+    Check that user_id still exists, calling probe_user(user_id) on a miss.
+
+    Used by the claims-only mode of auth_required. A cached snapshot counts
+    as a hit; otherwise only the existence of the id is cached, so the probe
+    can be an index-only query instead of loading the whole row.
+
+    Returns:
+        bool
+    """
+    cached, generation = _lookup(user_id, snapshot_only=False)
+    if cached is not None:
+        return True
+
+    if not probe_user(user_id):
+        return False
+
+    _store(user_id, _EXISTS, generation)
+    return True
+
+
+def _lookup(user_id, snapshot_only):
+    """Returns (cached value or None, generation to pass to _store on a miss)."""
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry and entry[1] > now and not (snapshot_only and entry[0] is _EXISTS):
+            _cache.move_to_end(user_id)
+            _stats['hits'] += 1
+            return entry[0], None
+        _stats['misses'] += 1
+        return None, _generation
+
+
+def _store(user_id, value, generation):
+    with _lock:
+        if generation != _generation:
+            return
+        now = time.monotonic()
+        entry = _cache.get(user_id)
+        if value is _EXISTS and entry and entry[0] is not _EXISTS and entry[1] > now:
+            # Behåll en snapshot som redan finns
+            return
+        _cache[user_id] = (value, now + USER_CACHE_TTL_SECONDS)
+        _cache.move_to_end(user_id)
+        while len(_cache) > USER_CACHE_MAX_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate_user(user_id):
+    """Drop a user from the cache after their row changed or was deleted."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.pop(user_id, None)
+
+
+def clear_user_cache():
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.clear()
+        _stats['hits'] = _stats['misses'] = 0
+
+
+def user_cache_stats():
+    with _lock:
+        return {'size': len(_cache), 'max_size': USER_CACHE_MAX_SIZE, **_stats}